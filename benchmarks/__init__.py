@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Offline benchmarks of the NAPALM Beer Garden plugin, see ``run_benchmarks``."""
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+import os
+import random
+import re
+import threading
+import time
+
+from napalm.base import NetworkDriver
+from napalm.base.exceptions import ConnectionException, MergeConfigException
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'eos_example_configs')
+
+DEFAULT_OPTIONS = {
+    'latency': 0.01,
+    'connect_latency': 0.1,
+    'jitter': 0.2,
+    'payload_size': 100,
+    'failure_rate': 0.0,
+    'seed': 0,
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name)) as fixture:
+        return fixture.read()
+
+
+class MockDriver(NetworkDriver):
+    """NAPALM driver that answers from the EOS example configs.
+
+    Nothing is sent over the network. Every call sleeps for ``latency``
+    seconds, opening a session for ``connect_latency`` seconds, both varied
+    by ``jitter``. Table getters return ``payload_size`` rows, and calls fail
+    with a ``ConnectionException`` at ``failure_rate``. These options are
+    read from ``optional_args``, and ``seed`` makes the variations
+    repeatable per hostname.
+    """
+
+    def __init__(self, hostname, username, password, timeout=60,
+                 optional_args=None):
+        options = dict(DEFAULT_OPTIONS)
+        options.update(optional_args or {})
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.options = options
+        self.opened = False
+        self.running = load_fixture('new_good.conf')
+        self.previous = None
+        self.candidate = None
+        self._random = random.Random('%s:%s' % (options['seed'], hostname))
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    def open(self):
+        self._respond(self.options['connect_latency'])
+        self.opened = True
+
+    def close(self):
+        self.opened = False
+
+    def is_alive(self):
+        return {'is_alive': self.opened}
+
+    def get_facts(self):
+        self._respond()
+        return {
+            'hostname': self._hostname(),
+            'fqdn': '%s.example.net' % self._hostname(),
+            'vendor': 'Arista',
+            'model': 'vEOS',
+            'os_version': '4.20.1F',
+            'serial_number': self.hostname,
+            'uptime': time.time() - self._started,
+            'interface_list': self._interfaces(),
+        }
+
+    def get_interfaces(self):
+        self._respond()
+        descriptions = self._descriptions()
+        return dict((name, {
+            'is_up': True,
+            'is_enabled': True,
+            'description': descriptions.get(name, ''),
+            'last_flapped': -1.0,
+            'speed': 10000.0,
+            'mtu': 1500,
+            'mac_address': _mac(i),
+        }) for i, name in enumerate(self._interfaces()))
+
+    def get_interfaces_counters(self):
+        self._respond()
+        # Counters grow with time so that rates can be computed from them
+        elapsed = int((time.time() - self._started) * 1000)
+        counters = {}
+        for i, name in enumerate(self._interfaces()):
+            packets = elapsed * (i + 1)
+            counters[name] = {
+                'tx_errors': 0,
+                'rx_errors': 0,
+                'tx_discards': 0,
+                'rx_discards': 0,
+                'tx_octets': packets * 512,
+                'rx_octets': packets * 768,
+                'tx_unicast_packets': packets,
+                'rx_unicast_packets': packets,
+                'tx_multicast_packets': 0,
+                'rx_multicast_packets': 0,
+                'tx_broadcast_packets': 0,
+                'rx_broadcast_packets': 0,
+            }
+        return counters
+
+    def get_arp_table(self, vrf=''):
+        self._respond()
+        interfaces = self._interfaces()
+        return [{
+            'interface': interfaces[i % len(interfaces)],
+            'mac': _mac(i),
+            'ip': '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255),
+            'age': float(i % 300),
+        } for i in range(self.options['payload_size'])]
+
+    def get_mac_address_table(self):
+        self._respond()
+        interfaces = self._interfaces()
+        return [{
+            'mac': _mac(i),
+            'interface': interfaces[i % len(interfaces)],
+            'vlan': 1 + i % 4094,
+            'static': False,
+            'active': True,
+            'moves': 0,
+            'last_move': 0.0,
+        } for i in range(self.options['payload_size'])]
+
+    def get_bgp_neighbors(self):
+        self._respond()
+        neighbors = {}
+        vrf = 'global'
+        for line in self.running.splitlines():
+            match = re.match(r'\s+vrf (\S+)', line)
+            if match:
+                vrf = match.group(1)
+            match = re.match(r'\s+neighbor (\S+) remote-as (\d+)', line)
+            if match:
+                peers = neighbors.setdefault(vrf, {'router_id': '',
+                                                   'peers': {}})['peers']
+                peers[match.group(1)] = {
+                    'local_as': 65000,
+                    'remote_as': int(match.group(2)),
+                    'remote_id': match.group(1),
+                    'is_up': True,
+                    'is_enabled': True,
+                    'description': '',
+                    'uptime': int(time.time() - self._started),
+                    'address_family': {},
+                }
+        return neighbors
+
+    def get_config(self, retrieve='all', full=False, sanitized=False,
+                   format='text'):
+        self._respond()
+        configs = {
+            'running': self.running,
+            'candidate': self.candidate or '',
+            'startup': self.running,
+        }
+        if retrieve != 'all':
+            configs = dict((k, v if k == retrieve else '')
+                           for k, v in configs.items())
+        return configs
+
+    def load_merge_candidate(self, filename=None, config=None):
+        self._respond()
+        if filename:
+            with open(filename) as config_file:
+                config = config_file.read()
+        if 'descriptin' in (config or ''):
+            # What EOS says about the typo in merge_typo.conf
+            raise MergeConfigException('Invalid input (at token 0: '
+                                       "'descriptin')")
+        with self._lock:
+            self.candidate = self.running + '\n' + (config or '')
+
+    def load_replace_candidate(self, filename=None, config=None):
+        self._respond()
+        if filename:
+            with open(filename) as config_file:
+                config = config_file.read()
+        with self._lock:
+            self.candidate = config or ''
+
+    def compare_config(self):
+        self._respond()
+        if self.candidate is None:
+            return ''
+        running = set(self.running.splitlines())
+        candidate = set(self.candidate.splitlines())
+        return '\n'.join(['+' + line for line in sorted(candidate - running)] +
+                         ['-' + line for line in sorted(running - candidate)])
+
+    def commit_config(self, message='', revert_in=None):
+        self._respond()
+        with self._lock:
+            if self.candidate is not None:
+                self.previous, self.running = self.running, self.candidate
+                self.candidate = None
+
+    def discard_config(self):
+        self._respond()
+        with self._lock:
+            self.candidate = None
+
+    def rollback(self):
+        self._respond()
+        with self._lock:
+            if self.previous is not None:
+                self.running, self.previous = self.previous, None
+
+    def _respond(self, latency=None):
+        if latency is None:
+            latency = self.options['latency']
+        with self._lock:
+            jitter = self._random.uniform(-1, 1) * self.options['jitter']
+            failed = self._random.random() < self.options['failure_rate']
+        time.sleep(max(0, latency * (1 + jitter)))
+        if failed:
+            raise ConnectionException('Simulated failure on %s'
+                                      % self.hostname)
+
+    def _hostname(self):
+        match = re.search(r'^hostname (\S+)', self.running, re.M)
+        return match.group(1) if match else self.hostname
+
+    def _interfaces(self):
+        names = re.findall(r'^interface (\S+)', self.running, re.M)
+        extra = self.options['payload_size'] - len(names)
+        return names + ['Ethernet%d/1' % (i + 1) for i in range(extra)]
+
+    def _descriptions(self):
+        return dict(re.findall(r'^interface (\S+)\n\s+description (.*)$',
+                               self.running, re.M))
+
+
+def _mac(i):
+    return '02:00:%02X:%02X:%02X:%02X' % (i >> 24 & 255, i >> 16 & 255,
+                                          i >> 8 & 255, i & 255)
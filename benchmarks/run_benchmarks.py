@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks ``NapalmPlugin`` against mock devices.
+
+Run from the top of the repository with ``python -m benchmarks.run_benchmarks``.
+No Beer Garden, message broker or network device is needed: the plugin's
+commands are called directly and every device is a ``MockDriver``.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from benchmarks.mock_driver import MockDriver
+from napalm_bg_plugin.inventory import Inventory
+from napalm_bg_plugin.metrics import Histogram
+from run import NapalmPlugin
+
+DEFAULT_GETTERS = ('get_facts', 'get_interfaces', 'get_interfaces_counters',
+                   'get_arp_table', 'get_bgp_neighbors', 'get_config')
+
+# Plugin metrics that are copied to the report
+PLUGIN_METRICS = ('connect_seconds', 'checkout_seconds', 'call_seconds',
+                  'command_seconds', 'serialize_seconds', 'result_bytes')
+
+# Seconds between two readings of the resident set size
+RSS_INTERVAL = 0.01
+
+
+@contextmanager
+def make_plugin(options, **plugin_args):
+    """Builds a plugin serving ``options.devices`` mock devices.
+
+    The plugin keeps its files in a temporary directory, which is removed
+    along with the plugin's sessions and threads once the benchmark is done.
+    """
+    devices = {}
+    for i in range(options.devices):
+        devices['mock%d' % i] = {
+            'driver': MockDriver,
+            'hostname': 'mock%d.example.net' % i,
+            'username': 'admin',
+            'password': 'admin',
+            'groups': ['mock'],
+            'optional_args': {
+                'latency': options.latency,
+                'connect_latency': options.connect_latency,
+                'payload_size': options.payload_size,
+                'failure_rate': options.failure_rate,
+                'seed': options.seed,
+            },
+        }
+    directory = tempfile.mkdtemp(prefix='napalm-bench-')
+    plugin = NapalmPlugin(
+        inventory=Inventory(devices),
+        max_sessions=options.max_sessions,
+        workers=options.clients,
+        snapshot_dir=os.path.join(directory, 'snapshots'),
+        spool_dir=os.path.join(directory, 'spool'),
+        profile_dir=os.path.join(directory, 'profiles'),
+        **plugin_args)
+    try:
+        yield plugin
+    finally:
+        plugin.shutdown()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class RssSampler(object):
+    """Reads the resident set size of the process while a benchmark runs.
+
+    Reads ``/proc/self/statm``, so there are no readings off Linux.
+    """
+
+    def __init__(self, interval=RSS_INTERVAL):
+        self.interval = interval
+        self.readings = []
+        self._page_kb = os.sysconf('SC_PAGE_SIZE') // 1024
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._read()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+        self._read()
+
+    def report(self):
+        if not self.readings:
+            return None
+        return {'start': self.readings[0], 'peak': max(self.readings),
+                'end': self.readings[-1]}
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._read()
+
+    def _read(self):
+        try:
+            with open('/proc/self/statm') as statm:
+                self.readings.append(int(statm.read().split()[1]) *
+                                     self._page_kb)
+        except (IOError, ValueError, IndexError):
+            pass
+
+
+def bench_connect(options):
+    """Opens one session per device and calls a getter over it."""
+    with make_plugin(options) as plugin, RssSampler() as rss:
+        start = time.time()
+        result = plugin.fan_out('get_facts', ['mock'])
+        duration = time.time() - start
+    return {
+        'duration': duration,
+        'errors': len(result['errors']),
+        'plugin': _plugin_metrics(plugin),
+        'rss_kb': rss.report(),
+    }
+
+
+def bench_requests(options, getter, force_refresh):
+    """Sends ``options.requests`` calls of a getter from concurrent clients."""
+    with make_plugin(options) as plugin:
+        # Open the sessions first so that only the requests are measured
+        plugin.fan_out('get_facts', ['mock'])
+        names = ['mock%d' % (i % options.devices)
+                 for i in range(options.requests)]
+        latencies = Histogram(samples=options.requests)
+        errors = []
+        lock = threading.Lock()
+        # Called like a client would, without a fan out around it
+        call = getattr(plugin, getter)
+
+        def request(name):
+            start = time.time()
+            try:
+                call(target=name, force_refresh=force_refresh)
+            except Exception as error:
+                with lock:
+                    errors.append(str(error))
+            with lock:
+                latencies.observe(time.time() - start)
+
+        with RssSampler() as rss:
+            start = time.time()
+            with ThreadPoolExecutor(max_workers=options.clients) as executor:
+                list(executor.map(request, names))
+            duration = time.time() - start
+
+    return {
+        'requests': options.requests,
+        'errors': len(errors),
+        'duration': duration,
+        'requests_per_second': options.requests / duration,
+        'latency': _summary(latencies),
+        'plugin': _plugin_metrics(plugin),
+        'rss_kb': rss.report(),
+    }
+
+
+def run_benchmarks(options):
+    report = {'options': vars(options), 'connect': bench_connect(options),
+              'getters': {}}
+    for getter in options.getters:
+        report['getters'][getter] = {
+            'live': bench_requests(options, getter, force_refresh=True),
+            'cached': bench_requests(options, getter, force_refresh=False),
+        }
+    return report
+
+
+def _summary(histogram):
+    quantiles = histogram.quantiles()
+    return {
+        'count': histogram.count,
+        'mean': histogram.sum / histogram.count if histogram.count else None,
+        'p50': quantiles[0.5],
+        'p95': quantiles[0.95],
+        'p99': quantiles[0.99],
+    }
+
+
+def _plugin_metrics(plugin):
+    histograms = plugin.get_plugin_metrics()['histograms']
+    return dict((name, histograms[name]) for name in PLUGIN_METRICS
+                if name in histograms)
+
+
+def parse_args(cli_args):
+    parser = ArgumentParser(description='Benchmarks the plugin against '
+                                        'mock devices')
+    parser.add_argument('--devices', type=int, default=10,
+                        help='Number of mock devices')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='Number of requests per getter')
+    parser.add_argument('--clients', type=int, default=16,
+                        help='Number of concurrent clients')
+    parser.add_argument('--max-sessions', dest='max_sessions', type=int,
+                        default=1, help='Sessions per device')
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='Seconds each device call takes')
+    parser.add_argument('--connect-latency', dest='connect_latency',
+                        type=float, default=0.1,
+                        help='Seconds opening a session takes')
+    parser.add_argument('--payload-size', dest='payload_size', type=int,
+                        default=100, help='Rows returned by table getters')
+    parser.add_argument('--failure-rate', dest='failure_rate', type=float,
+                        default=0.0, help='Share of device calls that fail')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the simulated latencies and failures')
+    parser.add_argument('--getter', dest='getters', action='append',
+                        help='Getter to benchmark, can be repeated '
+                             '(default: %s)' % ', '.join(DEFAULT_GETTERS))
+    parser.add_argument('-o', '--output', type=str,
+                        help='Write the report to this file instead of '
+                             'stdout')
+    options = parser.parse_args(cli_args)
+    options.getters = options.getters or list(DEFAULT_GETTERS)
+    return options
+
+
+def main():
+    options = parse_args(sys.argv[1:])
+    report = json.dumps(run_benchmarks(options), indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as output:
+            output.write(report)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
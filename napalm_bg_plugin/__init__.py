@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Support code for the NAPALM Beer Garden plugin defined in ``run.py``."""
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a getter result stays fresh. Getters that are not listed here are
+# not cached at all.
+DEFAULT_TTLS = {
+    'get_arp_table': 30,
+    'get_bgp_config': 300,
+    'get_bgp_neighbors': 30,
+    'get_bgp_neighbors_detail': 30,
+    'get_config': 60,
+    'get_environment': 60,
+    'get_facts': 600,
+    'get_firewall_policies': 300,
+    'get_interfaces': 60,
+    'get_interfaces_counters': 5,
+    'get_interfaces_ip': 300,
+    'get_ipv6_neighbors_table': 30,
+    'get_lldp_neighbors': 300,
+    'get_lldp_neighbors_detail': 300,
+    'get_mac_address_table': 30,
+    'get_network_instances': 300,
+    'get_ntp_peers': 600,
+    'get_ntp_servers': 600,
+    'get_ntp_stats': 60,
+    'get_optics': 60,
+    'get_probes_config': 300,
+    'get_probes_results': 30,
+    'get_route_to': 30,
+    'get_snmp_information': 600,
+    'get_users': 600,
+}
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class ResultCache(object):
+    """LRU cache of getter results with a time to live per getter.
+
+    Entries are keyed by device name, getter name and the getter's keyword
+    arguments. Once more than ``max_entries`` results are cached the least
+    recently used ones are dropped. Each device has a generation that
+    ``invalidate`` moves on, so that results read from the device before
+    it was invalidated are not cached after it.
+    """
+
+    def __init__(self, ttls=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(name, getter, kwargs):
+        return name, getter, json.dumps(kwargs, sort_keys=True)
+
+    def ttl(self, getter):
+        return self.ttls.get(getter, 0)
+
+    def get(self, key, max_age=None):
+        """Returns ``(True, result)`` for a fresh entry, else ``(False, None)``.
+
+        An entry is fresh if it is younger than ``max_age`` seconds, or than
+        the getter's TTL when no ``max_age`` is given.
+        """
+        if max_age is None:
+            max_age = self.ttl(key[1])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] >= max_age:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[1]
+
+    def generation(self, name):
+        with self._lock:
+            return self._generations.get(name, 0)
+
+    def put(self, key, result, generation=None):
+        """Caches a result, unless its device's generation moved on."""
+        if self.max_entries <= 0 or self.ttl(key[1]) <= 0:
+            return
+        with self._lock:
+            if (generation is not None and
+                    generation != self._generations.get(key[0], 0)):
+                return
+            self._entries[key] = (time.time(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name):
+        """Drops every cached result for a device."""
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+            for key in [k for k in self._entries if k[0] == name]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _Flight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Runs concurrent calls with the same key only once.
+
+    The first caller of a key runs the call. Callers that arrive while it
+    is running wait for it, for at most ``timeout`` seconds, and share its
+    result or its exception. A caller must not hold anything the call may
+    need while it waits.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, timeout=None):
+        """Returns the result of ``func`` and whether it was shared."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                raise TimeoutError("The same call already running did not "
+                                   "finish within %s seconds" % timeout)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = func()
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def forget(self, name):
+        """Lets later callers of a device's calls in flight start anew."""
+        with self._lock:
+            for key in [k for k in self._flights if k[0] == name]:
+                del self._flights[key]
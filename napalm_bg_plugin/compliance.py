@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# NAPALM is imported where it is needed since importing it loads every
+# driver, which would slow down the start of the plugin. YAML is imported
+# there too, as only validation files need it.
+
+DEFAULT_MAX_DEFINITIONS = 32
+
+PASS = 'pass'
+FAIL = 'fail'
+SKIPPED = 'skipped'
+
+
+class Rule(object):
+    """One check of a validation definition."""
+
+    def __init__(self, key, getter, kwargs, expected):
+        self.key = key
+        self.getter = getter
+        self.kwargs = kwargs
+        self.expected = expected
+        # Rules calling the same getter with the same arguments share results
+        self.call = (getter, json.dumps(kwargs, sort_keys=True))
+
+
+class ValidationCache(object):
+    """Parses validation definitions once and keeps them by content hash.
+
+    Validation files are still read on every call, so that edits are picked
+    up, but they are only parsed again when their content changes.
+    """
+
+    def __init__(self, max_definitions=DEFAULT_MAX_DEFINITIONS):
+        self.max_definitions = max_definitions
+        self._rules = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, validation_file=None, validation_source=None):
+        """Returns the rules of a validation file or source."""
+        from napalm.base.exceptions import ValidationException
+
+        if validation_file:
+            try:
+                with open(validation_file, 'rb') as stream:
+                    content = stream.read()
+            except IOError:
+                raise ValidationException("File %s not found."
+                                          % validation_file)
+        else:
+            content = json.dumps(validation_source, sort_keys=True,
+                                 default=str).encode('utf-8')
+
+        key = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            rules = self._rules.get(key)
+            if rules is not None:
+                self._rules.move_to_end(key)
+                return rules
+
+        if validation_file:
+            import yaml
+
+            try:
+                validation_source = yaml.safe_load(content)
+            except yaml.YAMLError as exc:
+                raise ValidationException(exc)
+        rules = parse(validation_source)
+
+        with self._lock:
+            self._rules[key] = rules
+            while len(self._rules) > self.max_definitions:
+                self._rules.popitem(last=False)
+        return rules
+
+
+def parse(validation_source):
+    """Turns validation definitions into rules like NAPALM reads them."""
+    from napalm.base.exceptions import ValidationException
+
+    if not isinstance(validation_source, list):
+        raise ValidationException("Validation definitions must be a list")
+
+    rules = []
+    for validation_check in copy.deepcopy(validation_source):
+        for getter, expected in validation_check.items():
+            if getter == 'get_config':
+                # Not supported by NAPALM either
+                continue
+            key = expected.pop('_name', '') or getter
+            kwargs = expected.pop('_kwargs', {})
+            rules.append(Rule(key, getter, kwargs, expected))
+    return tuple(rules)
+
+
+def required_calls(rules):
+    """Returns one rule per distinct getter call needed by the rules."""
+    calls = OrderedDict()
+    for rule in rules:
+        calls.setdefault(rule.call, rule)
+    return list(calls.values())
+
+
+def evaluate(rules, results):
+    """Evaluates every rule against the getter results of every device.
+
+    ``results`` maps each device to the result of each rule's ``call``, or
+    to the ``NotImplementedError`` the getter raised. Rules are evaluated
+    one at a time across all devices, and devices that returned the same
+    result share a single comparison. Returns NAPALM's report per device.
+    """
+    from napalm.base.validate import compare
+
+    reports = dict((name, {}) for name in results)
+    for rule in rules:
+        outcomes = {}
+        for name, calls in results.items():
+            actual = calls[rule.call]
+            if isinstance(actual, NotImplementedError):
+                reports[name][rule.key] = {'skipped': True,
+                                           'reason': 'NotImplemented'}
+                continue
+            digest = json.dumps(actual, sort_keys=True, default=str)
+            if digest not in outcomes:
+                # compare consumes both sides, so give it copies
+                outcomes[digest] = compare(copy.deepcopy(rule.expected),
+                                           copy.deepcopy(actual))
+            reports[name][rule.key] = copy.deepcopy(outcomes[digest])
+
+    for report in reports.values():
+        complies = all(v.get('complies', True) for v in report.values())
+        report['skipped'] = [k for k, v in report.items()
+                             if v.get('skipped', False)]
+        report['complies'] = complies
+    return reports
+
+
+def matrix(rules, reports):
+    """Aggregates device reports into a pass/fail matrix of rules by device."""
+    keys = list(OrderedDict((rule.key, None) for rule in rules))
+    summary = dict((key, {PASS: 0, FAIL: 0, SKIPPED: 0}) for key in keys)
+    devices = {}
+    for name, report in reports.items():
+        row = {}
+        for key in keys:
+            outcome = report[key]
+            if outcome.get('skipped', False):
+                status = SKIPPED
+            elif outcome.get('complies', True):
+                status = PASS
+            else:
+                status = FAIL
+            row[key] = status
+            summary[key][status] += 1
+        devices[name] = row
+
+    return {
+        'rules': keys,
+        'devices': devices,
+        'complies': dict((name, report['complies'])
+                         for name, report in reports.items()),
+        'summary': summary,
+    }
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import difflib
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_VERSIONS = 3
+
+UNCHANGED = 'unchanged'
+CHANGED = 'changed'
+FULL = 'full'
+
+
+def config_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ConfigHistory(object):
+    """Remembers the last few versions of each device's config sections.
+
+    Versions are keyed by their hash so that a caller who only knows the
+    hash of the config it saw last can be sent a diff instead of the whole
+    config.
+    """
+
+    def __init__(self, versions=DEFAULT_VERSIONS):
+        self.versions = versions
+        self._sections = {}
+        self._lock = threading.Lock()
+
+    def changes(self, name, section, text, known_hash=None):
+        """Describes ``text`` relative to the version with ``known_hash``.
+
+        Returns a dictionary with the ``status`` and ``hash`` of the
+        section, plus a unified ``diff`` when the caller's version is still
+        remembered or the full ``config`` when it is not.
+        """
+        digest = config_hash(text)
+        with self._lock:
+            history = self._sections.setdefault((name, section),
+                                                OrderedDict())
+            previous = history.get(known_hash) if known_hash else None
+            history[digest] = text
+            history.move_to_end(digest)
+            while len(history) > self.versions:
+                history.popitem(last=False)
+
+        if known_hash == digest:
+            return {'status': UNCHANGED, 'hash': digest}
+        if previous is not None:
+            diff = difflib.unified_diff(
+                previous.splitlines(True),
+                text.splitlines(True),
+                fromfile='%s@%s' % (section, known_hash[:12]),
+                tofile='%s@%s' % (section, digest[:12])
+            )
+            return {'status': CHANGED, 'hash': digest, 'diff': ''.join(diff)}
+        return {'status': FULL, 'hash': digest, 'config': text}
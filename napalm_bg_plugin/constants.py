@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Copies of the NAPALM constants needed to define the plugin's commands.
+
+Importing NAPALM loads every one of its drivers, so the plugin keeps its own
+copy of these instead of importing them when it starts.
+"""
+
+SUPPORTED_DRIVERS = [
+    'base',
+    'eos',
+    'ios',
+    'iosxr',
+    'junos',
+    'nxos',
+    'nxos_ssh',
+    'iosxr_netconf',
+]
+
+# Same as napalm.base.constants
+TRACEROUTE_TTL = 255
+TRACEROUTE_SOURCE = ''
+TRACEROUTE_TIMEOUT = 2
+TRACEROUTE_VRF = ''
+
+PING_SOURCE = ''
+PING_TTL = 255
+PING_TIMEOUT = 2
+PING_SIZE = 100
+PING_COUNT = 5
+PING_VRF = ''
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from array import array
+
+COUNTERS = (
+    'tx_errors',
+    'rx_errors',
+    'tx_discards',
+    'rx_discards',
+    'tx_octets',
+    'rx_octets',
+    'tx_unicast_packets',
+    'rx_unicast_packets',
+    'tx_multicast_packets',
+    'rx_multicast_packets',
+    'tx_broadcast_packets',
+    'rx_broadcast_packets',
+)
+
+DEFAULT_SAMPLES = 60
+
+# Stored for counters the device does not report (NAPALM uses -1)
+_MISSING = 2 ** 64 - 1
+
+
+def counter_delta(old, new):
+    """Returns ``(delta, reset)`` between two readings of a counter.
+
+    A counter that went down either wrapped around or was reset. It is
+    treated as a 32 or 64 bit wrap when the wrapped delta is plausible,
+    otherwise as a reset, in which case the new reading is the delta.
+    """
+    if new >= old:
+        return new - old, False
+    for width in (32, 64):
+        if old < 2 ** width:
+            wrapped = new + 2 ** width - old
+            if wrapped < 2 ** (width - 1):
+                return wrapped, False
+    return new, True
+
+
+class CounterRing(object):
+    """Fixed size ring buffer of counter samples for one interface.
+
+    Timestamps and counter values live in flat arrays rather than in a
+    dictionary per sample, so the memory used per interface is constant.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.times = array('d', [0.0] * size)
+        self.values = array('Q', [0] * (size * len(COUNTERS)))
+        self.count = 0
+        self.next = 0
+
+    def append(self, timestamp, counters):
+        offset = self.next * len(COUNTERS)
+        self.times[self.next] = timestamp
+        for i, counter in enumerate(COUNTERS):
+            value = counters.get(counter)
+            if value is None or value < 0:
+                value = _MISSING
+            self.values[offset + i] = int(value)
+        self.next = (self.next + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def samples(self, since=0):
+        """Yields ``(timestamp, values)`` from oldest to newest."""
+        first = (self.next - self.count) % self.size
+        for n in range(self.count):
+            slot = (first + n) % self.size
+            if self.times[slot] >= since:
+                offset = slot * len(COUNTERS)
+                yield (self.times[slot],
+                       self.values[offset:offset + len(COUNTERS)])
+
+
+class CounterHistory(object):
+    """Keeps recent interface counter samples per device and computes rates."""
+
+    def __init__(self, size=DEFAULT_SAMPLES):
+        self.size = size
+        self._rings = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, interfaces, timestamp=None):
+        """Stores a ``get_interfaces_counters`` result as a new sample."""
+        timestamp = timestamp or time.time()
+        with self._lock:
+            rings = self._rings.setdefault(name, {})
+            for interface, counters in interfaces.items():
+                if interface not in rings:
+                    rings[interface] = CounterRing(self.size)
+                rings[interface].append(timestamp, counters)
+
+    def rates(self, name, window, interface=None):
+        """Returns counter deltas and rates per interface over the window.
+
+        Rates are per second; ``bps`` and ``pps`` summarize the octet and
+        packet counters for each direction.
+        """
+        since = time.time() - window
+        with self._lock:
+            rings = dict(self._rings.get(name, {}))
+            if interface:
+                rings = dict((k, v) for k, v in rings.items()
+                             if k == interface)
+            samples = dict((k, list(ring.samples(since)))
+                           for k, ring in rings.items())
+
+        return dict((k, _rates(v)) for k, v in samples.items())
+
+
+def _rates(samples):
+    if len(samples) < 2:
+        return {'samples': len(samples), 'window': 0, 'deltas': {},
+                'rates': {}, 'resets': 0}
+
+    deltas = dict((counter, 0) for counter in COUNTERS)
+    resets = 0
+    for (_, old), (_, new) in zip(samples, samples[1:]):
+        for i, counter in enumerate(COUNTERS):
+            if deltas[counter] is None:
+                continue
+            if old[i] == _MISSING or new[i] == _MISSING:
+                deltas[counter] = None
+                continue
+            delta, reset = counter_delta(old[i], new[i])
+            deltas[counter] += delta
+            resets += reset
+
+    elapsed = samples[-1][0] - samples[0][0]
+    deltas = dict((k, v) for k, v in deltas.items() if v is not None)
+    rates = dict((k, v / elapsed) for k, v in deltas.items()) if elapsed else {}
+    result = {
+        'samples': len(samples),
+        'window': elapsed,
+        'deltas': deltas,
+        'rates': rates,
+        'resets': resets,
+    }
+    for direction in ('tx', 'rx'):
+        if direction + '_octets' in rates:
+            result.setdefault('bps', {})[direction] = (
+                rates[direction + '_octets'] * 8)
+        packets = [rates.get('%s_%s_packets' % (direction, kind))
+                   for kind in ('unicast', 'multicast', 'broadcast')]
+        packets = [rate for rate in packets if rate is not None]
+        if packets:
+            result.setdefault('pps', {})[direction] = sum(packets)
+    return result
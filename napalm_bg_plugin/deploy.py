@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import time
+
+from napalm_bg_plugin.fanout import run_concurrently
+
+COMMITTED = 'committed'
+DRY_RUN = 'dry_run'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+ROLLED_BACK = 'rolled_back'
+SKIPPED = 'skipped'
+
+FAILED_STATUSES = (FAILED, ROLLED_BACK)
+
+
+class DeploymentError(Exception):
+    pass
+
+
+def stage(device, load, commit=False, verify=True):
+    """Loads, compares and optionally commits a change on one device.
+
+    ``load(device)`` populates the candidate configuration. Nothing is
+    committed when the candidate has no diff or ``commit`` is false. On a
+    failure the candidate is discarded, or the commit is rolled back if it
+    already went through. With ``verify`` the device must still answer
+    ``is_alive`` after the commit.
+    """
+    report = {'diff': None, 'timings': {}}
+    committed = False
+    try:
+        _timed(report, 'load', load, device)
+        report['diff'] = _timed(report, 'compare', device.compare_config)
+        if not report['diff'] or not commit:
+            _timed(report, 'discard', device.discard_config)
+            report['status'] = DRY_RUN if report['diff'] else UNCHANGED
+            return report
+
+        _timed(report, 'commit', device.commit_config)
+        committed = True
+        if verify and not device.is_alive().get('is_alive', False):
+            raise DeploymentError("Device stopped responding after the "
+                                  "commit")
+        report['status'] = COMMITTED
+    except Exception as exc:
+        report['status'] = FAILED
+        report['error'] = str(exc) or exc.__class__.__name__
+        try:
+            if committed:
+                _timed(report, 'rollback', device.rollback)
+                report['status'] = ROLLED_BACK
+            else:
+                _timed(report, 'discard', device.discard_config)
+        except Exception as cleanup_exc:
+            report['cleanup_error'] = (str(cleanup_exc) or
+                                       cleanup_exc.__class__.__name__)
+    return report
+
+
+def plan_waves(names, canary, wave_size):
+    """Splits devices into a canary wave followed by waves of wave_size."""
+    waves = []
+    if canary:
+        waves.append(names[:canary])
+        names = names[canary:]
+    for start in range(0, len(names), max(1, wave_size)):
+        waves.append(names[start:start + wave_size])
+    return [wave for wave in waves if wave]
+
+
+def deploy(names, run_device, canary=1, wave_size=50, parallelism=16,
+           max_failures=0):
+    """Runs ``run_device(name)`` over all devices wave by wave.
+
+    ``run_device`` returns a report like ``stage`` does. The deployment
+    stops before the next wave once more than ``max_failures`` devices have
+    failed, and the devices that were not attempted are reported as
+    skipped.
+    """
+    reports = {}
+    failures = 0
+    waves = plan_waves(list(names), canary, wave_size)
+    start = time.time()
+
+    for index, wave in enumerate(waves):
+        results, errors = run_concurrently(wave, run_device,
+                                           max_workers=parallelism)
+        for name in wave:
+            report = results.get(name) or {'status': FAILED,
+                                           'error': errors.get(name)}
+            report['wave'] = index
+            reports[name] = report
+            failures += report['status'] in FAILED_STATUSES
+        if failures > max_failures:
+            break
+
+    for name in names:
+        reports.setdefault(name, {'status': SKIPPED})
+
+    return {
+        'aborted': failures > max_failures,
+        'failures': failures,
+        'waves': len(waves),
+        'duration': time.time() - start,
+        'devices': reports,
+    }
+
+
+def _timed(report, step, func, *args):
+    start = time.time()
+    try:
+        return func(*args)
+    finally:
+        report['timings'][step] = time.time() - start
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+import bisect
+import ipaddress
+import json
+import os
+import threading
+import time
+import uuid
+from fnmatch import fnmatchcase
+
+FIELDS = ('hostname', 'fqdn', 'vendor', 'model', 'os_version',
+          'serial_number')
+
+ADDRESS = 'address'
+PREFIX = 'prefix'
+MIN_UPTIME = 'min_uptime'
+MAX_UPTIME = 'max_uptime'
+GROUP = 'group'
+
+CRITERIA = FIELDS + (ADDRESS, PREFIX, MIN_UPTIME, MAX_UPTIME, GROUP)
+
+# Seconds the boot time derived from the uptime may drift without the device
+# counting as rebooted
+BOOT_TOLERANCE = 60
+
+
+def parse_query(query):
+    """Parses ``field=value,field=value`` into criteria.
+
+    Each criterion may list several values separated by ``|``, any of which
+    matches. Values of the fact fields may contain shell style wildcards.
+    """
+    criteria = {}
+    for criterion in query.split(','):
+        field, _, value = criterion.partition('=')
+        field = field.strip()
+        if field not in CRITERIA:
+            raise ValueError("Can not select devices by %s, use one of %s"
+                             % (field, ', '.join(CRITERIA)))
+        criteria[field] = [v.strip() for v in value.split('|') if v.strip()]
+    return criteria
+
+
+def _seconds(field, values):
+    """Reads the single number of seconds of an uptime criterion."""
+    try:
+        seconds, = values
+        return float(seconds)
+    except ValueError:
+        raise ValueError("%s=%s is not a number of seconds"
+                         % (field, '|'.join(values)))
+
+
+class FactsIndex(object):
+    """Index of the facts and interface addresses of every device.
+
+    Devices are updated from ``get_facts`` and ``get_interfaces_ip``
+    results and can be selected by their facts, by their uptime and by the
+    addresses on their interfaces. With a ``path``, the index is saved there
+    whenever a device's entry changes and loaded from it on start, keeping
+    only the devices in ``names`` when they are given. Without one, the
+    index is only kept in memory.
+    """
+
+    def __init__(self, path=None, names=None):
+        self.path = path
+        self._records = {}
+        # field -> lower cased value -> device names
+        self._fields = dict((field, {}) for field in FIELDS)
+        # Sorted (IP version, address as an integer, device name)
+        self._addresses = []
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if self.path is not None:
+            self._load(names)
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._records
+
+    def get(self, name):
+        with self._lock:
+            record = self._records.get(name)
+        if record is None:
+            raise ValueError("There are no facts of %s" % name)
+        return _present(record)
+
+    def update_facts(self, name, facts):
+        """Indexes a ``get_facts`` result, returning whether it changed."""
+        with self._lock:
+            record = dict(self._records.get(name, {}))
+            for field in FIELDS:
+                record[field] = facts.get(field)
+            uptime = facts.get('uptime')
+            if uptime is not None and uptime >= 0:
+                booted = int(time.time() - uptime)
+                if abs(booted - record.get('booted', 0)) > BOOT_TOLERANCE:
+                    record['booted'] = booted
+            changed = self._replace(name, record)
+        if changed:
+            self._save()
+        return changed
+
+    def update_addresses(self, name, interfaces_ip):
+        """Indexes a ``get_interfaces_ip`` result, returning whether it changed."""
+        interfaces = dict(
+            (interface, sorted('%s/%s' % (address, detail['prefix_length'])
+                               for family in families.values()
+                               for address, detail in family.items()))
+            for interface, families in interfaces_ip.items())
+        with self._lock:
+            record = dict(self._records.get(name, {}), interfaces=interfaces)
+            changed = self._replace(name, record)
+        if changed:
+            self._save()
+        return changed
+
+    def select(self, criteria, names=None):
+        """Returns the devices matching every criterion, see ``parse_query``."""
+        now = time.time()
+        with self._lock:
+            selected = set(self._records)
+            if names is not None:
+                selected &= set(names)
+            for field, values in criteria.items():
+                if field in FIELDS:
+                    selected &= self._match(field, values)
+                elif field in (ADDRESS, PREFIX):
+                    selected &= self._within(values)
+                elif field in (MIN_UPTIME, MAX_UPTIME):
+                    limit = _seconds(field, values)
+                    selected = set(
+                        name for name in selected
+                        if 'booted' in self._records[name] and
+                        (now - self._records[name]['booted'] >= limit
+                         if field == MIN_UPTIME else
+                         now - self._records[name]['booted'] <= limit))
+                else:
+                    raise ValueError("Can not select devices by %s" % field)
+        return sorted(selected)
+
+    def _match(self, field, patterns):
+        index = self._fields[field]
+        matched = set()
+        for pattern in patterns:
+            pattern = pattern.lower()
+            if any(char in pattern for char in '*?['):
+                for value, names in index.items():
+                    if fnmatchcase(value, pattern):
+                        matched |= names
+            else:
+                matched |= index.get(pattern, set())
+        return matched
+
+    def _within(self, networks):
+        matched = set()
+        for network in networks:
+            network = ipaddress.ip_network(network, strict=False)
+            start = bisect.bisect_left(
+                self._addresses,
+                (network.version, int(network.network_address)))
+            end = bisect.bisect_left(
+                self._addresses,
+                (network.version, int(network.broadcast_address) + 1))
+            matched.update(name for _, _, name in self._addresses[start:end])
+        return matched
+
+    def _replace(self, name, record):
+        # Called holding the lock, so an update can not be lost to another
+        # one read before it was replaced
+        old = self._records.get(name)
+        if old == record:
+            return False
+        if old is not None:
+            self._index(name, old, add=False)
+        self._index(name, record, add=True)
+        self._records[name] = record
+        return True
+
+    def _index(self, name, record, add):
+        for field in FIELDS:
+            value = record.get(field)
+            if value is None:
+                continue
+            names = self._fields[field].setdefault(str(value).lower(), set())
+            if add:
+                names.add(name)
+            else:
+                names.discard(name)
+                if not names:
+                    del self._fields[field][str(value).lower()]
+
+        for address in set(_addresses(record)):
+            entry = (address.version, int(address), name)
+            position = bisect.bisect_left(self._addresses, entry)
+            present = (position < len(self._addresses) and
+                       self._addresses[position] == entry)
+            if add and not present:
+                self._addresses.insert(position, entry)
+            elif not add and present:
+                del self._addresses[position]
+
+    def _load(self, names=None):
+        try:
+            with open(self.path) as stored:
+                records = json.load(stored)
+        except (IOError, ValueError):
+            return
+        if names is not None:
+            # Devices that left the inventory are not selected any more
+            names = set(names)
+            records = dict((name, record) for name, record in records.items()
+                           if name in names)
+        for name, record in records.items():
+            self._index(name, record, add=True)
+        self._records = records
+
+    def _save(self):
+        if self.path is None:
+            return
+        # Saves are taken in turn, each writing the latest records
+        with self._save_lock:
+            with self._lock:
+                content = json.dumps(self._records, sort_keys=True)
+            temporary = '%s.%s.tmp' % (self.path, uuid.uuid4().hex)
+            with open(temporary, 'w') as stored:
+                stored.write(content)
+            os.replace(temporary, self.path)
+
+
+def _addresses(record):
+    for addresses in record.get('interfaces', {}).values():
+        for address in addresses:
+            yield ipaddress.ip_interface(address).ip
+
+
+def _present(record):
+    record = dict(record)
+    booted = record.pop('booted', None)
+    record['uptime'] = time.time() - booted if booted is not None else None
+    return record
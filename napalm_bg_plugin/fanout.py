@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_WORKERS = 16
+
+# Upper bound on how long to sleep between checks for timed out calls
+_POLL_INTERVAL = 1.0
+
+
+def run_concurrently(names, func, max_workers=DEFAULT_WORKERS, timeout=None):
+    """Calls ``func(name)`` for every name on a bounded thread pool.
+
+    Returns a ``(results, errors)`` tuple of dictionaries keyed by name.
+    ``timeout`` applies to each call separately, counted from the moment
+    it starts running. A call that runs out of time is reported as an
+    error; its thread is left to finish in the background since driver
+    calls cannot be interrupted.
+    """
+    results, errors = {}, {}
+    if not names:
+        return results, errors
+
+    started = {}
+
+    def call(name):
+        started[name] = time.time()
+        return func(name)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers,
+                                                         len(names))))
+    futures = dict((executor.submit(call, name), name) for name in names)
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending,
+                                 timeout=_next_check(pending, futures,
+                                                     started, timeout),
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as exc:
+                    errors[name] = str(exc) or exc.__class__.__name__
+
+            if timeout is None:
+                continue
+            now = time.time()
+            for future in list(pending):
+                name = futures[future]
+                if name in started and now - started[name] >= timeout:
+                    pending.discard(future)
+                    errors[name] = 'Timed out after %s seconds' % timeout
+    finally:
+        executor.shutdown(wait=False)
+
+    return results, errors
+
+
+def _next_check(pending, futures, started, timeout):
+    """Seconds until the earliest running call times out."""
+    if timeout is None:
+        return None
+    now = time.time()
+    remaining = [started[futures[future]] + timeout - now
+                 for future in pending if futures[future] in started]
+    return max(0, min(remaining + [_POLL_INTERVAL]))
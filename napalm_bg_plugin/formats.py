@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import base64
+import gzip
+import json
+from array import array
+
+from napalm_bg_plugin.paging import iter_rows
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+NATIVE = 'native'
+COLUMNAR = 'columnar'
+FORMATS = (NATIVE, COLUMNAR)
+
+JSON = 'json'
+GZIP = 'gzip'
+MSGPACK = 'msgpack'
+ENCODINGS = (JSON, GZIP, MSGPACK)
+
+# Names of the keys leading to each row of the tabular getters
+COLUMNAR_INDEX = {
+    'get_arp_table': [],
+    'get_interfaces_counters': ['interface'],
+    'get_mac_address_table': [],
+    'get_route_to': ['prefix'],
+}
+
+
+def to_columnar(result, index=()):
+    """Turns a table of rows into a column schema with arrays of values.
+
+    The result is flattened like ``iter_rows`` does. The keys leading to a
+    row become the ``index`` columns and every key of the rows becomes a
+    column. Rows that lack a column get ``None``.
+    """
+    columns = list(index)
+    positions = dict((column, i) for i, column in enumerate(columns))
+    data = [[] for _ in columns]
+    count = 0
+
+    for row in iter_rows(result):
+        values = row['value'] if isinstance(row['value'], dict) else {}
+        for column in values:
+            if column not in positions:
+                positions[column] = len(columns)
+                columns.append(column)
+                data.append([None] * count)
+        for i, column in enumerate(columns):
+            if i < len(index):
+                path = row['path']
+                data[i].append(path[i] if i < len(path) else None)
+            else:
+                data[i].append(values.get(column))
+        count += 1
+
+    return {'columns': columns, 'rows': count, 'data': data}
+
+
+def pack_columns(table):
+    """Packs integer columns of a columnar table into native arrays.
+
+    Returns a copy of the table whose integer columns are the bytes of a
+    native 64 bit ``array`` and which lists the typecode of every packed
+    column in ``types`` (``None`` for columns left as they are).
+    """
+    data, types = [], []
+    for values in table['data']:
+        typecode = _int_typecode(values)
+        if typecode is None:
+            data.append(values)
+        else:
+            data.append(array(typecode, values).tobytes())
+        types.append(typecode)
+    return dict(table, data=data, types=types)
+
+
+def encode(result, encoding):
+    """Encodes a result as a base64 payload when a compact encoding is asked for."""
+    if encoding in (None, JSON):
+        return result
+    if encoding == GZIP:
+        payload = gzip.compress(json.dumps(result).encode('utf-8'))
+    elif encoding == MSGPACK:
+        if msgpack is None:
+            raise ValueError("The msgpack encoding needs the msgpack "
+                             "package to be installed")
+        if isinstance(result, dict) and 'columns' in result:
+            result = pack_columns(result)
+        payload = msgpack.packb(result, use_bin_type=True)
+    else:
+        raise ValueError("Unknown encoding %s" % encoding)
+    return {
+        'encoding': encoding,
+        'payload': base64.b64encode(payload).decode('ascii'),
+    }
+
+
+def _int_typecode(values):
+    if not values or not all(isinstance(v, int) and not isinstance(v, bool)
+                             for v in values):
+        return None
+    if min(values) < 0:
+        return 'q' if max(values) < 2 ** 63 else None
+    return 'Q' if max(values) < 2 ** 64 else None
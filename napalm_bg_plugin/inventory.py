@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import json
+
+ALL_DEVICES = 'all'
+
+DEVICE_DEFAULTS = {
+    'timeout': 60,
+    'optional_args': None,
+}
+
+
+class Inventory(object):
+    """The set of devices a plugin can talk to, keyed by device name.
+
+    Each device is a dictionary with the ``driver``, ``hostname``,
+    ``username``, ``password``, ``timeout`` and ``optional_args`` needed to
+    build a NAPALM driver. Devices can also be addressed by group, and the
+    implicit ``all`` group contains every device. Targets containing ``=``
+    are queries, which are resolved by the ``selector`` when there is one.
+    """
+
+    def __init__(self, devices, groups=None):
+        self._devices = devices
+        self.selector = None
+        self._groups = {}
+        for name, group_names in (groups or {}).items():
+            self._groups[name] = list(group_names)
+        for name, device in devices.items():
+            for group in device.get('groups', []):
+                self._groups.setdefault(group, [])
+                if name not in self._groups[group]:
+                    self._groups[group].append(name)
+
+    @classmethod
+    def single(cls, driver, hostname, username, password, timeout=60,
+               optional_args=None):
+        """Creates an inventory containing just one device."""
+        for item, value in (('driver', driver), ('hostname', hostname)):
+            if value is None:
+                raise ValueError("No %s given for the device" % item)
+        return cls({
+            hostname: {
+                'driver': driver,
+                'hostname': hostname,
+                'username': username,
+                'password': password,
+                'timeout': timeout,
+                'optional_args': optional_args,
+            }
+        })
+
+    @classmethod
+    def from_file(cls, path):
+        """Loads an inventory from a JSON file.
+
+        The file contains a ``devices`` list and optionally ``defaults``,
+        which are applied to every device, and ``groups``, which maps a group
+        name to device names. Devices are named by their ``name`` key or
+        their hostname and may list the ``groups`` they belong to.
+        """
+        with open(path) as inventory_file:
+            definition = json.load(inventory_file)
+
+        defaults = dict(DEVICE_DEFAULTS)
+        defaults.update(definition.get('defaults', {}))
+
+        devices = {}
+        for entry in definition.get('devices', []):
+            device = dict(defaults)
+            device.update(entry)
+            for item in ('driver', 'hostname', 'username', 'password'):
+                if device.get(item) is None:
+                    raise ValueError("Device %s in %s has no %s"
+                                     % (entry, path, item))
+            devices[device.pop('name', device['hostname'])] = device
+
+        return cls(devices, groups=definition.get('groups'))
+
+    def __contains__(self, name):
+        return name in self._devices
+
+    def __len__(self):
+        return len(self._devices)
+
+    @property
+    def names(self):
+        return sorted(self._devices)
+
+    @property
+    def groups(self):
+        return dict(self._groups, **{ALL_DEVICES: self.names})
+
+    def get(self, name):
+        try:
+            return self._devices[name]
+        except KeyError:
+            raise ValueError("Unknown device %s" % name)
+
+    def init_params(self, name):
+        """Returns the keyword arguments for the device's driver."""
+        device = self.get(name)
+        return {
+            'hostname': device['hostname'],
+            'username': device['username'],
+            'password': device['password'],
+            'timeout': device.get('timeout', DEVICE_DEFAULTS['timeout']),
+            'optional_args': device.get('optional_args') or {},
+        }
+
+    def is_device(self, target):
+        """Whether the target refers to exactly one device."""
+        if target is None:
+            return len(self._devices) == 1
+        return target in self._devices
+
+    def resolve(self, target):
+        """Returns the device names that a target refers to.
+
+        A target is either a device name, a group name or a query. When no
+        target is given the inventory must contain exactly one device.
+        """
+        if target is None:
+            if len(self._devices) != 1:
+                raise ValueError("A target device or group is required")
+            return self.names
+        if target in self._devices:
+            return [target]
+        if target == ALL_DEVICES:
+            return self.names
+        if target in self._groups:
+            return list(self._groups[target])
+        if self.selector is not None and '=' in target:
+            return self.selector(target)
+        raise ValueError("Unknown device or group %s" % target)
+
+    def resolve_all(self, targets):
+        """Returns the unique device names that a list of targets refers to."""
+        names, seen = [], set()
+        for target in targets:
+            for name in self.resolve(target):
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+        return names
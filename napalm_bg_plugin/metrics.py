@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+import functools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+DEFAULT_SAMPLES = 1024
+# Every how many calls of a command the size of its result is measured
+DEFAULT_SIZE_SAMPLING = 10
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+JSON = 'json'
+PROMETHEUS = 'prometheus'
+METRICS_FORMATS = (JSON, PROMETHEUS)
+
+_PREFIX = 'napalm_'
+
+
+class Histogram(object):
+    """Count and sum of observations, with quantiles of the latest ones."""
+
+    def __init__(self, samples=DEFAULT_SAMPLES):
+        self.count = 0
+        self.sum = 0.0
+        self._samples = deque(maxlen=samples)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self._samples.append(value)
+
+    def quantiles(self):
+        values = sorted(self._samples)
+        if not values:
+            return dict((q, None) for q in QUANTILES)
+        return dict((q, values[min(len(values) - 1, int(q * len(values)))])
+                    for q in QUANTILES)
+
+
+class Metrics(object):
+    """Thread safe registry of labelled counters and histograms.
+
+    Serializing a result to measure its size costs about as much as
+    returning it, so only one in ``size_sampling`` calls of each command is
+    measured, and none with a ``size_sampling`` of 0.
+    """
+
+    def __init__(self, samples=DEFAULT_SAMPLES,
+                 size_sampling=DEFAULT_SIZE_SAMPLING):
+        self.samples = samples
+        self.size_sampling = size_sampling
+        self._calls = {}
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self.samples)
+            self._histograms[key].observe(value)
+
+    def measures_size(self, command):
+        """Whether the result of this call of the command is measured."""
+        if not self.size_sampling:
+            return False
+        with self._lock:
+            calls = self._calls.get(command, 0)
+            self._calls[command] = calls + 1
+        return calls % self.size_sampling == 0
+
+    def since(self, name, start, **labels):
+        """Observes the seconds elapsed since ``start``."""
+        self.observe(name, time.time() - start, **labels)
+
+    def snapshot(self):
+        """Returns every counter and histogram, grouped by metric name."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [(key, histogram.count, histogram.sum,
+                           histogram.quantiles())
+                          for key, histogram in sorted(
+                              self._histograms.items(),
+                              key=lambda item: item[0])]
+
+        result = {'counters': {}, 'histograms': {}}
+        for (name, labels), value in counters:
+            result['counters'].setdefault(name, []).append(
+                {'labels': dict(labels), 'value': value})
+        for (name, labels), count, total, quantiles in histograms:
+            series = {'labels': dict(labels), 'count': count, 'sum': total}
+            for q, value in quantiles.items():
+                series['p%d' % round(q * 100)] = value
+            result['histograms'].setdefault(name, []).append(series)
+        return result
+
+    def prometheus(self):
+        """Returns the metrics in Prometheus' text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, series in sorted(snapshot['counters'].items()):
+            lines.append('# TYPE %s%s counter' % (_PREFIX, name))
+            for entry in series:
+                lines.append('%s%s%s %s' % (_PREFIX, name,
+                                            _labels(entry['labels']),
+                                            entry['value']))
+        for name, series in sorted(snapshot['histograms'].items()):
+            lines.append('# TYPE %s%s summary' % (_PREFIX, name))
+            for entry in series:
+                for q in QUANTILES:
+                    value = entry['p%d' % round(q * 100)]
+                    if value is not None:
+                        lines.append('%s%s%s %s' % (
+                            _PREFIX, name,
+                            _labels(entry['labels'], quantile=str(q)),
+                            value))
+                lines.append('%s%s_sum%s %s' % (_PREFIX, name,
+                                                _labels(entry['labels']),
+                                                entry['sum']))
+                lines.append('%s%s_count%s %s' % (_PREFIX, name,
+                                                  _labels(entry['labels']),
+                                                  entry['count']))
+        return '\n'.join(lines) + '\n'
+
+
+def instrument_commands(cls):
+    """Class decorator that records every command of a plugin in its metrics.
+
+    Each method carrying a brewtils command is wrapped to time it, count its
+    errors and, for a sample of the calls, measure the size of its
+    serialized result in the instance's ``_metrics``. Calls that the
+    instance's ``_profiler`` asks for are also profiled, and their result
+    always measured, see ``napalm_bg_plugin.profiling``.
+    """
+    for name in dir(cls):
+        method = getattr(cls, name)
+        if getattr(method, '_command', None) is not None:
+            setattr(cls, name, _instrumented(name, method))
+    return cls
+
+
+def _instrumented(name, method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profile = self._profiler.start(name)
+        # Threads working on the call find the profile here
+        self._local.profile = profile
+        start = time.time()
+        try:
+            with ExitStack() as stack:
+                if profile is not None and not profile.devices:
+                    stack.enter_context(profile.profiling())
+                result = method(self, *args, **kwargs)
+        except Exception:
+            self._metrics.increment('command_errors_total', command=name)
+            raise
+        finally:
+            self._local.profile = None
+            duration = time.time() - start
+            self._metrics.observe('command_seconds', duration, command=name)
+
+        if profile is None and not self._metrics.measures_size(name):
+            return result
+        start = time.time()
+        size = len(json.dumps(result, default=str))
+        serialize_seconds = time.time() - start
+        self._metrics.observe('serialize_seconds', serialize_seconds,
+                              command=name)
+        self._metrics.observe('result_bytes', size, command=name)
+        if profile is not None:
+            result = self._profiler.finish(
+                profile, result, duration=duration,
+                serialize_seconds=serialize_seconds, result_bytes=size)
+        return result
+    return wrapper
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in sorted(labels.items()))
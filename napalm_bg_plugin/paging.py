@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+DEFAULT_SPOOL_TTL = 600
+
+
+def iter_rows(result, path=()):
+    """Flattens a getter result into ``{'path': [...], 'value': ...}`` rows.
+
+    Lists yield one row per element. Dictionaries whose values are all
+    lists or dictionaries (an ARP table per VRF, routes per prefix, BGP
+    neighbors per VRF and AS) are descended into, adding the key to the
+    path. Anything else is a single row.
+    """
+    if isinstance(result, list):
+        for item in result:
+            yield {'path': list(path), 'value': item}
+    elif isinstance(result, dict) and result and all(
+            isinstance(value, (dict, list)) for value in result.values()):
+        for key, value in result.items():
+            for row in iter_rows(value, path + (key,)):
+                yield row
+    else:
+        yield {'path': list(path), 'value': result}
+
+
+class Spool(object):
+    def __init__(self, path, offsets, total, page_size):
+        self.path = path
+        self.offsets = offsets
+        self.total = total
+        self.page_size = page_size
+        self.last_used = time.time()
+
+
+class ResultSpool(object):
+    """Writes large results to disk as NDJSON and serves them page by page.
+
+    Spooled results are referred to by a cursor of the form
+    ``<spool id>:<page>``, and are deleted once they have not been read for
+    ``ttl`` seconds.
+    """
+
+    def __init__(self, directory=None, ttl=DEFAULT_SPOOL_TTL):
+        self._directory = directory
+        self.ttl = ttl
+        self._spools = {}
+        self._lock = threading.Lock()
+
+    def spool(self, result, page_size):
+        """Spools a result and returns its first page."""
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        self.expire()
+
+        spool_id = uuid.uuid4().hex
+        path = os.path.join(self._spool_directory(), spool_id + '.ndjson')
+        offsets, total = [], 0
+        with open(path, 'w') as spool_file:
+            for row in iter_rows(result):
+                if total % page_size == 0:
+                    offsets.append(spool_file.tell())
+                spool_file.write(json.dumps(row) + '\n')
+                total += 1
+
+        with self._lock:
+            self._spools[spool_id] = Spool(path, offsets, total, page_size)
+        return self.page('%s:0' % spool_id)
+
+    def page(self, cursor):
+        """Returns the rows of the page a cursor points to."""
+        try:
+            spool_id, index = cursor.rsplit(':', 1)
+            index = int(index)
+        except (AttributeError, ValueError):
+            raise ValueError("Invalid cursor %s" % cursor)
+
+        with self._lock:
+            spool = self._spools.get(spool_id)
+        if spool is None:
+            raise ValueError("Cursor %s has expired" % cursor)
+        if not 0 <= index < max(1, len(spool.offsets)):
+            raise ValueError("Cursor %s is out of range" % cursor)
+        spool.last_used = time.time()
+
+        rows = []
+        if spool.offsets:
+            with open(spool.path) as spool_file:
+                spool_file.seek(spool.offsets[index])
+                for _ in range(spool.page_size):
+                    line = spool_file.readline()
+                    if not line:
+                        break
+                    rows.append(json.loads(line))
+
+        pages = max(1, len(spool.offsets))
+        return {
+            'cursor': cursor,
+            'page': index,
+            'pages': pages,
+            'total': spool.total,
+            'next_cursor': ('%s:%d' % (spool_id, index + 1)
+                            if index + 1 < pages else None),
+            'rows': rows,
+        }
+
+    def expire(self):
+        now = time.time()
+        with self._lock:
+            expired = [spool_id for spool_id, spool in self._spools.items()
+                       if now - spool.last_used > self.ttl]
+            spools = [self._spools.pop(spool_id) for spool_id in expired]
+        for spool in spools:
+            try:
+                os.remove(spool.path)
+            except OSError:
+                pass
+
+    def _spool_directory(self):
+        with self._lock:
+            if self._directory is None:
+                self._directory = tempfile.mkdtemp(prefix='napalm-spool-')
+            elif not os.path.isdir(self._directory):
+                os.makedirs(self._directory)
+            return self._directory
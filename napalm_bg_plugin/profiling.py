@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_TOP = 25
+DEFAULT_RECENT = 20
+
+RESULT = 'result'
+FILE = 'file'
+PROFILE_OUTPUTS = (RESULT, FILE)
+
+
+class Profile(object):
+    """Profile of one command call, taken in every thread working on it.
+
+    Only the work on ``devices`` is profiled when devices are given, else
+    the whole call is. Besides the cProfile statistics, the seconds spent
+    checking out sessions, opening them and in each driver method are added
+    up per device. Python 3.12 and later run a single profiler at a time, so
+    threads that cannot start one are only counted as ``skipped_threads``.
+    """
+
+    def __init__(self, command, devices=(), top=DEFAULT_TOP):
+        self.command = command
+        self.devices = set(devices)
+        self.top = top
+        self.started = time.time()
+        self._profiles = []
+        self._timings = {}
+        self._skipped = 0
+        self._active = threading.local()
+        self._lock = threading.Lock()
+
+    def wants(self, name):
+        return not self.devices or name in self.devices
+
+    @contextmanager
+    def profiling(self):
+        """Profiles the current thread, unless it is already profiled."""
+        if getattr(self._active, 'profiling', False):
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active, in this call or another
+            profile = None
+            with self._lock:
+                self._skipped += 1
+        self._active.profiling = True
+        try:
+            yield
+        finally:
+            self._active.profiling = False
+            if profile is not None:
+                profile.disable()
+                with self._lock:
+                    self._profiles.append(profile)
+
+    def add(self, name, metric, seconds, method=None):
+        with self._lock:
+            timings = self._timings.setdefault(name, {})
+            timings[metric] = timings.get(metric, 0.0) + seconds
+            if method is not None:
+                methods = timings.setdefault('methods', {})
+                methods[method] = methods.get(method, 0.0) + seconds
+
+    def __bool__(self):
+        with self._lock:
+            return bool(self._profiles or self._timings)
+
+    def stats(self):
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def report(self, **extra):
+        """Returns the time breakdown and the ``top`` frames by cumulative time."""
+        frames = []
+        stats = self.stats()
+        if stats is not None:
+            entries = sorted(stats.stats.items(),
+                             key=lambda entry: entry[1][3], reverse=True)
+            for (filename, line, function), entry in entries[:self.top]:
+                primitive_calls, calls, total_time, cumulative_time = (
+                    entry[:4])
+                frames.append({
+                    'function': '%s:%d(%s)' % (filename, line, function),
+                    'calls': calls,
+                    'primitive_calls': primitive_calls,
+                    'total_time': total_time,
+                    'cumulative_time': cumulative_time,
+                })
+        with self._lock:
+            devices = dict((name, dict(timings))
+                           for name, timings in self._timings.items())
+            skipped = self._skipped
+        report = {
+            'command': self.command,
+            'started': self.started,
+            'devices': devices,
+            'top_frames': frames,
+            'skipped_threads': skipped,
+        }
+        report.update(extra)
+        return report
+
+
+class Profiler(object):
+    """Decides which command calls are profiled and keeps their reports.
+
+    Profiling is switched on at runtime for some ``commands`` or some
+    ``devices``, or both. Reports are returned along with the command's
+    result or, with the ``file`` output, written to ``directory`` as a
+    cProfile dump and a JSON report. The latest reports are kept either way.
+    Commands in ``ignore`` are never profiled. Without a ``directory`` files
+    go to a temporary directory that ``close`` removes.
+    """
+
+    def __init__(self, directory=None, ignore=()):
+        self.ignore = set(ignore)
+        self.commands = set()
+        self.devices = set()
+        self.output = RESULT
+        self.top = DEFAULT_TOP
+        self.recent = deque(maxlen=DEFAULT_RECENT)
+        self._directory = directory
+        self._temporary = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.commands or self.devices)
+
+    def configure(self, commands=(), devices=(), output=RESULT,
+                  top=DEFAULT_TOP):
+        if output not in PROFILE_OUTPUTS:
+            raise ValueError("Unknown profile output %s" % output)
+        with self._lock:
+            self.commands = set(commands)
+            self.devices = set(devices)
+            self.output = output
+            self.top = top
+
+    def disable(self):
+        self.configure()
+
+    def status(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'commands': sorted(self.commands),
+                'devices': sorted(self.devices),
+                'output': self.output,
+                'top': self.top,
+                'recent': list(self.recent),
+            }
+
+    def start(self, command):
+        """Returns a profile for a call of the command, if it is profiled."""
+        with self._lock:
+            if (command in self.ignore or not self.enabled or
+                    (self.commands and command not in self.commands)):
+                return None
+            return Profile(command, self.devices, self.top)
+
+    def finish(self, profile, result, **extra):
+        """Reports on a finished call, returning the command's result."""
+        if not profile:
+            return result
+        report = profile.report(**extra)
+        if self.output == FILE:
+            report['file'] = self._dump(profile, report)
+        with self._lock:
+            self.recent.append(dict((key, value)
+                                    for key, value in report.items()
+                                    if key != 'top_frames'))
+        if self.output == FILE:
+            return result
+        return {'result': result, 'profile': report}
+
+    def _dump(self, profile, report):
+        directory = self._root()
+        path = os.path.join(directory, '%s-%s-%s' % (
+            profile.command,
+            time.strftime('%Y%m%dT%H%M%S', time.gmtime(profile.started)),
+            uuid.uuid4().hex[:8]))
+        stats = profile.stats()
+        if stats is not None:
+            stats.dump_stats(path + '.prof')
+        with open(path + '.json', 'w') as stored:
+            json.dump(report, stored, default=str)
+        return path + '.json'
+
+    def close(self):
+        """Removes the temporary directory of the profiles, if any."""
+        with self._lock:
+            if not self._temporary:
+                return
+            directory, self._directory = self._directory, None
+            self._temporary = False
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def _root(self):
+        with self._lock:
+            if self._directory is None:
+                self._directory = tempfile.mkdtemp(prefix='napalm-profiles-')
+                self._temporary = True
+            os.makedirs(self._directory, exist_ok=True)
+            return self._directory
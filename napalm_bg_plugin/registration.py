@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+
+from brewtils.plugin import RemotePlugin
+from brewtils.schema_parser import SchemaParser
+
+SCHEMA_HASH = 'schema_hash'
+
+
+def schema_hash(system):
+    """Returns a hash of everything a plugin registers about its system."""
+    metadata = dict(system.metadata or {})
+    metadata.pop(SCHEMA_HASH, None)
+    definition = {
+        'commands': SchemaParser.serialize_command(system.commands,
+                                                   to_string=False,
+                                                   many=True),
+        'description': system.description,
+        'display_name': system.display_name,
+        'icon_name': system.icon_name,
+        'metadata': metadata,
+    }
+    return hashlib.sha256(json.dumps(definition, sort_keys=True,
+                                     default=str).encode('utf-8')).hexdigest()
+
+
+class CachedRemotePlugin(RemotePlugin):
+    """Remote plugin that only re-registers its system when it changed.
+
+    The hash of the system's definition is stored in its metadata. When this
+    instance is already registered under a definition with the same hash,
+    the update of the system is skipped on startup.
+    """
+
+    def _initialize(self):
+        self.system.metadata[SCHEMA_HASH] = schema_hash(self.system)
+        client = self.bm_client
+        self.bm_client = _SkipUnchanged(client, self.system, self.instance_name)
+        try:
+            super(CachedRemotePlugin, self)._initialize()
+        finally:
+            self.bm_client = client
+
+
+class _SkipUnchanged(object):
+    """Wraps a Beer Garden client to skip updates of an unchanged system."""
+
+    def __init__(self, client, system, instance_name):
+        self._client = client
+        self._system = system
+        self._instance_name = instance_name
+        self._registered = None
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def find_unique_system(self, **kwargs):
+        existing = self._client.find_unique_system(**kwargs)
+        if (existing is not None and
+                existing.has_instance(self._instance_name) and
+                (existing.metadata or {}).get(SCHEMA_HASH) ==
+                self._system.metadata[SCHEMA_HASH]):
+            self._registered = existing
+        return existing
+
+    def update_system(self, system_id, **kwargs):
+        if self._registered is not None:
+            return self._registered
+        return self._client.update_system(system_id, **kwargs)
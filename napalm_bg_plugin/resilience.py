@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_BURST = 5
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30
+DEFAULT_MIN_TIMEOUT = 10
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of connecting to a device whose circuit is open."""
+
+
+class TokenBucket(object):
+    """Allows ``rate`` events per second on average, in bursts of ``burst``."""
+
+    def __init__(self, rate, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def acquire(self):
+        """Takes a token, waiting until one is due. Returns the seconds waited."""
+        with self._lock:
+            self._refill()
+            # Going into debt reserves the next token for this caller, so
+            # waiting callers are served in the order they came.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens +
+                           (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class CircuitBreaker(object):
+    """Fails fast once ``failure_threshold`` attempts failed in a row.
+
+    After ``reset_timeout`` seconds the circuit half opens and lets a single
+    probe through, while other attempts keep failing fast. The circuit
+    closes when the probe succeeds and opens again when it fails.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether an attempt may be made now."""
+        with self._lock:
+            if self.state == OPEN and self.retry_in() == 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return self.state == CLOSED
+
+    def record(self, success):
+        with self._lock:
+            self._probing = False
+            if success:
+                self.state = CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if (self.state == HALF_OPEN or
+                    self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened = time.monotonic()
+
+    def retry_in(self):
+        """Seconds until the circuit half opens, 0 unless it is open."""
+        if self.state != OPEN:
+            return 0
+        return max(0, self._opened + self.reset_timeout - time.monotonic())
+
+
+class TimeoutEstimator(object):
+    """Derives a timeout from observed latencies, like TCP does.
+
+    The timeout is the smoothed latency plus four times its mean deviation,
+    but at least ``minimum`` seconds, rounded up to whole seconds. Until a
+    latency was observed there is no estimate.
+    """
+
+    def __init__(self, minimum=DEFAULT_MIN_TIMEOUT):
+        self.minimum = minimum
+        self.smoothed = None
+        self.deviation = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            if self.smoothed is None:
+                self.smoothed = seconds
+                self.deviation = seconds / 2
+                return
+            self.deviation = (0.75 * self.deviation +
+                              0.25 * abs(self.smoothed - seconds))
+            self.smoothed = 0.875 * self.smoothed + 0.125 * seconds
+
+    def timeout(self, maximum):
+        """Returns the estimated timeout, at most ``maximum`` seconds."""
+        with self._lock:
+            if self.smoothed is None:
+                return maximum
+            return min(maximum, max(self.minimum, int(math.ceil(
+                self.smoothed + 4 * self.deviation))))
+
+
+class DeviceGuard(object):
+    """Rate limit, circuit breaker and adaptive timeout of one device.
+
+    Driver calls and connection attempts take a token from the rate limit,
+    when there is one. Connection attempts go through the circuit breaker
+    and are given up on after a deadline estimated from the time earlier
+    connections to the device took, within the device's configured timeout.
+    """
+
+    def __init__(self, name, rate=None, burst=DEFAULT_BURST,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout=DEFAULT_RESET_TIMEOUT,
+                 min_timeout=DEFAULT_MIN_TIMEOUT):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.connect_latency = TimeoutEstimator(min_timeout)
+
+    def throttle(self):
+        """Waits for the rate limit, returning the seconds waited."""
+        return self.bucket.acquire() if self.bucket else 0.0
+
+    @contextmanager
+    def connecting(self, timeout):
+        """Guards a connection attempt, yielding its deadline in seconds."""
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                "Not connecting to %s for another %.0f seconds after %d "
+                "failed attempts" % (self.name, self.breaker.retry_in(),
+                                     self.breaker.failures))
+        start = time.time()
+        success = False
+        try:
+            yield self.connect_latency.timeout(timeout)
+            success = True
+        finally:
+            self.connect_latency.observe(time.time() - start)
+            self.breaker.record(success)
+
+    def status(self, timeout):
+        return {
+            'circuit': self.breaker.state,
+            'failures': self.breaker.failures,
+            'retry_in': self.breaker.retry_in(),
+            'connect_latency': self.connect_latency.smoothed,
+            'connect_timeout': self.connect_latency.timeout(timeout),
+            'rate': self.bucket.rate if self.bucket else None,
+            'tokens': self.bucket.tokens if self.bucket else None,
+        }
+
+
+def open_within(device, seconds):
+    """Opens a driver, raising a TimeoutError after ``seconds``.
+
+    Drivers cannot be interrupted while they connect, so an attempt given
+    up on goes on in the background and closes the device if it connects
+    after all.
+    """
+    lock = threading.Lock()
+    outcome = {}
+
+    def connect():
+        try:
+            device.open()
+        except Exception as exc:
+            error = exc
+        else:
+            error = None
+        with lock:
+            outcome['error'] = error
+            abandoned = outcome.get('abandoned')
+        if abandoned and error is None:
+            try:
+                device.close()
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=connect, name='connect', daemon=True)
+    thread.start()
+    thread.join(seconds)
+    with lock:
+        if 'error' not in outcome:
+            outcome['abandoned'] = True
+            raise TimeoutError("Connecting took longer than %s seconds"
+                               % seconds)
+    if outcome['error'] is not None:
+        raise outcome['error']
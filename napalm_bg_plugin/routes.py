@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import ipaddress
+import threading
+import time
+
+
+class _Node(object):
+    __slots__ = ('children', 'prefix', 'routes')
+
+    def __init__(self):
+        self.children = [None, None]
+        self.prefix = None
+        # device -> route entries of that device for this prefix
+        self.routes = None
+
+
+class PrefixTrie(object):
+    """Binary trie of IPv4 and IPv6 prefixes holding routes per device."""
+
+    def __init__(self):
+        self._roots = {4: _Node(), 6: _Node()}
+
+    def insert(self, network, name, entries):
+        node = self._roots[network.version]
+        for bit in _bits(network.network_address, network.prefixlen):
+            if node.children[bit] is None:
+                node.children[bit] = _Node()
+            node = node.children[bit]
+        node.prefix = str(network)
+        if node.routes is None:
+            node.routes = {}
+        node.routes[name] = entries
+
+    def remove(self, network, name):
+        path = [self._roots[network.version]]
+        for bit in _bits(network.network_address, network.prefixlen):
+            node = path[-1].children[bit]
+            if node is None:
+                return
+            path.append(node)
+
+        node = path[-1]
+        if node.routes is not None:
+            node.routes.pop(name, None)
+            if not node.routes:
+                node.routes = None
+        # Prune the branch that no longer leads to any route
+        for parent, child in reversed(list(zip(path, path[1:]))):
+            if child.routes is not None or child.children != [None, None]:
+                break
+            parent.children[parent.children.index(child)] = None
+
+    def lookup(self, address):
+        """Returns the longest matching prefix and its routes, per device."""
+        node = self._roots[address.version]
+        matches = {}
+        if node.routes:
+            for name, entries in node.routes.items():
+                matches[name] = (node.prefix, entries)
+        for bit in _bits(address, address.max_prefixlen):
+            node = node.children[bit]
+            if node is None:
+                break
+            if node.routes:
+                for name, entries in node.routes.items():
+                    matches[name] = (node.prefix, entries)
+        return matches
+
+
+# Destinations that, asked for with ``longer``, return whole routing tables
+FULL_TABLES = ('0.0.0.0/0', '::/0')
+
+
+class RouteIndex(object):
+    """Longest prefix match index of the routes of many devices.
+
+    Devices are updated from ``get_route_to`` results. A result that covers
+    every route within a ``scope`` prefix (``get_route_to`` with ``longer``)
+    replaces what is known about the device within it, while any other
+    result only adds to it. In both cases only the prefixes that changed
+    are touched.
+    """
+
+    def __init__(self):
+        self._trie = PrefixTrie()
+        self._tables = {}
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def update(self, name, routes, scope=None):
+        """Indexes the routes of a device, returning what changed."""
+        if not isinstance(routes, dict):
+            raise ValueError("Expected routes from %s, got %r"
+                             % (name, routes))
+        if scope is not None:
+            scope = ipaddress.ip_network(scope, strict=False)
+        added = changed = removed = 0
+        with self._lock:
+            # prefix -> (network, route entries)
+            table = self._tables.setdefault(name, {})
+            if scope is not None:
+                for prefix in [p for p, (network, _) in table.items()
+                               if p not in routes and
+                               network.version == scope.version and
+                               network.subnet_of(scope)]:
+                    self._trie.remove(table.pop(prefix)[0], name)
+                    removed += 1
+            for prefix, entries in routes.items():
+                if prefix not in table:
+                    try:
+                        network = ipaddress.ip_network(prefix, strict=False)
+                    except ValueError:
+                        continue
+                    added += 1
+                elif table[prefix][1] != entries:
+                    network = table[prefix][0]
+                    changed += 1
+                else:
+                    continue
+                self._trie.insert(network, name, entries)
+                table[prefix] = (network, entries)
+
+            summary = self._summaries.setdefault(name, {'scopes': {}})
+            summary['prefixes'] = len(table)
+            summary['updated'] = time.time()
+            if scope is not None:
+                summary['scopes'][str(scope)] = {
+                    'updated': summary['updated'],
+                    'added': added,
+                    'changed': changed,
+                    'removed': removed,
+                }
+            return dict(summary, scopes=dict(summary['scopes']))
+
+    def summary(self, name):
+        with self._lock:
+            summary = self._summaries.get(name, {'prefixes': 0, 'scopes': {}})
+            return dict(summary, scopes=dict(summary['scopes']))
+
+    def lookup(self, address, names=None):
+        """Returns the route each device would use for an address."""
+        address = ipaddress.ip_address(address)
+        with self._lock:
+            matches = self._trie.lookup(address)
+            updated = dict((name, summary['updated'])
+                           for name, summary in self._summaries.items())
+        return dict((name, {
+            'prefix': prefix,
+            'routes': entries,
+            'updated': updated.get(name),
+        }) for name, (prefix, entries) in matches.items()
+            if names is None or name in names)
+
+
+def _bits(address, length):
+    value = int(address)
+    width = address.max_prefixlen
+    for i in range(length):
+        yield (value >> (width - 1 - i)) & 1
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_CONCURRENT = 8
+DEFAULT_DEVICE_INTERVAL = 1.0
+DEFAULT_JITTER = 0.1
+DEFAULT_MAX_BACKOFF = 900
+
+# Seconds over which the first runs of the jobs are spread
+_WARMUP = 60
+
+
+class Job(object):
+    """One getter polled on one device."""
+
+    def __init__(self, name, getter, interval, args=None):
+        self.name = name
+        self.getter = getter
+        self.interval = interval
+        self.args = args or {}
+        self.next_run = None
+        self.last_run = None
+        self.last_duration = None
+        self.last_error = None
+        self.runs = 0
+        self.failures = 0
+
+    def status(self):
+        return {
+            'device': self.name,
+            'getter': self.getter,
+            'interval': self.interval,
+            'next_run': self.next_run,
+            'last_run': self.last_run,
+            'last_duration': self.last_duration,
+            'last_error': self.last_error,
+            'runs': self.runs,
+            'failures': self.failures,
+        }
+
+
+class Poller(threading.Thread):
+    """Runs getters in the background on a jittered cadence.
+
+    ``fetch(name, getter, args)`` is called for every due job on a pool of
+    at most ``max_concurrent`` threads, and calls to one device are spaced
+    at least ``device_interval`` seconds apart. When a call to a device
+    fails, every job for that device backs off exponentially, up to
+    ``max_backoff`` seconds, so that unreachable devices do not tie up the
+    workers.
+    """
+
+    def __init__(self, jobs, fetch, max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 device_interval=DEFAULT_DEVICE_INTERVAL,
+                 jitter=DEFAULT_JITTER, max_backoff=DEFAULT_MAX_BACKOFF):
+        super(Poller, self).__init__(name='napalm-poller')
+        self.daemon = True
+        self.jobs = jobs
+        self._fetch = fetch
+        self.max_concurrent = max_concurrent
+        self.device_interval = device_interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self._slots = threading.Semaphore(max_concurrent)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent)
+        self._last_call = {}
+        self._failures = {}
+        self._retry_at = {}
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+
+        now = time.time()
+        with self._condition:
+            for job in jobs:
+                # Spread the first runs out instead of starting every job
+                # at once, without leaving results cold for a whole interval.
+                self._push(job, now + random.uniform(0, min(job.interval,
+                                                            _WARMUP)))
+
+    def run(self):
+        while not self._stopped.is_set():
+            with self._condition:
+                if not self._queue:
+                    self._condition.wait(_WARMUP)
+                    continue
+                due, _, job = self._queue[0]
+                now = time.time()
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+                heapq.heappop(self._queue)
+
+                earliest = max(self._retry_at.get(job.name, 0),
+                               self._last_call.get(job.name, 0) +
+                               self.device_interval)
+                if earliest > now:
+                    self._push(job, earliest)
+                    continue
+                self._last_call[job.name] = now
+
+            self._slots.acquire()
+            if self._stopped.is_set():
+                break
+            self._executor.submit(self._run_job, job)
+
+    def stop(self):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify()
+        self._executor.shutdown(wait=False)
+
+    def status(self):
+        with self._condition:
+            return {
+                'running': self.is_alive() and not self._stopped.is_set(),
+                'max_concurrent': self.max_concurrent,
+                'jobs': [job.status() for job in self.jobs],
+                'failing_devices': dict(self._failures),
+            }
+
+    def _run_job(self, job):
+        start = time.time()
+        try:
+            self._fetch(job.name, job.getter, job.args)
+        except Exception as exc:
+            job.last_error = str(exc) or exc.__class__.__name__
+            job.failures += 1
+            with self._condition:
+                failures = self._failures.get(job.name, 0) + 1
+                self._failures[job.name] = failures
+                self._retry_at[job.name] = time.time() + min(
+                    job.interval * 2 ** failures, self.max_backoff)
+            delay = 0
+        else:
+            job.last_error = None
+            with self._condition:
+                self._failures.pop(job.name, None)
+                self._retry_at.pop(job.name, None)
+            delay = job.interval * (1 + random.uniform(-self.jitter,
+                                                       self.jitter))
+        finally:
+            job.runs += 1
+            job.last_run = start
+            job.last_duration = time.time() - start
+            self._slots.release()
+
+        with self._condition:
+            self._push(job, max(time.time() + delay,
+                                self._retry_at.get(job.name, 0)))
+
+    def _push(self, job, when):
+        job.next_run = when
+        heapq.heappush(self._queue, (when, next(self._sequence), job))
+        self._condition.notify()
+
+
+def load_schedule(path):
+    """Loads a polling schedule from a JSON file.
+
+    The file has a list of ``jobs``, each with a ``getter``, an
+    ``interval`` in seconds and optionally the ``targets`` (defaults to all
+    devices) and ``args`` of the getter. Returns the jobs and the rest of
+    the file, which holds keyword arguments for the ``Poller``.
+    """
+    with open(path) as schedule_file:
+        schedule = json.load(schedule_file)
+    return schedule.pop('jobs', []), schedule
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_CHECKOUT_TIMEOUT = 120
+
+
+class Session(object):
+    """A single open driver connection handed out by a SessionPool."""
+
+    def __init__(self, device):
+        self.device = device
+        self.created = time.time()
+        self.last_used = self.created
+        self.last_checked = self.created
+
+
+class Lease(object):
+    """Sessions held by one owner across requests, one per device.
+
+    Each device's session is used by one request at a time. ``last_used`` is
+    updated whenever a request runs over the lease.
+    """
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.locks = dict((name, threading.RLock()) for name in sessions)
+        self.last_used = time.time()
+
+    @contextmanager
+    def device(self, name):
+        with self.locks[name]:
+            if name not in self.sessions:
+                raise ValueError("The session to %s was closed" % name)
+            self.last_used = time.time()
+            yield self.sessions[name].device
+
+
+class _Waiter(object):
+    def __init__(self):
+        self.ready = threading.Event()
+        self.session = None
+
+
+class SessionPool(object):
+    """Keeps driver sessions to a single device open between requests.
+
+    Sessions are created with ``opener`` and torn down with ``closer``. At
+    most ``max_sessions`` sessions exist at once; callers block until one
+    is free, and they are served in the order they arrived, for at most
+    ``checkout_timeout`` seconds. A session that
+    has not been verified for ``keepalive_interval``
+    seconds is probed with ``is_alive()`` before it is handed out and is
+    transparently replaced if the probe fails. ``maintain`` probes idle
+    sessions and closes the ones idle for longer than ``idle_timeout``.
+    """
+
+    def __init__(self, opener, closer, max_sessions=1, idle_timeout=300,
+                 keepalive_interval=30,
+                 checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT):
+        self._opener = opener
+        self._closer = closer
+        self.max_sessions = max(1, max_sessions)
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.checkout_timeout = checkout_timeout
+        self._idle = []
+        self._busy = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        with self._lock:
+            return len(self._idle) + self._busy
+
+    @property
+    def waiting(self):
+        with self._lock:
+            return len(self._waiters)
+
+    @contextmanager
+    def session(self):
+        """Yields a live device, returning its session to the pool afterwards."""
+        session = self.checkout()
+        try:
+            yield session.device
+        except Exception:
+            # The call may have left the transport in a bad state, so make
+            # sure the session is probed before it is handed out again.
+            session.last_checked = 0
+            self.checkin(session)
+            raise
+        else:
+            self.checkin(session)
+
+    def checkout(self):
+        with self._lock:
+            if not self._waiters and (self._idle or
+                                      self._busy < self.max_sessions):
+                session = self._idle.pop() if self._idle else None
+                self._busy += 1
+                waiter = None
+            else:
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+
+        if waiter is not None:
+            # Whoever gives up a session hands it, or the slot it used, to
+            # the longest waiting caller.
+            if not waiter.ready.wait(self.checkout_timeout):
+                with self._lock:
+                    # Unless it was handed a session just now
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                        raise TimeoutError(
+                            "No session became free within %s seconds"
+                            % self.checkout_timeout)
+            session = waiter.session
+
+        try:
+            if session is not None and not self._is_alive(session):
+                self._close_quietly(session)
+                session = None
+            if session is None:
+                session = Session(self._opener())
+        except Exception:
+            self._release()
+            raise
+
+        session.last_used = time.time()
+        return session
+
+    def checkin(self, session):
+        session.last_used = time.time()
+        with self._lock:
+            self._hand_over(session)
+
+    def discard(self, session):
+        """Closes a checked out session instead of returning it to the pool."""
+        self._close_quietly(session)
+        self._release()
+
+    def maintain(self):
+        """Closes expired idle sessions and keeps the others warm."""
+        now = time.time()
+        with self._lock:
+            expired = [s for s in self._idle
+                       if now - s.last_used > self.idle_timeout]
+            due = [s for s in self._idle if s not in expired and
+                   now - s.last_checked > self.keepalive_interval]
+            self._idle = [s for s in self._idle
+                          if s not in expired and s not in due]
+            self._busy += len(due)
+
+        for session in expired:
+            self._close_quietly(session)
+
+        for session in due:
+            if self._is_alive(session):
+                # Unlike checkin, leave last_used alone so that probing does
+                # not keep an unused session from expiring.
+                with self._lock:
+                    self._hand_over(session)
+            else:
+                self.discard(session)
+
+    def close_all(self):
+        """Closes every idle session."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._close_quietly(session)
+
+    def _is_alive(self, session):
+        if time.time() - session.last_checked < self.keepalive_interval:
+            return True
+        try:
+            alive = session.device.is_alive().get('is_alive', False)
+        except Exception:
+            alive = False
+        if alive:
+            session.last_checked = time.time()
+        return alive
+
+    def _close_quietly(self, session):
+        try:
+            self._closer(session.device)
+        except Exception:
+            pass
+
+    def _release(self):
+        with self._lock:
+            self._hand_over(None)
+
+    def _hand_over(self, session):
+        # Called with the lock held. Without a session the next waiter opens
+        # a new one in place of the session that was given up.
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.session = session
+            waiter.ready.set()
+            return
+        self._busy -= 1
+        if session is not None:
+            self._idle.append(session)
+
+
+class Keepalive(threading.Thread):
+    """Daemon thread that periodically calls ``maintain``."""
+
+    def __init__(self, maintain, interval=10):
+        super(Keepalive, self).__init__(name='napalm-keepalive')
+        self.daemon = True
+        self._maintain = maintain
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            self._maintain()
+
+    def stop(self):
+        self._stopped.set()
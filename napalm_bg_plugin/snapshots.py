@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+SNAPSHOT_GETTERS = (
+    'get_facts',
+    'get_interfaces',
+    'get_bgp_neighbors',
+    'get_lldp_neighbors',
+    'get_network_instances',
+)
+
+DEFAULT_MAX_SNAPSHOTS = 50
+DEFAULT_GC_INTERVAL = 300
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+
+class SnapshotStore(object):
+    """Keeps versioned snapshots of getter results per device on disk.
+
+    Each getter result is stored once, gzipped, under the hash of its
+    content, so a result that did not change between snapshots takes no
+    extra space. A snapshot is a small manifest naming the hash of each of
+    its results. Only the latest ``max_snapshots`` snapshots of a device
+    are kept. Results left without a snapshot are deleted by ``maintain``,
+    at most every ``gc_interval`` seconds. Without a ``directory`` the
+    snapshots go to a temporary directory that ``close`` removes.
+    """
+
+    def __init__(self, directory=None, max_snapshots=DEFAULT_MAX_SNAPSHOTS,
+                 gc_interval=DEFAULT_GC_INTERVAL):
+        self._directory = directory
+        self._temporary = False
+        self.max_snapshots = max_snapshots
+        self.gc_interval = gc_interval
+        self._pruned = False
+        self._collected = time.time()
+        self._lock = threading.Lock()
+
+    def save(self, name, results, label=None, errors=None):
+        """Stores the getter results of a device as a new snapshot."""
+        hashes = {}
+        for getter, result in results.items():
+            content = _canonical(result)
+            digest = hashlib.sha256(content).hexdigest()
+            path = self._object_path(digest)
+            if os.path.exists(path):
+                # Tells collect_garbage that the result is in use again
+                os.utime(path)
+            else:
+                _write(path, gzip.compress(content))
+            hashes[getter] = digest
+
+        taken = time.time()
+        manifest = {
+            'id': '%s-%s' % (time.strftime('%Y%m%dT%H%M%S',
+                                           time.gmtime(taken)),
+                             uuid.uuid4().hex[:8]),
+            'device': name,
+            'taken': taken,
+            'label': label,
+            'getters': hashes,
+            'errors': errors or {},
+        }
+        _write(os.path.join(self._device_directory(name),
+                            manifest['id'] + '.json'),
+               json.dumps(manifest).encode('utf-8'))
+        self._prune(name)
+        return manifest
+
+    def list(self, name):
+        """Returns the manifests of a device's snapshots, oldest first."""
+        directory = self._device_directory(name)
+        manifests = []
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.json'):
+                with open(os.path.join(directory, filename)) as manifest:
+                    manifests.append(json.load(manifest))
+        manifests.sort(key=lambda manifest: manifest['taken'])
+        return manifests
+
+    def manifest(self, name, snapshot=None):
+        """Returns the manifest of a snapshot given by id or by label.
+
+        A label refers to the latest snapshot with that label, and no
+        snapshot at all to the latest snapshot.
+        """
+        if snapshot is not None:
+            path = os.path.join(self._device_directory(name),
+                                _safe(snapshot) + '.json')
+            if os.path.exists(path):
+                with open(path) as manifest:
+                    return json.load(manifest)
+
+        manifests = [manifest for manifest in self.list(name)
+                     if snapshot is None or manifest['label'] == snapshot]
+        if not manifests:
+            if snapshot is None:
+                raise ValueError("There are no snapshots of %s" % name)
+            raise ValueError("Unknown snapshot %s of %s" % (snapshot, name))
+        return manifests[-1]
+
+    def load(self, name, snapshot=None, getters=None):
+        """Returns the getter results of a snapshot."""
+        manifest = self.manifest(name, snapshot)
+        return dict((getter, self._object(digest))
+                    for getter, digest in manifest['getters'].items()
+                    if not getters or getter in getters)
+
+    def diff(self, name, before=None, after=None, getters=None):
+        """Compares two snapshots of a device, getter by getter.
+
+        Snapshots are given by id or label. ``after`` defaults to the latest
+        snapshot and ``before`` to the one taken just before ``after``.
+        Results with the same hash are not read at all.
+        """
+        after = self.manifest(name, after)
+        if before is None:
+            older = [manifest for manifest in self.list(name)
+                     if manifest['taken'] < after['taken']]
+            if not older:
+                raise ValueError("There is no snapshot of %s before %s"
+                                 % (name, after['id']))
+            before = older[-1]
+        else:
+            before = self.manifest(name, before)
+
+        changes = {}
+        for getter in sorted(set(before['getters']) | set(after['getters'])):
+            if getters and getter not in getters:
+                continue
+            old = before['getters'].get(getter)
+            new = after['getters'].get(getter)
+            if old == new:
+                continue
+            changes[getter] = diff(
+                self._object(old) if old else None,
+                self._object(new) if new else None)
+        return {'before': before['id'], 'after': after['id'],
+                'changes': changes}
+
+    def maintain(self):
+        """Collects garbage if snapshots were pruned since it last ran.
+
+        Reading every manifest is too costly to do on each save, and only
+        pruning a snapshot can leave a result unreferenced.
+        """
+        with self._lock:
+            if (not self._pruned or
+                    time.time() - self._collected < self.gc_interval):
+                return 0
+        return self.collect_garbage()
+
+    def collect_garbage(self):
+        """Deletes the results no snapshot refers to any more.
+
+        Results used within the last minute are kept, since the snapshot
+        using them may still be being saved.
+        """
+        with self._lock:
+            # A snapshot pruned from here on is collected the next time
+            self._pruned = False
+            self._collected = time.time()
+        cutoff = time.time() - 60
+        root = self._root()
+        referenced = set()
+        snapshots = os.path.join(root, 'snapshots')
+        for device in (os.listdir(snapshots)
+                       if os.path.isdir(snapshots) else ()):
+            for filename in os.listdir(os.path.join(snapshots, device)):
+                if filename.endswith('.json'):
+                    with open(os.path.join(snapshots, device,
+                                           filename)) as manifest:
+                        referenced.update(json.load(manifest)['getters']
+                                          .values())
+
+        removed = 0
+        objects = os.path.join(root, 'objects')
+        if not os.path.isdir(objects):
+            return removed
+        for prefix in os.listdir(objects):
+            for digest in os.listdir(os.path.join(objects, prefix)):
+                path = os.path.join(objects, prefix, digest)
+                if digest in referenced or digest.endswith('.tmp'):
+                    continue
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+                else:
+                    # Still too recent, look at it again next time
+                    with self._lock:
+                        self._pruned = True
+        return removed
+
+    def _prune(self, name):
+        manifests = self.list(name)
+        for manifest in manifests[:max(0, len(manifests) -
+                                       self.max_snapshots)]:
+            try:
+                os.remove(os.path.join(self._device_directory(name),
+                                       manifest['id'] + '.json'))
+            except OSError:
+                # Already pruned by a concurrent save
+                continue
+            with self._lock:
+                self._pruned = True
+
+    def _object(self, digest):
+        with open(self._object_path(digest), 'rb') as stored:
+            return json.loads(gzip.decompress(stored.read()).decode('utf-8'))
+
+    def _object_path(self, digest):
+        directory = os.path.join(self._root(), 'objects', digest[:2])
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, digest)
+
+    def _device_directory(self, name):
+        directory = os.path.join(self._root(), 'snapshots', _safe(name))
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def close(self):
+        """Removes the temporary directory of the snapshots, if any."""
+        with self._lock:
+            if not self._temporary:
+                return
+            directory, self._directory = self._directory, None
+            self._temporary = False
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def _root(self):
+        with self._lock:
+            if self._directory is None:
+                self._directory = tempfile.mkdtemp(prefix='napalm-snapshots-')
+                self._temporary = True
+            return self._directory
+
+
+def diff(old, new, path=()):
+    """Returns the structural differences between two getter results.
+
+    Dictionaries are compared key by key. Lists are compared as sets of
+    items, since getters do not return rows in a stable order. Each change
+    has the ``path`` to the value, what happened to it and the ``old`` and
+    ``new`` values.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in sorted(set(old) | set(new), key=str):
+            if key not in new:
+                changes.append(_change(path + (key,), REMOVED, old[key],
+                                       None))
+            elif key not in old:
+                changes.append(_change(path + (key,), ADDED, None,
+                                       new[key]))
+            elif old[key] != new[key]:
+                changes.extend(diff(old[key], new[key], path + (key,)))
+        return changes
+
+    if isinstance(old, list) and isinstance(new, list):
+        old_items = dict((_canonical(item), item) for item in old)
+        new_items = dict((_canonical(item), item) for item in new)
+        return ([_change(path, REMOVED, old_items[key], None)
+                 for key in sorted(old_items) if key not in new_items] +
+                [_change(path, ADDED, None, new_items[key])
+                 for key in sorted(new_items) if key not in old_items])
+
+    if old is None:
+        return [_change(path, ADDED, None, new)]
+    if new is None:
+        return [_change(path, REMOVED, old, None)]
+    return [_change(path, CHANGED, old, new)]
+
+
+def _change(path, change, old, new):
+    return {'path': list(path), 'change': change, 'old': old, 'new': new}
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+
+
+def _safe(name):
+    return re.sub(r'[^\w.-]', '_', name)
+
+
+def _write(path, content):
+    # Write to a temporary file first so readers never see a partial file
+    temporary = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+    with open(temporary, 'wb') as stored:
+        stored.write(content)
+    os.replace(temporary, path)
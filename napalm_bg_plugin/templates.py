@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# NAPALM is imported where it is needed since importing it loads every
+# driver, which would slow down the start of the plugin. Jinja is imported
+# there too, so that plugins never rendering a template do not load it.
+
+DEFAULT_MAX_SOURCES = 128
+
+
+class TemplateCache(object):
+    """Compiles each configuration template once and reuses it.
+
+    Templates are looked up the same way NAPALM's ``load_template`` does.
+    Templates given as source are cached by the hash of the source. Template
+    files are compiled by one Jinja environment per search path, which
+    keeps them until the file's modification time changes.
+    """
+
+    def __init__(self, max_sources=DEFAULT_MAX_SOURCES):
+        self.max_sources = max_sources
+        self._environments = {}
+        self._sources = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, driver, template_name, template_source=None,
+               template_path=None, **template_vars):
+        """Renders a template for a driver class, raising NAPALM's errors."""
+        import jinja2
+        from napalm.base import exceptions
+
+        search_path = []
+        try:
+            if isinstance(template_source, str):
+                template = self._from_source(template_source)
+            else:
+                search_path = self._search_path(driver, template_path)
+                template = self._environment(search_path).get_template(
+                    '%s.j2' % template_name)
+            return template.render(**template_vars)
+        except jinja2.exceptions.TemplateNotFound:
+            raise exceptions.TemplateNotImplemented(
+                "Config template %s.j2 not found in search path: %s"
+                % (template_name, search_path))
+        except (jinja2.exceptions.UndefinedError,
+                jinja2.exceptions.TemplateSyntaxError) as jinja_error:
+            raise exceptions.TemplateRenderException(
+                "Unable to render the Jinja config template %s: %s"
+                % (template_name, jinja_error))
+
+    def _from_source(self, source):
+        key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        with self._lock:
+            template = self._sources.get(key)
+            if template is not None:
+                self._sources.move_to_end(key)
+                return template
+
+        import jinja2
+
+        # NAPALM renders sources without its custom filters, so do the same
+        template = jinja2.Template(source)
+        with self._lock:
+            self._sources[key] = template
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        return template
+
+    def _environment(self, search_path):
+        import jinja2
+        from napalm.base.utils.jinja_filters import CustomJinjaFilters
+
+        key = tuple(search_path)
+        with self._lock:
+            if key not in self._environments:
+                environment = jinja2.Environment(
+                    loader=jinja2.FileSystemLoader(search_path),
+                    auto_reload=True)
+                environment.filters.update(CustomJinjaFilters.filters())
+                self._environments[key] = environment
+            return self._environments[key]
+
+    @staticmethod
+    def _search_path(driver, template_path):
+        if template_path is not None:
+            if not (os.path.isdir(template_path) and
+                    os.path.isabs(template_path)):
+                raise IOError("Template path does not exist: %s"
+                              % template_path)
+            return [os.path.join(template_path,
+                                 driver.__module__.split('.')[-1],
+                                 'templates')]
+
+        search_path = []
+        for cls in driver.mro():
+            if cls is object:
+                continue
+            module = getattr(sys.modules.get(cls.__module__), '__file__',
+                             None)
+            if module:
+                search_path.append(os.path.join(
+                    os.path.dirname(os.path.abspath(module)), 'templates'))
+        return search_path
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import ipaddress
+import json
+import threading
+
+from napalm_bg_plugin.fanout import DEFAULT_WORKERS, run_concurrently
+
+
+def table_hash(neighbors):
+    return hashlib.sha256(json.dumps(neighbors, sort_keys=True,
+                                     default=str).encode('utf-8')).hexdigest()
+
+
+def short_name(hostname):
+    """Returns the first label of a host name, or an IP address unchanged."""
+    try:
+        ipaddress.ip_address(hostname)
+    except ValueError:
+        return hostname.split('.')[0]
+    return hostname
+
+
+class Topology(object):
+    """Adjacency index of the links that devices report over LLDP.
+
+    Each device's ``get_lldp_neighbors`` table is kept by its hash, so a
+    table that did not change is not indexed again. Neighbors are named as
+    they are reported, unless ``aliases`` maps the name (or its first label,
+    unless it is an IP address) to a device name. A link is known from
+    either end and is dropped once no device reports it any more.
+    """
+
+    def __init__(self, aliases=None):
+        self.aliases = aliases or {}
+        self._hashes = {}
+        self._links = {}
+        self._details = {}
+        # device -> {(port, neighbor, neighbor port): devices reporting it}
+        self._adjacency = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, remote):
+        return (self.aliases.get(remote) or
+                self.aliases.get(short_name(remote)) or remote)
+
+    def digest(self, name):
+        with self._lock:
+            return self._hashes.get(name)
+
+    def update(self, name, neighbors):
+        """Indexes a ``get_lldp_neighbors`` result, returning whether it changed."""
+        digest = table_hash(neighbors)
+        links = set((port, self.resolve(neighbor['hostname']),
+                     neighbor['port'])
+                    for port, entries in neighbors.items()
+                    for neighbor in entries)
+        with self._lock:
+            if self._hashes.get(name) == digest:
+                return False
+            self._hashes[name] = digest
+            self._index(name, self._links.get(name, ()), add=False)
+            self._index(name, links, add=True)
+            self._links[name] = links
+        return True
+
+    def update_detail(self, name, detail):
+        """Keeps a ``get_lldp_neighbors_detail`` result for the current table."""
+        with self._lock:
+            self._details[name] = (self._hashes.get(name), detail)
+
+    def needs_detail(self, name):
+        """Whether the device's table changed since its detail was kept."""
+        with self._lock:
+            digest = self._hashes.get(name)
+            return self._details.get(name, (None,))[0] != digest
+
+    def neighbors(self, name):
+        """Returns the links of a device, as reported by either end."""
+        with self._lock:
+            adjacency = dict(self._adjacency.get(name, {}))
+            detail = self._details.get(name, (None, {}))[1]
+        neighbors = []
+        for (port, neighbor, neighbor_port), reporters in sorted(
+                adjacency.items()):
+            entry = {
+                'port': port,
+                'device': neighbor,
+                'remote_port': neighbor_port,
+                'reported_by': sorted(reporters),
+            }
+            if detail.get(port):
+                entry['detail'] = detail[port]
+            neighbors.append(entry)
+        return neighbors
+
+    def graph(self):
+        """Returns the nodes and the edge list of the whole topology."""
+        with self._lock:
+            adjacency = dict((name, dict(links))
+                             for name, links in self._adjacency.items())
+        edges = []
+        for name, links in adjacency.items():
+            for (port, neighbor, neighbor_port), reporters in links.items():
+                # Every link is indexed from both ends, list it once
+                if (name, port) <= (neighbor, neighbor_port):
+                    edges.append({
+                        'source': name,
+                        'source_port': port,
+                        'target': neighbor,
+                        'target_port': neighbor_port,
+                        'reported_by': sorted(reporters),
+                    })
+        edges.sort(key=lambda edge: (edge['source'], edge['source_port'],
+                                     edge['target'], edge['target_port']))
+        return {'nodes': sorted(adjacency), 'edges': edges}
+
+    def _index(self, name, links, add):
+        for port, neighbor, neighbor_port in links:
+            for device, link in ((name, (port, neighbor, neighbor_port)),
+                                 (neighbor, (neighbor_port, name, port))):
+                entries = self._adjacency.setdefault(device, {})
+                reporters = entries.setdefault(link, set())
+                if add:
+                    reporters.add(name)
+                    continue
+                reporters.discard(name)
+                if not reporters:
+                    del entries[link]
+                if not entries:
+                    del self._adjacency[device]
+
+
+def crawl(seeds, visit, max_workers=DEFAULT_WORKERS, max_depth=None,
+          max_devices=None):
+    """Walks outward from the seed devices one hop at a time.
+
+    ``visit(name)`` returns the names of the neighbors to visit next. The
+    devices of one hop are visited concurrently, at most ``max_workers`` at
+    once. The walk stops after ``max_depth`` hops or once ``max_devices``
+    devices were reached. Returns the visited devices and the errors of the
+    visits that failed.
+    """
+    seen = set(seeds)
+    frontier = list(seeds)
+    visited, errors = [], {}
+    depth = 0
+    while frontier:
+        results, failed = run_concurrently(frontier, visit,
+                                           max_workers=max_workers)
+        visited.extend(frontier)
+        errors.update(failed)
+        if max_depth is not None and depth >= max_depth:
+            break
+
+        next_hop = []
+        for name in frontier:
+            for neighbor in results.get(name, ()):
+                if neighbor in seen:
+                    continue
+                if max_devices is not None and len(seen) >= max_devices:
+                    break
+                seen.add(neighbor)
+                next_hop.append(neighbor)
+        frontier = next_hop
+        depth += 1
+    return visited, errors
@@ -1,15 +1,304 @@
 # -*- coding: utf-8 -*-
+import functools
 import sys
 import json
+import threading
+import time
+import uuid
 from argparse import ArgumentParser
-from contextlib import contextmanager
+from contextlib import ExitStack, contextmanager
+from importlib.metadata import version
 
-import napalm
 from brewtils.decorators import system, command, parameter
-from brewtils.plugin import RemotePlugin
-from napalm.base import constants as c
+
+from napalm_bg_plugin import constants as c
+from napalm_bg_plugin.cache import (DEFAULT_MAX_ENTRIES, ResultCache,
+                                    SingleFlight)
+from napalm_bg_plugin.compliance import (ValidationCache, evaluate, matrix,
+                                         required_calls)
+from napalm_bg_plugin.configs import ConfigHistory
+from napalm_bg_plugin.counters import DEFAULT_SAMPLES, CounterHistory
+from napalm_bg_plugin.deploy import COMMITTED, ROLLED_BACK, deploy, stage
+from napalm_bg_plugin.facts import GROUP, FactsIndex, parse_query
+from napalm_bg_plugin.fanout import DEFAULT_WORKERS, run_concurrently
+from napalm_bg_plugin.formats import (COLUMNAR, COLUMNAR_INDEX, ENCODINGS,
+                                      FORMATS, JSON, NATIVE, encode,
+                                      to_columnar)
+from napalm_bg_plugin.inventory import ALL_DEVICES, Inventory
+from napalm_bg_plugin.metrics import (DEFAULT_SIZE_SAMPLING, METRICS_FORMATS,
+                                      PROMETHEUS, Metrics, instrument_commands)
+from napalm_bg_plugin.paging import ResultSpool
+from napalm_bg_plugin.profiling import (DEFAULT_TOP, PROFILE_OUTPUTS, RESULT,
+                                        Profiler)
+from napalm_bg_plugin.registration import CachedRemotePlugin
+from napalm_bg_plugin.resilience import (DEFAULT_BURST,
+                                         DEFAULT_FAILURE_THRESHOLD,
+                                         DEFAULT_MIN_TIMEOUT,
+                                         DEFAULT_RESET_TIMEOUT,
+                                         CircuitOpenError, DeviceGuard,
+                                         open_within)
+from napalm_bg_plugin.routes import FULL_TABLES, RouteIndex
+from napalm_bg_plugin.scheduler import Job, Poller, load_schedule
+from napalm_bg_plugin.sessions import (DEFAULT_CHECKOUT_TIMEOUT, Keepalive,
+                                       Lease, Session, SessionPool)
+from napalm_bg_plugin.snapshots import (DEFAULT_MAX_SNAPSHOTS,
+                                        SNAPSHOT_GETTERS, SnapshotStore)
+from napalm_bg_plugin.templates import TemplateCache
+from napalm_bg_plugin.topology import Topology, crawl, short_name
+
+GETTERS = (
+    'get_arp_table',
+    'get_bgp_config',
+    'get_bgp_neighbors',
+    'get_bgp_neighbors_detail',
+    'get_config',
+    'get_environment',
+    'get_facts',
+    'get_firewall_policies',
+    'get_interfaces',
+    'get_interfaces_counters',
+    'get_interfaces_ip',
+    'get_ipv6_neighbors_table',
+    'get_lldp_neighbors',
+    'get_lldp_neighbors_detail',
+    'get_mac_address_table',
+    'get_network_instances',
+    'get_ntp_peers',
+    'get_ntp_servers',
+    'get_ntp_stats',
+    'get_optics',
+    'get_probes_config',
+    'get_probes_results',
+    'get_route_to',
+    'get_snmp_information',
+    'get_users',
+)
+
+CONFIG_SECTIONS = ('running', 'startup', 'candidate')
+
+# Commands that manage profiling and are never profiled themselves
+PROFILING_COMMANDS = ('start_profiling', 'stop_profiling', 'get_profiles')
+
+# Getters whose results feed the facts index
+FACTS_GETTERS = ('get_facts', 'get_interfaces_ip')
 
 PARAMETERS = {
+    'target': {
+        'key': 'target',
+        'type': 'String',
+        'description': 'Name of the device or device group from the '
+                       'inventory to run against, or a query of the facts '
+                       'index. Optional if the plugin manages a single '
+                       'device.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'session': {
+        'key': 'session',
+        'type': 'String',
+        'description': 'Id of a session returned by open. The command runs '
+                       'over that session instead of a pooled one.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'targets': {
+        'key': 'targets',
+        'type': 'String',
+        'multi': True,
+        'description': 'Names of the devices or device groups from the '
+                       'inventory to run against.',
+        'optional': False,
+    },
+    'getter': {
+        'key': 'getter',
+        'type': 'String',
+        'description': 'Name of the NAPALM getter to run.',
+        'choices': list(GETTERS),
+        'optional': False,
+    },
+    'getter_args': {
+        'key': 'args',
+        'type': 'Dictionary',
+        'description': 'Keyword arguments for the getter.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'getters': {
+        'key': 'getters',
+        'type': 'String',
+        'multi': True,
+        'description': 'Names of the NAPALM getters to run.',
+        'choices': list(GETTERS),
+        'optional': False,
+    },
+    'getters_args': {
+        'key': 'args',
+        'type': 'Dictionary',
+        'description': 'Keyword arguments for the getters, keyed by getter '
+                       'name.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'concurrency': {
+        'key': 'concurrency',
+        'type': 'Integer',
+        'description': 'Maximum number of devices to talk to at once. '
+                       'Defaults to the plugin\'s worker count.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'device_timeout': {
+        'key': 'timeout',
+        'type': 'Integer',
+        'description': 'Seconds to wait for each device before reporting '
+                       'it as failed.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'max_age': {
+        'key': 'max_age',
+        'type': 'Integer',
+        'description': 'Oldest cached result in seconds that is acceptable. '
+                       'Defaults to the getter\'s cache TTL.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'force_refresh': {
+        'key': 'force_refresh',
+        'type': 'Boolean',
+        'description': 'Ignore cached results and ask the device.',
+        'optional': True,
+        'default': False,
+    },
+    'page_size': {
+        'key': 'page_size',
+        'type': 'Integer',
+        'description': 'Return the result in pages of this many rows. The '
+                       'rest of the pages are fetched with get_page.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+        'minimum': 1,
+    },
+    'format': {
+        'key': 'format',
+        'type': 'String',
+        'description': 'Return the rows as they come from NAPALM (native) '
+                       'or as one array of values per column (columnar).',
+        'choices': list(FORMATS),
+        'optional': True,
+        'default': NATIVE,
+    },
+    'encoding': {
+        'key': 'encoding',
+        'type': 'String',
+        'description': 'Return plain JSON, or a base64 payload of gzipped '
+                       'JSON or of msgpack.',
+        'choices': list(ENCODINGS),
+        'optional': True,
+        'default': JSON,
+    },
+    'cursor': {
+        'key': 'cursor',
+        'type': 'String',
+        'description': 'The next_cursor of the previous page.',
+        'optional': False,
+    },
+    'deploy_method': {
+        'key': 'method',
+        'type': 'String',
+        'description': 'How to load the change: merge or replace the '
+                       'candidate with the config or file, or render a '
+                       'template.',
+        'choices': ['merge', 'replace', 'template'],
+        'optional': True,
+        'default': 'merge',
+    },
+    'deploy_template_name': {
+        'key': 'template_name',
+        'type': 'String',
+        'description': 'Identifies the template name, for the template '
+                       'method.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'commit': {
+        'key': 'commit',
+        'type': 'Boolean',
+        'description': 'Commit the change. When false the candidate is only '
+                       'compared and then discarded, so the diffs can be '
+                       'reviewed before committing.',
+        'optional': True,
+        'default': False,
+    },
+    'canary': {
+        'key': 'canary',
+        'type': 'Integer',
+        'description': 'Number of devices to change first, on their own.',
+        'optional': True,
+        'default': 1,
+        'minimum': 0,
+    },
+    'wave_size': {
+        'key': 'wave_size',
+        'type': 'Integer',
+        'description': 'Number of devices in each wave after the canaries.',
+        'optional': True,
+        'default': 50,
+        'minimum': 1,
+    },
+    'max_failures': {
+        'key': 'max_failures',
+        'type': 'Integer',
+        'description': 'Number of failed devices tolerated before the '
+                       'remaining waves are skipped.',
+        'optional': True,
+        'default': 0,
+        'minimum': 0,
+    },
+    'rollback_on_abort': {
+        'key': 'rollback_on_abort',
+        'type': 'Boolean',
+        'description': 'Roll back the devices that were committed if the '
+                       'deployment is stopped.',
+        'optional': True,
+        'default': False,
+    },
+    'device_vars': {
+        'key': 'device_vars',
+        'type': 'Dictionary',
+        'description': 'Template variables for each device, keyed by '
+                       'device name. They override template_vars.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'optional_targets': {
+        'key': 'targets',
+        'type': 'String',
+        'multi': True,
+        'description': 'Names of the devices or device groups from the '
+                       'inventory. Defaults to the devices in device_vars.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'load': {
+        'key': 'load',
+        'type': 'Boolean',
+        'description': 'Load the rendered configs as merge candidates '
+                       'instead of returning them.',
+        'optional': True,
+        'default': False,
+    },
     'template_name': {
         'key': 'template_name',
         'type': 'String',
@@ -73,6 +362,14 @@ PARAMETERS = {
         'default': None,
         'nullable': True,
     },
+    'longer': {
+        'key': 'longer',
+        'type': 'Boolean',
+        'description': 'Also return the routes to prefixes within the '
+                       'destination.',
+        'optional': True,
+        'default': False,
+    },
     'interface': {
         'key': 'interface',
         'type': 'String',
@@ -80,6 +377,23 @@ PARAMETERS = {
         'default': '',
         'optional': True,
     },
+    'rate_window': {
+        'key': 'window',
+        'type': 'Integer',
+        'description': 'Number of seconds of counter samples to compute '
+                       'the rates over.',
+        'optional': True,
+        'default': 300,
+        'minimum': 1,
+    },
+    'sample': {
+        'key': 'sample',
+        'type': 'Boolean',
+        'description': 'Read the counters from the device first, unless '
+                       'they were read in the last few seconds.',
+        'optional': True,
+        'default': True,
+    },
     'group': {
         'key': 'group',
         'type': 'String',
@@ -202,6 +516,15 @@ PARAMETERS = {
         'optional': True,
         'default': 'all',
     },
+    'config_hashes': {
+        'key': 'hashes',
+        'type': 'Dictionary',
+        'description': 'Hash of the configuration the caller already has, '
+                       'keyed by section (running, startup, candidate).',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
     'network_instance_name': {
         'key': 'name',
         'type': 'String',
@@ -211,6 +534,182 @@ PARAMETERS = {
         'default': 'all',
 
     },
+    'seeds': {
+        'key': 'seeds',
+        'type': 'String',
+        'multi': True,
+        'description': 'Names of the devices or device groups from the '
+                       'inventory to start crawling from.',
+    },
+    'max_depth': {
+        'key': 'max_depth',
+        'type': 'Integer',
+        'description': 'Number of hops to crawl away from the seeds, '
+                       'default is no limit.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+        'minimum': 0,
+    },
+    'max_devices': {
+        'key': 'max_devices',
+        'type': 'Integer',
+        'description': 'Number of devices to crawl at most, default is no '
+                       'limit.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+        'minimum': 1,
+    },
+    'lldp_detail': {
+        'key': 'detail',
+        'type': 'Boolean',
+        'description': 'Also keep the detailed LLDP neighbors of the devices '
+                       'whose neighbors changed.',
+        'optional': True,
+        'default': False,
+    },
+    'topology_device': {
+        'key': 'device',
+        'type': 'String',
+        'description': 'Name of the device, as in the inventory or as '
+                       'reported by LLDP.',
+    },
+    'address': {
+        'key': 'address',
+        'type': 'String',
+        'description': 'IPv4 or IPv6 address to look up.',
+    },
+    'route_targets': {
+        'key': 'targets',
+        'type': 'String',
+        'multi': True,
+        'description': 'Names of the devices or device groups to look the '
+                       'address up on. Defaults to every indexed device.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'confirm': {
+        'key': 'confirm',
+        'type': 'String',
+        'multi': True,
+        'description': 'Names of the devices or device groups to also ask '
+                       'for their route to the address.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'snapshot_getters': {
+        'key': 'getters',
+        'type': 'String',
+        'multi': True,
+        'description': 'Names of the NAPALM getters to snapshot. Defaults '
+                       'to %s.' % ', '.join(SNAPSHOT_GETTERS),
+        'choices': list(GETTERS),
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'label': {
+        'key': 'label',
+        'type': 'String',
+        'description': 'Label for the snapshot, such as pre or post. '
+                       'Snapshots can be referred to by their label.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'snapshot': {
+        'key': 'snapshot',
+        'type': 'String',
+        'description': 'Id or label of the snapshot, default is the latest '
+                       'snapshot.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'before': {
+        'key': 'before',
+        'type': 'String',
+        'description': 'Id or label of the older snapshot, default is the '
+                       'one taken before the newer snapshot.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'after': {
+        'key': 'after',
+        'type': 'String',
+        'description': 'Id or label of the newer snapshot, default is the '
+                       'latest snapshot.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'query': {
+        'key': 'query',
+        'type': 'String',
+        'description': 'Criteria the devices must match, such as '
+                       'vendor=Arista,os_version=4.2*. Criteria are the '
+                       'facts hostname, fqdn, vendor, model, os_version and '
+                       'serial_number, as well as address, prefix, '
+                       'min_uptime, max_uptime and group.',
+    },
+    'profile_commands': {
+        'key': 'commands',
+        'type': 'String',
+        'multi': True,
+        'description': 'Names of the commands to profile. Without commands, '
+                       'every command is profiled for the given devices.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'profile_devices': {
+        'key': 'devices',
+        'type': 'String',
+        'multi': True,
+        'description': 'Names of the devices or device groups whose work is '
+                       'profiled, default is the whole command.',
+        'optional': True,
+        'default': None,
+        'nullable': True,
+    },
+    'profile_output': {
+        'key': 'output',
+        'type': 'String',
+        'description': 'Return the profile along with the result of each '
+                       'profiled command, or write it to a file.',
+        'choices': list(PROFILE_OUTPUTS),
+        'optional': True,
+        'default': RESULT,
+    },
+    'profile_top': {
+        'key': 'top',
+        'type': 'Integer',
+        'description': 'Number of frames with the most cumulative time to '
+                       'report.',
+        'optional': True,
+        'default': DEFAULT_TOP,
+        'minimum': 1,
+    },
+    'metrics_format': {
+        'key': 'format',
+        'type': 'String',
+        'description': 'Return the metrics as JSON or in the Prometheus '
+                       'text format.',
+        'choices': list(METRICS_FORMATS),
+        'optional': True,
+        'default': JSON,
+    },
+    'details': {
+        'key': 'details',
+        'type': 'Boolean',
+        'description': 'Include the full compliance report of every device.',
+        'optional': True,
+        'default': False,
+    },
     'validation_file': {
         'key': 'validation_file',
         'type': 'String',
@@ -232,339 +731,1385 @@ PARAMETERS = {
 
 
 @system
+@instrument_commands
 class NapalmPlugin(object):
-    """Plugin that wraps NAPALM's EOS Driver"""
+    """Plugin that wraps NAPALM's drivers for one or more devices"""
 
     def __init__(self,
-                 driver,
-                 hostname,
-                 username,
-                 password,
+                 driver=None,
+                 hostname=None,
+                 username=None,
+                 password=None,
                  timeout=60,
-                 optional_args=None):
-        self._driver = driver
-        self._init_params = {
-            'hostname': hostname,
-            'username': username,
-            'password': password,
-            'timeout': timeout,
-            'optional_args': optional_args or {}
+                 optional_args=None,
+                 inventory=None,
+                 max_sessions=1,
+                 idle_timeout=300,
+                 keepalive_interval=30,
+                 checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT,
+                 workers=DEFAULT_WORKERS,
+                 cache_ttls=None,
+                 cache_size=DEFAULT_MAX_ENTRIES,
+                 spool_dir=None,
+                 counter_samples=DEFAULT_SAMPLES,
+                 snapshot_dir=None,
+                 max_snapshots=DEFAULT_MAX_SNAPSHOTS,
+                 rate_limit=None,
+                 rate_burst=DEFAULT_BURST,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout=DEFAULT_RESET_TIMEOUT,
+                 min_timeout=DEFAULT_MIN_TIMEOUT,
+                 facts_file=None,
+                 profile_dir=None,
+                 size_sampling=DEFAULT_SIZE_SAMPLING,
+                 poll_schedule=None,
+                 poll_options=None):
+        if inventory is None:
+            inventory = Inventory.single(driver, hostname, username,
+                                         password, timeout=timeout,
+                                         optional_args=optional_args)
+        self._inventory = inventory
+        self._workers = workers
+        self._cache = ResultCache(ttls=cache_ttls, max_entries=cache_size)
+        self._flights = SingleFlight()
+        self._configs = ConfigHistory()
+        self._templates = TemplateCache()
+        self._validations = ValidationCache()
+        self._metrics = Metrics(size_sampling=size_sampling)
+        self._profiler = Profiler(directory=profile_dir,
+                                  ignore=PROFILING_COMMANDS)
+        self._local = threading.local()
+        self._spool = ResultSpool(directory=spool_dir)
+        self._counters = CounterHistory(size=counter_samples)
+        self._topology = Topology(aliases=self._aliases())
+        self._routes = RouteIndex()
+        self._facts = FactsIndex(path=facts_file,
+                                 names=self._inventory.names)
+        self._inventory.selector = self._select
+        self._snapshots = SnapshotStore(directory=snapshot_dir,
+                                        max_snapshots=max_snapshots)
+        self._drivers = {}
+        self._pool_options = {
+            'max_sessions': max_sessions,
+            'idle_timeout': idle_timeout,
+            'keepalive_interval': keepalive_interval,
+            'checkout_timeout': checkout_timeout,
         }
-        self._device = None
-        self._externally_managed = False
+        self._pools = {}
+        self._guard_options = {
+            'rate': rate_limit,
+            'burst': rate_burst,
+            'failure_threshold': failure_threshold,
+            'reset_timeout': reset_timeout,
+            'min_timeout': min_timeout,
+        }
+        self._guards = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+        self._keepalive = Keepalive(self._maintain,
+                                    interval=min(keepalive_interval,
+                                                 idle_timeout))
+        self._keepalive.start()
+
+        self._poller = None
+        if poll_schedule:
+            self._start_poller(poll_schedule, poll_options or {})
+
+    def _start_poller(self, schedule, options):
+        jobs = []
+        for definition in schedule:
+            getter, interval = definition['getter'], definition['interval']
+            if getter not in GETTERS:
+                raise ValueError("Cannot poll %s, it is not a getter"
+                                 % getter)
+            for name in self._inventory.resolve_all(
+                    definition.get('targets', [ALL_DEVICES])):
+                jobs.append(Job(name, getter, interval,
+                                args=definition.get('args')))
+            # Keep polled results fresh for two intervals so that requests
+            # are answered from memory even if a poll runs a little late.
+            self._cache.ttls[getter] = max(self._cache.ttl(getter),
+                                           2 * interval)
+        self._poller = Poller(
+            jobs,
+            lambda name, getter, args: self._cached(name, getter, args,
+                                                    force_refresh=True),
+            **options
+        )
+        self._poller.start()
+
+    def shutdown(self):
+        """Stops background threads, closes sessions, removes temp files."""
+        self._keepalive.stop()
+        if self._poller is not None:
+            self._poller.stop()
+        with self._lock:
+            lease_ids = list(self._leases)
+            pools = list(self._pools.values())
+        for lease_id in lease_ids:
+            try:
+                self._release(lease_id)
+            except ValueError:
+                pass
+        for pool in pools:
+            pool.close_all()
+        self._snapshots.close()
+        self._profiler.close()
+
+    def _pool(self, name, diagnostics=False):
+        # Diagnostics get sessions of their own so that a long ping or
+        # traceroute never holds up the getters for the same device.
+        key = (name, diagnostics)
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = SessionPool(
+                    functools.partial(self._open, name),
+                    self._close,
+                    **self._pool_options
+                )
+            return self._pools[key]
+
+    def _guard(self, name):
+        with self._lock:
+            if name not in self._guards:
+                self._guards[name] = DeviceGuard(name, **self._guard_options)
+            return self._guards[name]
+
+    def _throttle(self, guard):
+        waited = guard.throttle()
+        if waited:
+            self._metrics.observe('throttled_seconds', waited,
+                                  device=guard.name)
+
+    def _maintain(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.maintain()
+
+        # Give back the sessions of owners that went away without closing
+        expiry = time.time() - self._pool_options['idle_timeout']
+        with self._lock:
+            expired = [lease_id for lease_id, lease in self._leases.items()
+                       if lease.last_used < expiry]
+        for lease_id in expired:
+            try:
+                self._release(lease_id)
+            except ValueError:
+                pass
+
+        try:
+            self._snapshots.maintain()
+        except OSError:
+            # Retried on the next run, keeping the keepalive thread alive
+            pass
+
+    def _get_driver(self, name):
+        driver = self._inventory.get(name)['driver']
+        if not isinstance(driver, str):
+            return driver
+        if driver not in self._drivers:
+            # Imported on first use, see napalm_bg_plugin.constants
+            from napalm import get_network_driver
+            self._drivers[driver] = get_network_driver(driver)
+        return self._drivers[driver]
 
     @contextmanager
-    def _connect(self):
-        if self._externally_managed:
-            yield self._device
-        elif self._device:
-            yield self._device
-        else:
-            self._open(external=False)
-            yield self._device
-            self._close(external=False)
-
-    def _open(self, external=True):
-        self._externally_managed = external
-        if self._device is None:
-            self._device = self._driver(**self._init_params)
-            self._device.open()
-
-    def _close(self, external=True):
-        if self._device is None:
+    def _connect(self, name, diagnostics=False, session=None):
+        start = time.time()
+        self._local.opened = False
+        if session:
+            # Requests may run concurrently, so calls on an owned session
+            # have to take turns.
+            with self._lease(session, name).device(name) as device:
+                self._checked_out(name, start)
+                yield device
             return
-        elif self._externally_managed and not external:
-            raise ValueError("Cannot close a connection that is being externally managed. "
-                             "You shouldn't be seeing this message.")
+        with self._pool(name, diagnostics).session() as device:
+            self._checked_out(name, start)
+            yield device
 
-        self._device.close()
-        self._device = None
-        self._externally_managed = False
+    def _checked_out(self, name, start):
+        self._since('checkout_seconds', start, name)
+        if not self._local.opened:
+            self._metrics.increment('sessions_reused_total', device=name)
 
-    @command
-    def open(self):
-        """Opens a connection to the device."""
-        return self._open(external=True)
+    def _open(self, name):
+        guard = self._guard(name)
+        params = self._inventory.init_params(name)
+        self._throttle(guard)
+        start = time.time()
+        try:
+            # The driver keeps the configured timeout for its calls, only
+            # the connection attempt is held to the estimated deadline
+            with guard.connecting(params['timeout']) as deadline:
+                device = self._get_driver(name)(**params)
+                open_within(device, deadline)
+        except CircuitOpenError:
+            self._metrics.increment('circuit_rejected_total', device=name)
+            raise
+        except Exception:
+            self._metrics.increment('sessions_failed_total', device=name)
+            raise
+        finally:
+            self._since('connect_seconds', start, name)
+        self._metrics.increment('sessions_opened_total', device=name)
+        self._local.opened = True
+        return device
 
-    @command
-    def close(self):
-        """Closes the connection to the device."""
-        self._close(external=True)
+    def _close(self, device):
+        start = time.time()
+        try:
+            device.close()
+        finally:
+            self._metrics.since('close_seconds', start)
+            self._metrics.increment('sessions_closed_total')
 
-    @command
-    def is_alive(self):
+    def _invoke(self, name, device, method, **kwargs):
+        """Calls a driver method, timing it by device and method."""
+        guard = self._guard(name)
+        self._throttle(guard)
+        start = time.time()
+        try:
+            return getattr(device, method)(**kwargs)
+        finally:
+            self._since('call_seconds', start, name, method=method)
+
+    def _since(self, metric, start, name, method=None):
+        """Observes the seconds a device took, also in a profile being taken."""
+        seconds = time.time() - start
+        labels = {'device': name}
+        if method is not None:
+            labels['method'] = method
+        self._metrics.observe(metric, seconds, **labels)
+        profile = getattr(self._local, 'profile', None)
+        if profile is not None and profile.wants(name):
+            profile.add(name, metric, seconds, method=method)
+
+    def _call(self, target, method, session=None, **kwargs):
+        """Calls a driver method on every device the target refers to.
+
+        A single device returns the driver's result as is. A group returns a
+        dictionary with the ``results`` keyed by device name and the
+        ``errors`` of the devices that failed.
+        """
+        return self._dispatch(
+            target, lambda name: self._run(name, method, session=session,
+                                           **kwargs))
+
+    def _get(self, target, getter, max_age=None, force_refresh=False,
+             page_size=None, format=NATIVE, encoding=JSON, **kwargs):
+        """Like ``_call`` but answers from the result cache when possible.
+
+        With a ``page_size`` the result is spooled and only its first page
+        is returned, see ``get_page``. Tabular results can also be returned
+        in the ``columnar`` format and in a compact ``encoding``.
+        """
+        if page_size and format == COLUMNAR:
+            raise ValueError("The columnar format can not be paged")
+
+        def get(name):
+            result = self._cached(name, getter, kwargs, max_age,
+                                  force_refresh)
+            if page_size:
+                return self._spool.spool(result, page_size)
+            if format == COLUMNAR:
+                result = to_columnar(result, COLUMNAR_INDEX[getter])
+            return encode(result, encoding)
+        return self._dispatch(target, get)
+
+    def _dispatch(self, target, func, concurrency=None, timeout=None):
+        names = self._inventory.resolve(target)
+        if self._inventory.is_device(target):
+            return self._profiled(func)(names[0])
+        return self._fan_out(names, func, concurrency=concurrency,
+                             timeout=timeout)
+
+    def _fan_out(self, names, func, concurrency=None, timeout=None):
+        results, errors = run_concurrently(
+            names,
+            self._profiled(func),
+            max_workers=concurrency or self._workers,
+            timeout=timeout
+        )
+        return {'results': results, 'errors': errors}
+
+    def _profiled(self, func):
+        """Wraps per device work to be profiled along with its command."""
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            return func
+
+        def run(name):
+            previous = getattr(self._local, 'profile', None)
+            self._local.profile = profile
+            try:
+                if not profile.wants(name):
+                    return func(name)
+                with profile.profiling():
+                    return func(name)
+            finally:
+                self._local.profile = previous
+        return run
+
+    def _run(self, name, method, session=None, **kwargs):
+        with self._connect(name, session=session) as device:
+            return self._invoke(name, device, method, **kwargs)
+
+    def _cached(self, name, getter, kwargs, max_age=None,
+                force_refresh=False, run=None):
+        key = self._cache.key(name, getter, kwargs)
+        if not force_refresh:
+            hit, result = self._cache.get(key, max_age=max_age)
+            if hit:
+                return result
+
+        def fetch():
+            generation = self._cache.generation(name)
+            result = (run or self._run)(name, getter, **kwargs)
+            # A commit or rollback while the device was being asked makes
+            # the result stale, so it is only handed to the callers that
+            # asked before the change
+            if self._cache.generation(name) == generation:
+                # Results the indexes reject are not cached either
+                self._observe(name, getter, kwargs, result)
+                self._cache.put(key, result, generation=generation)
+            return result
+
+        if run is not None:
+            # The caller may hold the device's session, which the call it
+            # would wait for could be waiting for in turn
+            return fetch()
+
+        # Identical requests arriving while the device is being asked wait
+        # for its answer instead of asking again. The call first waits for
+        # a session and then for the device.
+        result, shared = self._flights.do(
+            key, fetch,
+            timeout=(self._pool_options['checkout_timeout'] +
+                     self._inventory.init_params(name)['timeout']))
+        if shared:
+            self._metrics.increment('coalesced_total', device=name,
+                                    method=getter)
+        return result
+
+    def _observe(self, name, getter, kwargs, result):
+        """Feeds a result fresh from the device to the plugin's indexes."""
+        if getter == 'get_interfaces_counters':
+            self._counters.record(name, result)
+        elif getter == 'get_lldp_neighbors':
+            self._topology.update(name, result)
+        elif getter == 'get_lldp_neighbors_detail':
+            self._topology.update_detail(name, result)
+        elif getter == 'get_facts':
+            self._facts.update_facts(name, result)
+        elif getter == 'get_interfaces_ip':
+            self._facts.update_addresses(name, result)
+        elif getter == 'get_route_to':
+            # With longer and no protocol, every route within the
+            # destination is returned
+            scope = None
+            if (kwargs.get('longer') and kwargs.get('destination') and
+                    not kwargs.get('protocol')):
+                scope = kwargs['destination']
+            self._routes.update(name, result, scope=scope)
+
+    def _select(self, query):
+        """Resolves a query of the facts index to inventory device names."""
+        criteria = parse_query(query)
+        names = self._inventory.names
+        if GROUP in criteria:
+            names = self._inventory.resolve_all(criteria.pop(GROUP))
+        return self._facts.select(criteria, names=names)
+
+    def _aliases(self):
+        # Names that neighbors may report the devices of the inventory by.
+        # Device names come before hostnames, which come before short names,
+        # and a hostname or short name shared by several devices is left
+        # out rather than matched to whichever device came last.
+        devices = [(name, self._inventory.get(name)['hostname'])
+                   for name in self._inventory.names]
+        aliases = dict((name, name) for name, _ in devices)
+        for alias_of in (lambda hostname: hostname, short_name):
+            claims = {}
+            for name, hostname in devices:
+                claims.setdefault(alias_of(hostname), set()).add(name)
+            for alias, names in claims.items():
+                if len(names) == 1 and alias not in aliases:
+                    aliases[alias] = names.pop()
+        return aliases
+
+    def _collect(self, name, getters, getters_args, max_age=None,
+                 force_refresh=False):
+        """Runs several getters against one device over a single session.
+
+        The session is only checked out once a getter misses the cache.
+        Getters run one after another since a driver session cannot be
+        used by several threads at once.
+        """
+        results, errors, timings = {}, {}, {}
+        with self._lazy_session() as run:
+            for getter in getters:
+                start = time.time()
+                try:
+                    results[getter] = self._cached(
+                        name, getter, getters_args.get(getter) or {},
+                        max_age, force_refresh, run=run)
+                except Exception as exc:
+                    errors[getter] = str(exc) or exc.__class__.__name__
+                timings[getter] = time.time() - start
+
+        return {'results': results, 'errors': errors, 'timings': timings}
+
+    @contextmanager
+    def _lazy_session(self):
+        """Yields a ``run`` for ``_cached`` that connects on first use."""
+        with ExitStack() as stack:
+            session = []
+
+            def run(name, getter, **kwargs):
+                if not session:
+                    session.append(stack.enter_context(self._connect(name)))
+                return self._invoke(name, session[0], getter, **kwargs)
+
+            yield run
+
+    def _compliance_results(self, name, rules, max_age=None,
+                            force_refresh=False):
+        """Collects the results of every getter the rules need, once each."""
+        results = {}
+        with self._lazy_session() as run:
+            for rule in required_calls(rules):
+                try:
+                    results[rule.call] = self._cached(
+                        name, rule.getter, rule.kwargs, max_age,
+                        force_refresh, run=run)
+                except NotImplementedError as exc:
+                    results[rule.call] = exc
+        return results
+
+    def _compliance_rules(self, validation_file, validation_source):
+        rules = self._validations.load(validation_file, validation_source)
+        for rule in rules:
+            if rule.getter not in GETTERS:
+                raise ValueError("%s is not a getter" % rule.getter)
+        return rules
+
+    def _invalidate(self, target):
+        for name in self._inventory.resolve(target):
+            self._cache.invalidate(name)
+            # Results being read now may predate the change
+            self._flights.forget(name)
+
+    def _diagnose(self, target, method, **kwargs):
+        def run(name):
+            with self._connect(name, diagnostics=True) as device:
+                return self._invoke(name, device, method, **kwargs)
+        return self._dispatch(target, run)
+
+    def _lease(self, lease_id, name=None):
+        with self._lock:
+            lease = self._leases.get(lease_id)
+        if lease is None:
+            raise ValueError("Unknown session %s" % lease_id)
+        if name is not None and name not in lease.sessions:
+            raise ValueError("Session %s is not open on %s" % (lease_id, name))
+        return lease
+
+    def _release(self, lease_id, names=None):
+        """Closes the sessions of a lease, or only those to ``names``."""
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is None:
+                raise ValueError("Unknown session %s" % lease_id)
+            released = [(name, lease.sessions.pop(name))
+                        for name in list(lease.sessions)
+                        if names is None or name in names]
+            if not lease.sessions:
+                del self._leases[lease_id]
+        for name, session in released:
+            # Wait for a request still running over the session
+            with lease.locks[name]:
+                self._close_quietly(session.device)
+
+    def _close_quietly(self, device):
+        try:
+            self._close(device)
+        except Exception:
+            pass
+
+    @parameter(**PARAMETERS['target'])
+    def open(self, target=None):
+        """Opens a connection to the device, returning the id of the session."""
+        # Owned sessions are opened besides the pooled ones, so that other
+        # requests for the devices are not kept waiting until they close
+        results, errors = run_concurrently(
+            self._inventory.resolve(target),
+            lambda name: Session(self._open(name)),
+            max_workers=self._workers)
+        if errors:
+            for session in results.values():
+                self._close_quietly(session.device)
+            raise ValueError("Unable to open a session to %s: %s"
+                             % (', '.join(sorted(errors)),
+                                '; '.join(errors[name]
+                                          for name in sorted(errors))))
+
+        lease_id = uuid.uuid4().hex
+        with self._lock:
+            self._leases[lease_id] = Lease(results)
+        return {'session': lease_id, 'devices': sorted(results)}
+
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['session'])
+    def close(self, target=None, session=None):
+        """Closes a session opened by open, or the idle and owned sessions to the device."""
+        if session:
+            self._release(session)
+            return
+        names = set(self._inventory.resolve(target))
+        with self._lock:
+            lease_ids = [lease_id for lease_id, lease in self._leases.items()
+                         if names.intersection(lease.sessions)]
+            pools = [pool for (name, _), pool in self._pools.items()
+                     if name in names]
+        for lease_id in lease_ids:
+            try:
+                self._release(lease_id, names)
+            except ValueError:
+                pass
+        for pool in pools:
+            pool.close_all()
+
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['session'])
+    def is_alive(self, target=None, session=None):
         """Returns a flag with the connection state."""
-        with self._connect() as device:
-            return device.is_alive()
+        return self._call(target, 'is_alive', session=session)
 
     @parameter(**PARAMETERS['template_name'])
     @parameter(**PARAMETERS['template_source'])
     @parameter(**PARAMETERS['template_path'])
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['session'])
     @parameter(**PARAMETERS['template_vars'], is_kwarg=True)
     def load_template(self, template_name, template_source=None,
-                      template_path=None, **template_vars):
+                      template_path=None, target=None, session=None,
+                      **template_vars):
         """Will load a templated configuration on the device."""
-        with self._connect() as device:
-            return device.load_template(template_name,
+        def load(name):
+            with self._connect(name, session=session) as device:
+                return self._load_template(name, device, template_name,
+                                           template_source, template_path,
+                                           template_vars)
+        try:
+            return self._dispatch(target, load)
+        finally:
+            self._invalidate(target)
+
+    def _load_template(self, name, device, template_name, template_source,
+                       template_path, template_vars):
+        # Same as NAPALM's load_template, but with compiled templates reused
+        config = self._templates.render(self._get_driver(name),
+                                        template_name,
                                         template_source=template_source,
                                         template_path=template_path,
                                         **template_vars)
+        return device.load_merge_candidate(config=config)
+
+    @parameter(**PARAMETERS['deploy_template_name'])
+    @parameter(**PARAMETERS['template_source'])
+    @parameter(**PARAMETERS['template_path'])
+    @parameter(**PARAMETERS['template_vars'])
+    @parameter(**PARAMETERS['device_vars'])
+    @parameter(**PARAMETERS['optional_targets'])
+    @parameter(**PARAMETERS['load'])
+    @parameter(**PARAMETERS['concurrency'])
+    def render_template(self, template_name=None, template_source=None,
+                        template_path=None, template_vars=None,
+                        device_vars=None, targets=None, load=False,
+                        concurrency=None):
+        """Renders one template for many devices and optionally loads the results."""
+        device_vars = device_vars or {}
+        names = self._inventory.resolve_all(targets or list(device_vars))
+
+        def render(name):
+            variables = dict(template_vars or {})
+            variables.update(device_vars.get(name) or {})
+            start = time.time()
+            config = self._templates.render(
+                self._get_driver(name), template_name,
+                template_source=template_source,
+                template_path=template_path,
+                **variables)
+            result = {'render_time': time.time() - start}
+            if load:
+                start = time.time()
+                try:
+                    self._run(name, 'load_merge_candidate', config=config)
+                finally:
+                    self._invalidate(name)
+                result['load_time'] = time.time() - start
+            else:
+                result['config'] = config
+            return result
+
+        return self._fan_out(names, render, concurrency=concurrency)
 
     @parameter(**PARAMETERS['filename'])
     @parameter(**PARAMETERS['config'])
-    def load_replace_candidate(self, filename=None, config=None):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['session'])
+    def load_replace_candidate(self, filename=None, config=None, target=None,
+                               session=None):
         """Populates the candidate configuration."""
-        with self._connect() as device:
-            return device.load_replace_candidate(filename=filename,
-                                                 config=config)
+        try:
+            return self._call(target, 'load_replace_candidate',
+                              session=session,
+                              filename=filename,
+                              config=config)
+        finally:
+            self._invalidate(target)
 
     @parameter(**PARAMETERS['filename'])
     @parameter(**PARAMETERS['config'])
-    def load_merge_candidate(self, filename=None, config=None):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['session'])
+    def load_merge_candidate(self, filename=None, config=None, target=None,
+                             session=None):
         """Populates the candidate configuration."""
-        with self._connect() as device:
-            return device.load_merge_candidate(filename=filename,
-                                               config=config)
+        try:
+            return self._call(target, 'load_merge_candidate',
+                              session=session,
+                              filename=filename,
+                              config=config)
+        finally:
+            self._invalidate(target)
 
-    @command
-    def compare_config(self):
+    @parameter(**PARAMETERS['targets'])
+    @parameter(**PARAMETERS['deploy_method'])
+    @parameter(**PARAMETERS['config'])
+    @parameter(**PARAMETERS['filename'])
+    @parameter(**PARAMETERS['deploy_template_name'])
+    @parameter(**PARAMETERS['template_source'])
+    @parameter(**PARAMETERS['template_path'])
+    @parameter(**PARAMETERS['template_vars'])
+    @parameter(**PARAMETERS['commit'])
+    @parameter(**PARAMETERS['canary'])
+    @parameter(**PARAMETERS['wave_size'])
+    @parameter(**PARAMETERS['concurrency'])
+    @parameter(**PARAMETERS['max_failures'])
+    @parameter(**PARAMETERS['rollback_on_abort'])
+    def deploy_config(self, targets, method='merge', config=None,
+                      filename=None, template_name=None,
+                      template_source=None, template_path=None,
+                      template_vars=None, commit=False, canary=1,
+                      wave_size=50, concurrency=None, max_failures=0,
+                      rollback_on_abort=False):
+        """Loads, compares and commits a change on many devices in waves."""
+        if method not in ('merge', 'replace', 'template'):
+            raise ValueError("Unknown method %s" % method)
+
+        def run_device(name):
+            def load(device):
+                if method == 'template':
+                    self._load_template(name, device, template_name,
+                                        template_source, template_path,
+                                        template_vars or {})
+                else:
+                    getattr(device, 'load_%s_candidate' % method)(
+                        filename=filename, config=config)
+
+            try:
+                with self._connect(name) as device:
+                    return stage(device, load, commit=commit)
+            finally:
+                # Even a dry run replaces the candidate
+                self._invalidate(name)
+
+        report = deploy(self._inventory.resolve_all(targets), run_device,
+                        canary=canary, wave_size=wave_size,
+                        parallelism=concurrency or self._workers,
+                        max_failures=max_failures)
+
+        if report['aborted'] and rollback_on_abort:
+            committed = [name for name, device in report['devices'].items()
+                         if device['status'] == COMMITTED]
+            results, errors = run_concurrently(
+                committed, lambda name: self._run(name, 'rollback'),
+                max_workers=concurrency or self._workers)
+            for name in committed:
+                self._invalidate(name)
+                if name in results:
+                    report['devices'][name]['status'] = ROLLED_BACK
+                else:
+                    report['devices'][name]['cleanup_error'] = errors[name]
+        return report
+
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['session'])
+    def compare_config(self, target=None, session=None):
         """Compare the loaded configuration."""
-        with self._connect() as device:
-            return device.compare_config()
+        return self._call(target, 'compare_config', session=session)
 
-    @command
-    def commit_config(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['session'])
+    def commit_config(self, target=None, session=None):
         """Commits the changes requested by the candidate."""
-        with self._connect() as device:
-            return device.commit_config()
+        try:
+            return self._call(target, 'commit_config', session=session)
+        finally:
+            self._invalidate(target)
 
-    @command
-    def discard_config(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['session'])
+    def discard_config(self, target=None, session=None):
         """Discards the configuration loaded into the candidate."""
-        with self._connect() as device:
-            return device.discard_config()
+        try:
+            return self._call(target, 'discard_config', session=session)
+        finally:
+            self._invalidate(target)
 
-    @command
-    def rollback(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['session'])
+    def rollback(self, target=None, session=None):
         """If changes were made, revert changes to the original state."""
-        with self._connect() as device:
-            return device.rollback()
+        try:
+            return self._call(target, 'rollback', session=session)
+        finally:
+            self._invalidate(target)
 
-    @command
-    def get_facts(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_facts(self, target=None, max_age=None, force_refresh=False):
         """Returns a dictionary of information."""
-        with self._connect() as device:
-            return device.get_facts()
+        return self._get(target, 'get_facts', max_age, force_refresh)
 
-    @command
-    def get_interfaces(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_interfaces(self, target=None, max_age=None, force_refresh=False):
         """Gets interfaces."""
-        with self._connect() as device:
-            return device.get_interfaces()
+        return self._get(target, 'get_interfaces', max_age, force_refresh)
 
-    @command
-    def get_lldp_neighbors(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_lldp_neighbors(self, target=None, max_age=None,
+                           force_refresh=False):
         """Gets all LLDP neighbors."""
-        with self._connect() as device:
-            return device.get_lldp_neighbors()
+        return self._get(target, 'get_lldp_neighbors', max_age, force_refresh)
 
-    @command
-    def get_bgp_neighbors(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_bgp_neighbors(self, target=None, max_age=None,
+                          force_refresh=False):
         """Gets all BGP neighbors."""
-        with self._connect() as device:
-            return device.get_bgp_neighbors()
+        return self._get(target, 'get_bgp_neighbors', max_age, force_refresh)
 
-    @command
-    def get_environment(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_environment(self, target=None, max_age=None, force_refresh=False):
         """Gets the environment of the device."""
-        with self._connect() as device:
-            return device.get_environment()
+        return self._get(target, 'get_environment', max_age, force_refresh)
 
-    @command
-    def get_interfaces_counters(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    @parameter(**PARAMETERS['format'])
+    @parameter(**PARAMETERS['encoding'])
+    def get_interfaces_counters(self, target=None, max_age=None,
+                                force_refresh=False, format='native',
+                                encoding='json'):
         """Gets interface counters of the device."""
-        with self._connect() as device:
-            return device.get_interfaces_counters()
+        return self._get(target, 'get_interfaces_counters', max_age,
+                         force_refresh, format=format, encoding=encoding)
+
+    @parameter(**PARAMETERS['rate_window'])
+    @parameter(**PARAMETERS['interface'])
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['sample'])
+    def get_interfaces_rates(self, window=300, interface='', target=None,
+                             sample=True):
+        """Returns interface counter deltas and rates over a recent window."""
+        def rates(name):
+            if sample:
+                self._cached(name, 'get_interfaces_counters', {})
+            return self._counters.rates(name, window, interface=interface)
+        return self._dispatch(target, rates)
 
     @parameter(**PARAMETERS['interface'])
-    def get_lldp_neighbors_detail(self, interface=''):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_lldp_neighbors_detail(self, interface='', target=None,
+                                  max_age=None, force_refresh=False):
         """Gets LLDP Neighbors of the device with more detail."""
-        with self._connect() as device:
-            return device.get_lldp_neighbors_detail(interface=interface)
+        return self._get(target, 'get_lldp_neighbors_detail', max_age,
+                         force_refresh, interface=interface)
 
     @parameter(**PARAMETERS['group'])
     @parameter(**PARAMETERS['neighbor'])
-    def get_bgp_config(self, group='', neighbor=''):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_bgp_config(self, group='', neighbor='', target=None, max_age=None,
+                       force_refresh=False):
         """Gets BGP config for the device."""
-        with self._connect() as device:
-            return device.get_bgp_config(group=group,
-                                         neighbor=neighbor)
+        return self._get(target, 'get_bgp_config', max_age, force_refresh,
+                         group=group, neighbor=neighbor)
 
     @parameter(**PARAMETERS['neighbor_address'])
-    def get_bgp_neighbors_detail(self, neighbor_address=''):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    @parameter(**PARAMETERS['page_size'])
+    def get_bgp_neighbors_detail(self, neighbor_address='', target=None,
+                                 max_age=None, force_refresh=False,
+                                 page_size=None):
         """Gets BGP neighbors in detail."""
-        with self._connect() as device:
-            return device.get_bgp_neighbors_detail(
-                neighbor_address=neighbor_address
-            )
+        return self._get(target, 'get_bgp_neighbors_detail', max_age,
+                         force_refresh, page_size=page_size,
+                         neighbor_address=neighbor_address)
 
-    @command
-    def get_arp_table(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    @parameter(**PARAMETERS['page_size'])
+    @parameter(**PARAMETERS['format'])
+    @parameter(**PARAMETERS['encoding'])
+    def get_arp_table(self, target=None, max_age=None, force_refresh=False,
+                      page_size=None, format='native', encoding='json'):
         """Get the ARP table of the device."""
-        with self._connect() as device:
-            return device.get_arp_table()
+        return self._get(target, 'get_arp_table', max_age, force_refresh,
+                         page_size=page_size, format=format,
+                         encoding=encoding)
 
-    @command
-    def get_ntp_peers(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_ntp_peers(self, target=None, max_age=None, force_refresh=False):
         """Returns the NTP peers configuration as dictionary."""
-        with self._connect() as device:
-            return device.get_ntp_peers()
+        return self._get(target, 'get_ntp_peers', max_age, force_refresh)
 
-    @command
-    def get_ntp_servers(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_ntp_servers(self, target=None, max_age=None, force_refresh=False):
         """Returns the NTP servers configuration as dictionary."""
-        with self._connect() as device:
-            return device.get_ntp_servers()
+        return self._get(target, 'get_ntp_servers', max_age, force_refresh)
 
-    @command
-    def get_ntp_stats(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_ntp_stats(self, target=None, max_age=None, force_refresh=False):
         """Returns a list of NTP synchronization statistics."""
-        with self._connect() as device:
-            return device.get_ntp_stats()
+        return self._get(target, 'get_ntp_stats', max_age, force_refresh)
 
-    @command
-    def get_interfaces_ip(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_interfaces_ip(self, target=None, max_age=None,
+                          force_refresh=False):
         """Returns all configured IP addresses on all interfaces as a dictionary of dictionaries."""
-        with self._connect() as device:
-            return device.get_interfaces_ip()
+        return self._get(target, 'get_interfaces_ip', max_age, force_refresh)
 
-    @command
-    def get_mac_address_table(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    @parameter(**PARAMETERS['page_size'])
+    @parameter(**PARAMETERS['format'])
+    @parameter(**PARAMETERS['encoding'])
+    def get_mac_address_table(self, target=None, max_age=None,
+                              force_refresh=False, page_size=None,
+                              format='native', encoding='json'):
         """Get MAC Addresses Table of the device."""
-        with self._connect() as device:
-            return device.get_mac_address_table()
+        return self._get(target, 'get_mac_address_table', max_age,
+                         force_refresh, page_size=page_size, format=format,
+                         encoding=encoding)
 
     @parameter(**PARAMETERS['destination'])
     @parameter(**PARAMETERS['protocol'])
-    def get_route_to(self, destination='', protocol=''):
+    @parameter(**PARAMETERS['longer'])
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    @parameter(**PARAMETERS['page_size'])
+    @parameter(**PARAMETERS['format'])
+    @parameter(**PARAMETERS['encoding'])
+    def get_route_to(self, destination='', protocol='', target=None,
+                     max_age=None, force_refresh=False, page_size=None,
+                     format='native', encoding='json', longer=False):
         """Get available routes to the destination."""
-        with self._connect() as device:
-            return device.get_route_to(
-                destination=destination,
-                protocol=protocol
-            )
+        return self._get(target, 'get_route_to', max_age, force_refresh,
+                         page_size=page_size, format=format,
+                         encoding=encoding, destination=destination,
+                         protocol=protocol, longer=longer)
 
-    @command
-    def get_snmp_information(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_snmp_information(self, target=None, max_age=None,
+                             force_refresh=False):
         """Returns a dict of dicts containing SNMP configuration."""
-        with self._connect() as device:
-            return device.get_snmp_information()
+        return self._get(target, 'get_snmp_information', max_age,
+                         force_refresh)
 
-    @command
-    def get_probes_config(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_probes_config(self, target=None, max_age=None,
+                          force_refresh=False):
         """Returns a dictionary with the probes configured on the device."""
-        with self._connect() as device:
-            return device.get_probes_config()
+        return self._get(target, 'get_probes_config', max_age, force_refresh)
 
-    @command
-    def get_probes_results(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_probes_results(self, target=None, max_age=None,
+                           force_refresh=False):
         """Returns a dictionary with the results of the probes."""
-        with self._connect() as device:
-            return device.get_probes_results()
+        return self._get(target, 'get_probes_results', max_age, force_refresh)
 
     @parameter(**PARAMETERS['ping_destination'])
-    @parameter(**PARAMETERS['ping_destination'])
-    @parameter(**PARAMETERS['ping_destination'])
-    @parameter(**PARAMETERS['ping_destination'])
-    @parameter(**PARAMETERS['ping_destination'])
-    @parameter(**PARAMETERS['ping_destination'])
-    @parameter(**PARAMETERS['ping_destination'])
+    @parameter(**PARAMETERS['ping_source'])
+    @parameter(**PARAMETERS['ping_ttl'])
+    @parameter(**PARAMETERS['ping_timeout'])
+    @parameter(**PARAMETERS['ping_size'])
+    @parameter(**PARAMETERS['ping_count'])
+    @parameter(**PARAMETERS['ping_vrf'])
+    @parameter(**PARAMETERS['target'])
     def ping(self, destination, source=c.PING_SOURCE, ttl=c.PING_TTL,
              timeout=c.PING_TIMEOUT, size=c.PING_SIZE,
-             count=c.PING_COUNT, vrf=c.PING_VRF):
+             count=c.PING_COUNT, vrf=c.PING_VRF, target=None):
         """Executes ping on the device and returns a dictionary with the result."""
-        with self._connect() as device:
-            device.ping(destination=destination,
-                        source=source,
-                        ttl=ttl,
-                        timeout=timeout,
-                        size=size,
-                        count=count,
-                        vrf=vrf)
+        return self._diagnose(target, 'ping',
+                              destination=destination,
+                              source=source,
+                              ttl=ttl,
+                              timeout=timeout,
+                              size=size,
+                              count=count,
+                              vrf=vrf)
 
     @parameter(**PARAMETERS['traceroute_destination'])
     @parameter(**PARAMETERS['traceroute_source'])
     @parameter(**PARAMETERS['traceroute_ttl'])
     @parameter(**PARAMETERS['traceroute_timeout'])
     @parameter(**PARAMETERS['traceroute_vrf'])
+    @parameter(**PARAMETERS['target'])
     def traceroute(self,
                    destination,
                    source=c.TRACEROUTE_SOURCE,
                    ttl=c.TRACEROUTE_TTL,
                    timeout=c.TRACEROUTE_TIMEOUT,
-                   vrf=c.TRACEROUTE_VRF):
+                   vrf=c.TRACEROUTE_VRF,
+                   target=None):
         """Executes traceroute on the device and returns a dictionary with the result."""
-        with self._connect() as device:
-            return device.traceroute(
-                destination,
-                source=source,
-                ttl=ttl,
-                timeout=timeout,
-                vrf=vrf)
+        return self._diagnose(target, 'traceroute',
+                              destination=destination,
+                              source=source,
+                              ttl=ttl,
+                              timeout=timeout,
+                              vrf=vrf)
 
-    @command
-    def get_users(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_users(self, target=None, max_age=None, force_refresh=False):
         """Returns a dictionary with the configured users."""
-        with self._connect() as device:
-            return device.get_users()
+        return self._get(target, 'get_users', max_age, force_refresh)
 
-    @command
-    def get_optics(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_optics(self, target=None, max_age=None, force_refresh=False):
         """Fetches the power usage on the various transceivers"""
-        with self._connect() as device:
-            return device.get_optics()
+        return self._get(target, 'get_optics', max_age, force_refresh)
 
     @parameter(**PARAMETERS['retrieve'])
-    def get_config(self, retrieve='all'):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_config(self, retrieve='all', target=None, max_age=None,
+                   force_refresh=False):
         """Return the configuration of a device."""
-        with self._connect() as device:
-            return device.get_config(retrieve=retrieve)
+        return self._get(target, 'get_config', max_age, force_refresh,
+                         retrieve=retrieve)
+
+    @parameter(**PARAMETERS['cursor'])
+    def get_page(self, cursor):
+        """Returns the next page of a result that was requested with a page_size."""
+        return self._spool.page(cursor)
+
+    @parameter(**PARAMETERS['retrieve'])
+    @parameter(**PARAMETERS['config_hashes'])
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_config_changes(self, retrieve='all', hashes=None, target=None,
+                           max_age=None, force_refresh=False):
+        """Return only what changed in the configuration since a known hash."""
+        hashes = hashes or {}
+
+        def changes(name):
+            config = self._cached(name, 'get_config', {'retrieve': retrieve},
+                                  max_age, force_refresh)
+            sections = CONFIG_SECTIONS if retrieve == 'all' else [retrieve]
+            return dict(
+                (section, self._configs.changes(name, section,
+                                                config.get(section) or '',
+                                                hashes.get(section)))
+                for section in sections
+            )
+
+        return self._dispatch(target, changes)
 
     @parameter(**PARAMETERS['network_instance_name'])
-    def get_network_instances(self, name=''):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_network_instances(self, name='', target=None, max_age=None,
+                              force_refresh=False):
         """Return a dictionary of network instances (VRFs) configured, including default/global"""
-        with self._connect() as device:
-            return device.get_network_instances(name=name)
+        return self._get(target, 'get_network_instances', max_age,
+                         force_refresh, name=name)
 
-    @command
-    def get_firewall_policies(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_firewall_policies(self, target=None, max_age=None,
+                              force_refresh=False):
         """Gets firewall policy for the device."""
-        with self._connect() as device:
-            return device.get_firewall_policies()
+        return self._get(target, 'get_firewall_policies', max_age,
+                         force_refresh)
 
-    @command
-    def get_ipv6_neighbors_table(self):
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_ipv6_neighbors_table(self, target=None, max_age=None,
+                                 force_refresh=False):
         """Get IPv6 neighbors table information."""
-        with self._connect() as device:
-            return device.get_ipv6_neighbors_table()
+        return self._get(target, 'get_ipv6_neighbors_table', max_age,
+                         force_refresh)
+
+    @parameter(**PARAMETERS['getter'])
+    @parameter(**PARAMETERS['targets'])
+    @parameter(**PARAMETERS['getter_args'])
+    @parameter(**PARAMETERS['concurrency'])
+    @parameter(**PARAMETERS['device_timeout'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def fan_out(self, getter, targets, args=None, concurrency=None,
+                timeout=None, max_age=None, force_refresh=False):
+        """Runs a getter on many devices at once, returning results by device."""
+        if getter not in GETTERS:
+            raise ValueError("%s is not a getter" % getter)
+        args = args or {}
+        return self._fan_out(
+            self._inventory.resolve_all(targets),
+            lambda name: self._cached(name, getter, args, max_age,
+                                      force_refresh),
+            concurrency=concurrency,
+            timeout=timeout
+        )
+
+    @parameter(**PARAMETERS['getters'])
+    @parameter(**PARAMETERS['getters_args'])
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def get_many(self, getters, args=None, target=None, max_age=None,
+                 force_refresh=False):
+        """Runs several getters in one go, with the time each one took."""
+        for getter in getters:
+            if getter not in GETTERS:
+                raise ValueError("%s is not a getter" % getter)
+        return self._dispatch(
+            target, lambda name: self._collect(name, getters, args or {},
+                                               max_age, force_refresh))
+
+    @parameter(**PARAMETERS['seeds'])
+    @parameter(**PARAMETERS['max_depth'])
+    @parameter(**PARAMETERS['max_devices'])
+    @parameter(**PARAMETERS['lldp_detail'])
+    @parameter(**PARAMETERS['concurrency'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def build_topology(self, seeds, max_depth=None, max_devices=None,
+                       detail=False, concurrency=None, max_age=None,
+                       force_refresh=False):
+        """Crawls LLDP neighbors outward from the seeds, returning the links."""
+        changed = []
+
+        def visit(name):
+            digest = self._topology.digest(name)
+            self._cached(name, 'get_lldp_neighbors', {}, max_age,
+                         force_refresh)
+            if self._topology.digest(name) != digest:
+                changed.append(name)
+            if detail and self._topology.needs_detail(name):
+                # The detail is only fetched again when the table changed
+                self._cached(name, 'get_lldp_neighbors_detail', {},
+                             force_refresh=True)
+            return [neighbor['device']
+                    for neighbor in self._topology.neighbors(name)
+                    if neighbor['device'] in self._inventory]
+
+        visited, errors = crawl(self._inventory.resolve_all(seeds), visit,
+                                max_workers=concurrency or self._workers,
+                                max_depth=max_depth,
+                                max_devices=max_devices)
+        topology = self._topology.graph()
+        topology.update({
+            'crawled': visited,
+            'changed': sorted(changed),
+            'errors': errors,
+        })
+        return topology
+
+    @parameter(**PARAMETERS['topology_device'])
+    def get_topology_neighbors(self, device):
+        """Returns the known LLDP neighbors of a device without contacting it."""
+        return self._topology.neighbors(self._topology.resolve(device))
+
+    @parameter(**PARAMETERS['targets'])
+    @parameter(**PARAMETERS['concurrency'])
+    @parameter(**PARAMETERS['device_timeout'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def refresh_routes(self, targets, concurrency=None, timeout=None,
+                       max_age=None, force_refresh=False):
+        """Reads the routing tables of many devices into the route index."""
+        def refresh(name):
+            for destination in FULL_TABLES:
+                self._cached(name, 'get_route_to',
+                             {'destination': destination, 'protocol': '',
+                              'longer': True},
+                             max_age, force_refresh)
+            return self._routes.summary(name)
+
+        return self._fan_out(self._inventory.resolve_all(targets), refresh,
+                             concurrency=concurrency, timeout=timeout)
+
+    @parameter(**PARAMETERS['address'])
+    @parameter(**PARAMETERS['route_targets'])
+    @parameter(**PARAMETERS['confirm'])
+    @parameter(**PARAMETERS['concurrency'])
+    def lookup_route(self, address, targets=None, confirm=None,
+                     concurrency=None):
+        """Finds the route every indexed device uses for an address."""
+        names = self._inventory.resolve_all(targets) if targets else None
+        start = time.time()
+        matches = self._routes.lookup(address, names=names)
+        result = {
+            'address': address,
+            'matches': matches,
+            'lookup_time': time.time() - start,
+        }
+        if confirm:
+            result['confirmed'] = self._fan_out(
+                self._inventory.resolve_all(confirm),
+                lambda name: self._cached(name, 'get_route_to',
+                                          {'destination': address,
+                                           'protocol': ''},
+                                          force_refresh=True),
+                concurrency=concurrency)
+        return result
+
+    @parameter(**PARAMETERS['targets'])
+    @parameter(**PARAMETERS['snapshot_getters'])
+    @parameter(**PARAMETERS['label'])
+    @parameter(**PARAMETERS['concurrency'])
+    @parameter(**PARAMETERS['device_timeout'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def take_snapshot(self, targets, getters=None, label=None,
+                      concurrency=None, timeout=None, max_age=None,
+                      force_refresh=False):
+        """Saves the results of several getters as a snapshot of each device."""
+        getters = getters or list(SNAPSHOT_GETTERS)
+        for getter in getters:
+            if getter not in GETTERS:
+                raise ValueError("%s is not a getter" % getter)
+
+        def snapshot(name):
+            collected = self._collect(name, getters, {}, max_age,
+                                      force_refresh)
+            if not collected['results']:
+                raise ValueError("No getter succeeded: %s"
+                                 % collected['errors'])
+            return self._snapshots.save(name, collected['results'],
+                                        label=label,
+                                        errors=collected['errors'])
+
+        return self._fan_out(self._inventory.resolve_all(targets),
+                             snapshot, concurrency=concurrency,
+                             timeout=timeout)
+
+    @parameter(**PARAMETERS['target'])
+    def list_snapshots(self, target=None):
+        """Returns the manifests of the stored snapshots, oldest first."""
+        return self._dispatch(target, self._snapshots.list)
+
+    @parameter(**PARAMETERS['snapshot'])
+    @parameter(**PARAMETERS['snapshot_getters'])
+    @parameter(**PARAMETERS['target'])
+    def get_snapshot(self, snapshot=None, getters=None, target=None):
+        """Returns the getter results stored in a snapshot."""
+        return self._dispatch(
+            target, lambda name: self._snapshots.load(name, snapshot,
+                                                      getters=getters))
+
+    @parameter(**PARAMETERS['before'])
+    @parameter(**PARAMETERS['after'])
+    @parameter(**PARAMETERS['snapshot_getters'])
+    @parameter(**PARAMETERS['target'])
+    def diff_snapshots(self, before=None, after=None, getters=None,
+                       target=None):
+        """Compares two stored snapshots without contacting the devices."""
+        return self._dispatch(
+            target, lambda name: self._snapshots.diff(name, before, after,
+                                                      getters=getters))
+
+    @parameter(**PARAMETERS['target'])
+    def get_device_health(self, target=None):
+        """Returns the circuit, connect latency, timeout and rate limit."""
+        return self._dispatch(
+            target, lambda name: self._guard(name).status(
+                self._inventory.init_params(name)['timeout']))
+
+    @parameter(**PARAMETERS['targets'])
+    @parameter(**PARAMETERS['concurrency'])
+    @parameter(**PARAMETERS['device_timeout'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def refresh_facts(self, targets, concurrency=None, timeout=None,
+                      max_age=None, force_refresh=False):
+        """Reads the facts and interface addresses of devices into the index."""
+        def refresh(name):
+            collected = self._collect(name, FACTS_GETTERS, {}, max_age,
+                                      force_refresh)
+            if not collected['results']:
+                raise ValueError("No getter succeeded: %s"
+                                 % collected['errors'])
+            return self._facts.get(name)
+
+        return self._fan_out(self._inventory.resolve_all(targets), refresh,
+                             concurrency=concurrency, timeout=timeout)
+
+    @parameter(**PARAMETERS['query'])
+    def find_devices(self, query):
+        """Returns the indexed facts of the devices matching a query."""
+        return dict((name, self._facts.get(name))
+                    for name in self._select(query))
+
+    @parameter(**PARAMETERS['profile_commands'])
+    @parameter(**PARAMETERS['profile_devices'])
+    @parameter(**PARAMETERS['profile_output'])
+    @parameter(**PARAMETERS['profile_top'])
+    def start_profiling(self, commands=None, devices=None, output=RESULT,
+                        top=DEFAULT_TOP):
+        """Profiles the calls of some commands, or the work on some devices."""
+        if not commands and not devices:
+            raise ValueError("Commands or devices to profile are required")
+        for name in commands or ():
+            method = getattr(self, name, None)
+            if getattr(method, '_command', None) is None:
+                raise ValueError("%s is not a command" % name)
+        self._profiler.configure(
+            commands=commands or (),
+            devices=self._inventory.resolve_all(devices or ()),
+            output=output, top=top)
+        return self._profiler.status()
 
     @command
-    def compliance_report(self, validation_file=None, validation_source=None):
+    def stop_profiling(self):
+        """Stops profiling, returning the latest profiles taken."""
+        self._profiler.disable()
+        return self._profiler.status()
+
+    @command
+    def get_profiles(self):
+        """Returns what is being profiled and the latest profiles taken."""
+        return self._profiler.status()
+
+    @parameter(**PARAMETERS['metrics_format'])
+    def get_plugin_metrics(self, format=JSON):
+        """Returns the plugin's timings, result sizes and session counters."""
+        if format == PROMETHEUS:
+            return self._metrics.prometheus()
+        return self._metrics.snapshot()
+
+    @command
+    def get_poller_status(self):
+        """Returns the state of the background poller's jobs."""
+        if self._poller is None:
+            return {'running': False, 'jobs': []}
+        return self._poller.status()
+
+    @parameter(**PARAMETERS['validation_file'])
+    @parameter(**PARAMETERS['validation_source'])
+    @parameter(**PARAMETERS['target'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    def compliance_report(self, validation_file=None, validation_source=None,
+                          target=None, max_age=None, force_refresh=False):
         """Return a compliance report."""
-        with self._connect() as device:
-            return device.compliance_report(
-                validation_file=validation_file,
-                validation_source=validation_source
-            )
+        rules = self._compliance_rules(validation_file, validation_source)
+
+        def report(name):
+            results = self._compliance_results(name, rules, max_age,
+                                               force_refresh)
+            return evaluate(rules, {name: results})[name]
+        return self._dispatch(target, report)
+
+    @parameter(**PARAMETERS['targets'])
+    @parameter(**PARAMETERS['validation_file'])
+    @parameter(**PARAMETERS['validation_source'])
+    @parameter(**PARAMETERS['concurrency'])
+    @parameter(**PARAMETERS['device_timeout'])
+    @parameter(**PARAMETERS['max_age'])
+    @parameter(**PARAMETERS['force_refresh'])
+    @parameter(**PARAMETERS['details'])
+    def fleet_compliance_report(self, targets, validation_file=None,
+                                validation_source=None, concurrency=None,
+                                timeout=None, max_age=None,
+                                force_refresh=False, details=False):
+        """Checks many devices against the same rules, as a pass/fail matrix."""
+        rules = self._compliance_rules(validation_file, validation_source)
+        collected = self._fan_out(
+            self._inventory.resolve_all(targets),
+            lambda name: self._compliance_results(name, rules, max_age,
+                                                  force_refresh),
+            concurrency=concurrency,
+            timeout=timeout
+        )
+        reports = evaluate(rules, collected['results'])
+        report = matrix(rules, reports)
+        report['errors'] = collected['errors']
+        if details:
+            report['reports'] = reports
+        return report
 
 
 def parse_args(cli_args):
     parser = ArgumentParser(description='Starts a plugin using NAPALM '
                                         'for the specified device')
     parser.add_argument('driver',
-                        help='The driver to run',
-                        choices=napalm.SUPPORTED_DRIVERS,
+                        help='The driver to run (not needed with '
+                             '--inventory)',
+                        choices=c.SUPPORTED_DRIVERS,
+                        nargs='?',
                         type=str)
+    parser.add_argument('-i', '--inventory',
+                        dest='inventory',
+                        type=str,
+                        help='Path to a device inventory, serves every '
+                             'device in it instead of a single device')
     parser.add_argument('--hostname',
                         help='The hostname of the device',
                         type=str)
@@ -579,6 +2124,131 @@ def parse_args(cli_args):
                         type=int,
                         help='Timeout for the device',
                         default=60)
+    parser.add_argument('--max-sessions',
+                        dest='max_sessions',
+                        type=int,
+                        help='Maximum number of sessions to keep open '
+                             'to the device',
+                        default=1)
+    parser.add_argument('--idle-timeout',
+                        dest='idle_timeout',
+                        type=int,
+                        help='Seconds an unused session is kept open',
+                        default=300)
+    parser.add_argument('--keepalive-interval',
+                        dest='keepalive_interval',
+                        type=int,
+                        help='Seconds between liveness checks of idle '
+                             'sessions',
+                        default=30)
+    parser.add_argument('--checkout-timeout',
+                        dest='checkout_timeout',
+                        type=int,
+                        help='Seconds a request waits for a session to the '
+                             'device to become free',
+                        default=DEFAULT_CHECKOUT_TIMEOUT)
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        help='Maximum number of devices to talk to at once '
+                             'when a command targets several devices',
+                        default=DEFAULT_WORKERS)
+    parser.add_argument('--cache-size',
+                        dest='cache_size',
+                        type=int,
+                        help='Maximum number of getter results to cache, '
+                             '0 disables caching',
+                        default=DEFAULT_MAX_ENTRIES)
+    parser.add_argument('--cache-ttl',
+                        dest='cache_ttl',
+                        action='append',
+                        metavar='GETTER=SECONDS',
+                        help='Overrides how long results of a getter are '
+                             'cached, may be given several times',
+                        default=[])
+    parser.add_argument('--counter-samples',
+                        dest='counter_samples',
+                        type=int,
+                        help='Number of interface counter samples kept per '
+                             'interface for computing rates',
+                        default=DEFAULT_SAMPLES)
+    parser.add_argument('--poll-config',
+                        dest='poll_config',
+                        type=str,
+                        help='Path to a schedule of getters to run in the '
+                             'background',
+                        default=None)
+    parser.add_argument('--spool-dir',
+                        dest='spool_dir',
+                        type=str,
+                        help='Directory for results that are returned in '
+                             'pages, defaults to a temporary directory',
+                        default=None)
+    parser.add_argument('--snapshot-dir',
+                        dest='snapshot_dir',
+                        type=str,
+                        help='Directory to store device snapshots in, '
+                             'defaults to a temporary directory removed on '
+                             'shutdown',
+                        default=None)
+    parser.add_argument('--max-snapshots',
+                        dest='max_snapshots',
+                        type=int,
+                        help='Number of snapshots kept per device',
+                        default=DEFAULT_MAX_SNAPSHOTS)
+    parser.add_argument('--rate-limit',
+                        dest='rate_limit',
+                        type=float,
+                        help='Maximum number of connections and calls per '
+                             'second to each device, default is no limit',
+                        default=None)
+    parser.add_argument('--rate-burst',
+                        dest='rate_burst',
+                        type=int,
+                        help='Number of calls to a device that may exceed '
+                             'the rate limit at once',
+                        default=DEFAULT_BURST)
+    parser.add_argument('--failure-threshold',
+                        dest='failure_threshold',
+                        type=int,
+                        help='Failed connections in a row after which a '
+                             'device is not connected to for a while',
+                        default=DEFAULT_FAILURE_THRESHOLD)
+    parser.add_argument('--reset-timeout',
+                        dest='reset_timeout',
+                        type=int,
+                        help='Seconds to wait before trying to connect to '
+                             'a failing device again',
+                        default=DEFAULT_RESET_TIMEOUT)
+    parser.add_argument('--min-timeout',
+                        dest='min_timeout',
+                        type=int,
+                        help='Shortest timeout derived from the connect '
+                             'latency of a device',
+                        default=DEFAULT_MIN_TIMEOUT)
+    parser.add_argument('--facts-file',
+                        dest='facts_file',
+                        type=str,
+                        help='File to keep the index of device facts in, '
+                             'the index is only kept in memory without one',
+                        default=None)
+    parser.add_argument('--profile-dir',
+                        dest='profile_dir',
+                        type=str,
+                        help='Directory to write profiles of commands to, '
+                             'defaults to a temporary directory removed on '
+                             'shutdown',
+                        default=None)
+    parser.add_argument('--size-sampling',
+                        dest='size_sampling',
+                        type=int,
+                        help='Measure the result size of one in this many '
+                             'calls of each command, 0 to never measure it',
+                        default=DEFAULT_SIZE_SAMPLING)
+    parser.add_argument('-c', '--max-concurrent',
+                        dest='max_concurrent',
+                        type=int,
+                        help='Maximum number of requests to process at once',
+                        default=5)
     parser.add_argument('-d', '--device-config',
                         dest='device_config',
                         type=str,
@@ -633,42 +2303,101 @@ def parse_args(cli_args):
         with open(args_to_return['bg_config']) as bg_config:
             args_to_return.update(json.load(bg_config))
 
+    if args_to_return['inventory']:
+        device_items = []
+        default_name = 'napalm-plugin'
+        description = 'Command and control for the devices in %s' % (
+            args_to_return['inventory'])
+    elif args_to_return['driver']:
+        device_items = ['hostname', 'username', 'password', 'timeout']
+        default_name = args_to_return['driver'] + '-plugin'
+        description = 'Command and control for %s device' % (
+            args_to_return['driver'])
+    else:
+        print("No driver or inventory provided.")
+        sys.exit(1)
+
     if not args_to_return['plugin_name']:
-        args_to_return['plugin_name'] = args_to_return['driver'] + '-plugin'
+        args_to_return['plugin_name'] = default_name
 
-    required_items = ['hostname', 'username', 'password',
-                      'timeout', 'bg_host', 'bg_port', 'ssl',
-                      'ca_cert', 'client_cert', 'plugin_name',
-                      'ca_verify']
+    required_items = device_items + ['bg_host', 'bg_port', 'ssl',
+                                     'ca_cert', 'client_cert', 'plugin_name',
+                                     'ca_verify']
 
     for item in required_items:
-        if item not in args_to_return:
+        # Device options left out on the command line are there as None
+        if (item not in args_to_return or
+                (item in device_items and args_to_return[item] is None)):
             print("No %s provided." % item)
             sys.exit(1)
 
-    return {
-        'driver': napalm.get_network_driver(args_to_return['driver']),
-        'hostname': args_to_return['hostname'],
-        'username': args_to_return['username'],
-        'password': args_to_return['password'],
-        'timeout': args_to_return['timeout'],
-        'optional_args': args_to_return.get('optional_args', {}),
-    }, {
+    napalm_args = {
+        'max_sessions': args_to_return['max_sessions'],
+        'idle_timeout': args_to_return['idle_timeout'],
+        'keepalive_interval': args_to_return['keepalive_interval'],
+        'checkout_timeout': args_to_return['checkout_timeout'],
+        'workers': args_to_return['workers'],
+        'cache_size': args_to_return['cache_size'],
+        'cache_ttls': dict(args_to_return.get('cache_ttls', {})),
+        'spool_dir': args_to_return['spool_dir'],
+        'counter_samples': args_to_return['counter_samples'],
+        'snapshot_dir': args_to_return['snapshot_dir'],
+        'max_snapshots': args_to_return['max_snapshots'],
+        'rate_limit': args_to_return['rate_limit'],
+        'rate_burst': args_to_return['rate_burst'],
+        'failure_threshold': args_to_return['failure_threshold'],
+        'reset_timeout': args_to_return['reset_timeout'],
+        'min_timeout': args_to_return['min_timeout'],
+        'facts_file': args_to_return['facts_file'],
+        'profile_dir': args_to_return['profile_dir'],
+        'size_sampling': args_to_return['size_sampling'],
+    }
+    for cache_ttl in args_to_return['cache_ttl']:
+        getter, _, seconds = cache_ttl.partition('=')
+        try:
+            seconds = int(seconds)
+        except ValueError:
+            seconds = -1
+        if not getter or seconds < 0:
+            parser.error("argument --cache-ttl: expected GETTER=SECONDS "
+                         "with 0 or more seconds, got %s" % cache_ttl)
+        napalm_args['cache_ttls'][getter] = seconds
+    if args_to_return['inventory']:
+        napalm_args['inventory'] = Inventory.from_file(
+            args_to_return['inventory'])
+    else:
+        napalm_args.update({
+            'driver': args_to_return['driver'],
+            'hostname': args_to_return['hostname'],
+            'username': args_to_return['username'],
+            'password': args_to_return['password'],
+            'timeout': args_to_return['timeout'],
+            'optional_args': args_to_return.get('optional_args', {}),
+        })
+
+    if args_to_return['poll_config']:
+        napalm_args['poll_schedule'], napalm_args['poll_options'] = (
+            load_schedule(args_to_return['poll_config']))
+
+    return napalm_args, {
         'bg_host': args_to_return['bg_host'],
         'bg_port': args_to_return['bg_port'],
         'ssl_enabled': args_to_return['ssl'],
         'ca_cert': args_to_return['ca_cert'],
         'client_cert': args_to_return['client_cert'],
         'name': args_to_return['plugin_name'],
-        'description': 'Command and control for %s '
-                       'device' % args_to_return['driver'],
+        'description': description,
         'ca_verify': args_to_return['ca_verify'],
-        'version': napalm.__version__,
+        'max_concurrent': args_to_return['max_concurrent'],
+        'version': version('napalm'),
     }
 
 
 if __name__ == '__main__':
     napalm_args, bg_args = parse_args(sys.argv[1:])
     client = NapalmPlugin(**napalm_args)
-    plugin = RemotePlugin(client, **bg_args)
-    plugin.run()
+    plugin = CachedRemotePlugin(client, **bg_args)
+    try:
+        plugin.run()
+    finally:
+        client.shutdown()
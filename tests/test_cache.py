@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from napalm_bg_plugin.cache import ResultCache, SingleFlight
+
+
+def test_results_are_fresh_within_their_ttl():
+    cache = ResultCache(ttls={'get_facts': 60})
+    key = cache.key('r1', 'get_facts', {})
+    assert cache.get(key) == (False, None)
+    cache.put(key, {'vendor': 'Arista'})
+    assert cache.get(key) == (True, {'vendor': 'Arista'})
+    assert cache.get(key, max_age=0) == (False, None)
+
+
+def test_getters_without_a_ttl_are_not_cached():
+    cache = ResultCache(ttls={'get_facts': 0})
+    key = cache.key('r1', 'get_facts', {})
+    cache.put(key, {'vendor': 'Arista'})
+    assert cache.get(key, max_age=60) == (False, None)
+
+
+def test_arguments_are_part_of_the_key():
+    cache = ResultCache()
+    cache.put(cache.key('r1', 'get_config', {'retrieve': 'running'}), 'a')
+    assert cache.get(cache.key('r1', 'get_config',
+                               {'retrieve': 'candidate'})) == (False, None)
+
+
+def test_least_recently_used_results_are_dropped():
+    cache = ResultCache(max_entries=2)
+    keys = [cache.key('r%d' % i, 'get_facts', {}) for i in range(3)]
+    cache.put(keys[0], 0)
+    cache.put(keys[1], 1)
+    cache.get(keys[0])
+    cache.put(keys[2], 2)
+    assert cache.get(keys[1]) == (False, None)
+    assert cache.get(keys[0]) == (True, 0)
+    assert len(cache) == 2
+
+
+def test_invalidate_drops_every_result_of_a_device():
+    cache = ResultCache()
+    cache.put(cache.key('r1', 'get_facts', {}), 'r1')
+    cache.put(cache.key('r1', 'get_interfaces', {}), 'r1')
+    cache.put(cache.key('r2', 'get_facts', {}), 'r2')
+    cache.invalidate('r1')
+    assert len(cache) == 1
+    assert cache.get(cache.key('r2', 'get_facts', {})) == (True, 'r2')
+
+
+def test_concurrent_calls_share_the_running_one():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def call():
+        calls.append(None)
+        started.set()
+        release.wait(5)
+        return 'result'
+
+    shared = []
+    leader = threading.Thread(
+        target=lambda: flights.do(('r1', 'get_facts'), call))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(
+        target=lambda: shared.append(flights.do(('r1', 'get_facts'), call)))
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert shared == [('result', True)]
+    assert len(calls) == 1
+
+
+def test_a_failed_call_is_not_remembered():
+    flights = SingleFlight()
+
+    def fail():
+        raise ValueError("unreachable")
+
+    with pytest.raises(ValueError):
+        flights.do(('r1', 'get_facts'), fail)
+    assert flights.do(('r1', 'get_facts'), lambda: 'result') == ('result',
+                                                                 False)
+
+
+def test_joining_a_call_times_out():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    leader = threading.Thread(target=lambda: flights.do(
+        ('r1', 'get_facts'), lambda: (started.set(), release.wait(5))))
+    leader.start()
+    started.wait(5)
+    try:
+        with pytest.raises(TimeoutError):
+            flights.do(('r1', 'get_facts'), lambda: None, timeout=0.1)
+    finally:
+        release.set()
+        leader.join(5)
+
+
+def test_results_read_before_an_invalidation_are_not_cached():
+    cache = ResultCache(ttls={'get_facts': 60})
+    key = cache.key('r1', 'get_facts', {})
+    generation = cache.generation('r1')
+    cache.invalidate('r1')
+    cache.put(key, {'vendor': 'Arista'}, generation=generation)
+    assert cache.get(key) == (False, None)
+
+    cache.put(key, {'vendor': 'Arista'}, generation=cache.generation('r1'))
+    assert cache.get(key) == (True, {'vendor': 'Arista'})
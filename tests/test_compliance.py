@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from napalm_bg_plugin.compliance import (FAIL, PASS, SKIPPED,
+                                         ValidationCache, evaluate, matrix,
+                                         required_calls)
+
+DEFINITIONS = [
+    {'get_facts': {'os_version': '4.20.1F'}},
+    {'get_facts': {'_name': 'vendor', 'vendor': 'Arista'}},
+    {'get_environment': {'cpu': {}}},
+]
+
+
+def results(rules, facts, environment):
+    calls = dict((rule.getter, rule.call) for rule in required_calls(rules))
+    return {calls['get_facts']: facts, calls['get_environment']: environment}
+
+
+def test_rules_calling_the_same_getter_share_one_call():
+    rules = ValidationCache().load(validation_source=DEFINITIONS)
+    assert [rule.key for rule in rules] == ['get_facts', 'vendor',
+                                            'get_environment']
+    assert [rule.getter for rule in required_calls(rules)] == [
+        'get_facts', 'get_environment']
+
+
+def test_definitions_are_only_parsed_once():
+    cache = ValidationCache()
+    assert (cache.load(validation_source=DEFINITIONS) is
+            cache.load(validation_source=list(DEFINITIONS)))
+
+
+def test_the_matrix_counts_each_rule_by_device():
+    rules = ValidationCache().load(validation_source=DEFINITIONS)
+    facts = {'os_version': '4.20.1F', 'vendor': 'Arista'}
+    reports = evaluate(rules, {
+        'r1': results(rules, facts, {'cpu': {}}),
+        'r2': results(rules, dict(facts, os_version='4.19.0F'),
+                      NotImplementedError()),
+        'r3': results(rules, facts, {'cpu': {}}),
+    })
+    assert reports['r1']['complies'] and not reports['r2']['complies']
+    assert reports['r2']['skipped'] == ['get_environment']
+
+    result = matrix(rules, reports)
+    assert result['rules'] == ['get_facts', 'vendor', 'get_environment']
+    assert result['devices']['r2'] == {'get_facts': FAIL, 'vendor': PASS,
+                                       'get_environment': SKIPPED}
+    assert result['summary']['get_facts'] == {PASS: 2, FAIL: 1, SKIPPED: 0}
+    assert result['complies'] == {'r1': True, 'r2': False, 'r3': True}
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from napalm_bg_plugin.configs import (CHANGED, FULL, UNCHANGED, ConfigHistory,
+                                      config_hash)
+
+OLD = 'hostname r1\ninterface Ethernet1\n   no shutdown\n'
+NEW = 'hostname r1\ninterface Ethernet1\n   shutdown\n'
+
+
+def test_a_config_first_seen_is_returned_in_full():
+    changes = ConfigHistory().changes('r1', 'running', OLD)
+    assert changes == {'status': FULL, 'hash': config_hash(OLD),
+                       'config': OLD}
+
+
+def test_a_known_config_is_reported_unchanged():
+    history = ConfigHistory()
+    history.changes('r1', 'running', OLD)
+    assert history.changes('r1', 'running', OLD, config_hash(OLD)) == {
+        'status': UNCHANGED, 'hash': config_hash(OLD)}
+
+
+def test_a_changed_config_is_returned_as_a_diff():
+    history = ConfigHistory()
+    history.changes('r1', 'running', OLD)
+    changes = history.changes('r1', 'running', NEW, config_hash(OLD))
+    assert changes['status'] == CHANGED
+    assert changes['hash'] == config_hash(NEW)
+    assert '-   no shutdown\n' in changes['diff']
+    assert '+   shutdown\n' in changes['diff']
+
+
+def test_a_forgotten_version_gets_the_full_config():
+    history = ConfigHistory(versions=1)
+    history.changes('r1', 'running', OLD)
+    history.changes('r1', 'running', NEW)
+    assert history.changes('r1', 'running', NEW,
+                           config_hash(OLD))['status'] == FULL
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from napalm_bg_plugin.counters import (CounterHistory, CounterRing,
+                                       counter_delta)
+
+
+def test_counters_that_went_up_give_their_difference():
+    assert counter_delta(100, 250) == (150, False)
+
+
+def test_32_bit_counters_wrap_around():
+    assert counter_delta(2 ** 32 - 10, 5) == (15, False)
+
+
+def test_64_bit_counters_wrap_around():
+    assert counter_delta(2 ** 64 - 10, 5) == (15, False)
+
+
+def test_an_implausible_drop_is_a_reset():
+    assert counter_delta(2 ** 31 + 10, 100) == (100, True)
+
+
+def test_the_ring_keeps_only_the_latest_samples_oldest_first():
+    ring = CounterRing(3)
+    for second in range(5):
+        ring.append(float(second), {'rx_octets': second})
+    assert [timestamp for timestamp, _ in ring.samples()] == [2.0, 3.0, 4.0]
+    assert [timestamp for timestamp, _ in ring.samples(3)] == [3.0, 4.0]
+
+
+def test_rates_count_across_a_wrap():
+    history = CounterHistory(size=10)
+    now = 1000.0
+    history.record('r1', {'Ethernet1': {'rx_octets': 2 ** 32 - 100,
+                                        'rx_unicast_packets': 10,
+                                        'tx_errors': -1}}, timestamp=now)
+    history.record('r1', {'Ethernet1': {'rx_octets': 900,
+                                        'rx_unicast_packets': 20,
+                                        'tx_errors': -1}},
+                   timestamp=now + 10)
+    rates = history.rates('r1', window=float('inf'))['Ethernet1']
+    assert rates['samples'] == 2 and rates['resets'] == 0
+    assert rates['deltas']['rx_octets'] == 1000
+    assert rates['bps']['rx'] == 800
+    assert rates['pps']['rx'] == 1
+    # Counters the device does not report have no rate
+    assert 'tx_errors' not in rates['rates']
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from napalm_bg_plugin.deploy import (COMMITTED, DRY_RUN, FAILED, ROLLED_BACK,
+                                     SKIPPED, UNCHANGED, deploy, plan_waves,
+                                     stage)
+
+
+class Device(object):
+    """Candidate config handling of a driver, recording the steps taken."""
+
+    def __init__(self, diff='+hostname r2', alive=True, fail=None):
+        self.diff = diff
+        self.alive = alive
+        self.fail = fail
+        self.steps = []
+
+    def step(self, name):
+        self.steps.append(name)
+        if name == self.fail:
+            raise RuntimeError("%s failed" % name)
+
+    def compare_config(self):
+        self.step('compare')
+        return self.diff
+
+    def commit_config(self):
+        self.step('commit')
+
+    def discard_config(self):
+        self.step('discard')
+
+    def rollback(self):
+        self.step('rollback')
+
+    def is_alive(self):
+        return {'is_alive': self.alive}
+
+
+def load(device):
+    device.step('load')
+
+
+def test_a_change_is_committed():
+    device = Device()
+    report = stage(device, load, commit=True)
+    assert report['status'] == COMMITTED
+    assert report['diff'] == '+hostname r2'
+    assert device.steps == ['load', 'compare', 'commit']
+
+
+def test_without_commit_the_candidate_is_discarded():
+    device = Device()
+    assert stage(device, load)['status'] == DRY_RUN
+    assert device.steps == ['load', 'compare', 'discard']
+
+
+def test_nothing_is_committed_without_a_diff():
+    device = Device(diff='')
+    assert stage(device, load, commit=True)['status'] == UNCHANGED
+    assert 'commit' not in device.steps
+
+
+def test_a_failed_load_discards_the_candidate():
+    device = Device(fail='load')
+    report = stage(device, load, commit=True)
+    assert report['status'] == FAILED
+    assert report['error'] == 'load failed'
+    assert device.steps == ['load', 'discard']
+
+
+def test_a_device_that_stops_answering_is_rolled_back():
+    device = Device(alive=False)
+    assert stage(device, load, commit=True)['status'] == ROLLED_BACK
+    assert device.steps == ['load', 'compare', 'commit', 'rollback']
+
+
+def test_the_canary_goes_first_and_the_rest_in_waves():
+    names = ['r%d' % i for i in range(6)]
+    assert plan_waves(names, canary=1, wave_size=2) == [
+        ['r0'], ['r1', 'r2'], ['r3', 'r4'], ['r5']]
+    assert plan_waves(names, canary=0, wave_size=4) == [
+        ['r0', 'r1', 'r2', 'r3'], ['r4', 'r5']]
+
+
+def test_a_failed_canary_stops_the_deployment():
+    names = ['r%d' % i for i in range(5)]
+    attempted = []
+
+    def run_device(name):
+        attempted.append(name)
+        return {'status': FAILED if name == 'r0' else COMMITTED}
+
+    result = deploy(names, run_device, canary=1, wave_size=2)
+    assert result['aborted'] and result['failures'] == 1
+    assert attempted == ['r0']
+    assert result['devices']['r0'] == {'status': FAILED, 'wave': 0}
+    assert all(result['devices'][name] == {'status': SKIPPED}
+               for name in names[1:])
+
+
+def test_failures_up_to_the_limit_let_the_waves_go_on():
+    names = ['r%d' % i for i in range(5)]
+
+    def run_device(name):
+        if name == 'r2':
+            raise RuntimeError("unreachable")
+        return {'status': COMMITTED}
+
+    result = deploy(names, run_device, canary=1, wave_size=2,
+                    max_failures=1)
+    assert not result['aborted'] and result['waves'] == 3
+    assert result['devices']['r2']['status'] == FAILED
+    waves = [result['devices'][name]['wave'] for name in names]
+    assert waves == [0, 1, 1, 2, 2]
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from napalm_bg_plugin.facts import FactsIndex, parse_query
+
+
+def facts(vendor, os_version, uptime=3600):
+    return {'hostname': 'r', 'fqdn': 'r.example.net', 'vendor': vendor,
+            'model': 'vEOS', 'os_version': os_version,
+            'serial_number': 'X1', 'uptime': uptime}
+
+
+def addresses(*interfaces):
+    return dict(('Ethernet%d' % i, {'ipv4': {address: {'prefix_length': 24}}})
+                for i, address in enumerate(interfaces))
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = FactsIndex(path=str(tmp_path / 'facts.json'))
+    index.update_facts('r1', facts('Arista', '4.20.1F', uptime=60))
+    index.update_facts('r2', facts('Arista', '4.19.0F'))
+    index.update_facts('r3', facts('Juniper', '18.2R1'))
+    index.update_addresses('r1', addresses('10.1.0.1', '192.0.2.1'))
+    index.update_addresses('r3', addresses('10.2.0.1'))
+    return index
+
+
+@pytest.mark.parametrize('query, selected', [
+    ('vendor=arista', ['r1', 'r2']),
+    ('vendor=Arista,os_version=4.2*', ['r1']),
+    ('vendor=Juniper|Arista', ['r1', 'r2', 'r3']),
+    ('prefix=10.0.0.0/8', ['r1', 'r3']),
+    ('address=192.0.2.1', ['r1']),
+    ('prefix=10.1.0.0/16|10.2.0.0/16,vendor=Juniper', ['r3']),
+    ('min_uptime=600', ['r2', 'r3']),
+    ('max_uptime=600', ['r1']),
+    ('vendor=Cisco', []),
+])
+def test_devices_are_selected_by_query(index, query, selected):
+    assert index.select(parse_query(query)) == selected
+
+
+def test_the_selection_can_be_limited_to_some_devices(index):
+    assert index.select(parse_query('vendor=Arista'), names=['r2']) == ['r2']
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(ValueError):
+        parse_query('colour=red')
+
+
+@pytest.mark.parametrize('query', ['min_uptime=', 'max_uptime=soon',
+                                   'min_uptime=60|120'])
+def test_uptimes_must_be_a_number_of_seconds(index, query):
+    with pytest.raises(ValueError, match=query.partition('=')[0]):
+        index.select(parse_query(query))
+
+
+def test_changed_addresses_replace_the_old_ones(index):
+    index.update_addresses('r1', addresses('10.3.0.1'))
+    assert index.select(parse_query('prefix=10.1.0.0/16')) == []
+    assert index.select(parse_query('prefix=10.3.0.0/16')) == ['r1']
+
+
+def test_only_changes_count_as_updates(index):
+    assert not index.update_facts('r2', facts('Arista', '4.19.0F',
+                                              uptime=3601))
+    assert index.update_facts('r2', facts('Arista', '4.21.0F'))
+    assert index.get('r2')['os_version'] == '4.21.0F'
+    assert 3500 < index.get('r2')['uptime'] < 3700
+
+
+def test_the_index_is_loaded_from_its_file(index, tmp_path):
+    loaded = FactsIndex(path=str(tmp_path / 'facts.json'))
+    assert loaded.select(parse_query('prefix=10.0.0.0/8')) == ['r1', 'r3']
+
+
+def test_devices_left_out_of_the_inventory_are_not_loaded(index, tmp_path):
+    loaded = FactsIndex(path=str(tmp_path / 'facts.json'),
+                        names=['r1', 'r2'])
+    assert 'r3' not in loaded
+    assert loaded.select(parse_query('prefix=10.0.0.0/8')) == ['r1']
+
+
+def test_without_a_file_the_index_is_kept_in_memory():
+    index = FactsIndex()
+    index.update_facts('r1', facts('Arista', '4.20.1F'))
+    assert index.path is None
+    assert 'r1' in index and 'r1' not in FactsIndex()
+
+
+def test_concurrent_updates_of_a_device_are_all_kept():
+    index = FactsIndex()
+    updates = [threading.Thread(target=index.update_facts,
+                                args=('r1', facts('Arista', '4.20.1F')))
+               for _ in range(20)]
+    updates.extend(threading.Thread(target=index.update_addresses,
+                                    args=('r1', addresses('10.1.0.1')))
+                   for _ in range(20))
+    for update in updates:
+        update.start()
+    for update in updates:
+        update.join()
+    query = parse_query('vendor=Arista,prefix=10.1.0.0/16')
+    assert index.select(query) == ['r1']
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import base64
+import gzip
+import json
+from array import array
+
+import pytest
+
+from napalm_bg_plugin.formats import (GZIP, JSON, MSGPACK, encode,
+                                      pack_columns, to_columnar)
+
+COUNTERS = {
+    'Ethernet1': {'rx_octets': 10, 'tx_octets': 20},
+    'Ethernet2': {'rx_octets': 30, 'tx_octets': 40, 'rx_errors': 1},
+}
+
+
+def test_rows_become_columns_with_their_index():
+    table = to_columnar(COUNTERS, ['interface'])
+    assert table['columns'] == ['interface', 'rx_octets', 'tx_octets',
+                                'rx_errors']
+    assert table['rows'] == 2
+    assert table['data'] == [['Ethernet1', 'Ethernet2'], [10, 30], [20, 40],
+                             [None, 1]]
+
+
+def test_integer_columns_are_packed_into_arrays():
+    packed = pack_columns(to_columnar(COUNTERS, ['interface']))
+    assert packed['types'] == [None, 'Q', 'Q', None]
+    assert array('Q', packed['data'][1]).tolist() == [10, 30]
+    assert packed['data'][0] == ['Ethernet1', 'Ethernet2']
+
+
+def test_json_results_are_left_as_they_are():
+    assert encode(COUNTERS, JSON) is COUNTERS
+
+
+def test_gzip_round_trips():
+    encoded = encode(COUNTERS, GZIP)
+    assert encoded['encoding'] == GZIP
+    assert json.loads(gzip.decompress(
+        base64.b64decode(encoded['payload']))) == COUNTERS
+
+
+def test_msgpack_round_trips_columnar_tables():
+    msgpack = pytest.importorskip('msgpack')
+    table = to_columnar(COUNTERS, ['interface'])
+    decoded = msgpack.unpackb(base64.b64decode(
+        encode(table, MSGPACK)['payload']), raw=False)
+    assert decoded['columns'] == table['columns']
+    columns = [array(typecode, values).tolist() if typecode else values
+               for typecode, values in zip(decoded['types'],
+                                           decoded['data'])]
+    assert columns == table['data']
+
+
+def test_unknown_encodings_are_rejected():
+    with pytest.raises(ValueError):
+        encode(COUNTERS, 'xml')
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from napalm_bg_plugin.paging import ResultSpool, iter_rows
+
+ARP_TABLE = [{'interface': 'Ethernet%d' % i, 'ip': '10.0.0.%d' % i}
+             for i in range(5)]
+
+
+def test_rows_keep_the_keys_leading_to_them():
+    routes = {'10.0.0.0/8': [{'protocol': 'static'}],
+              '10.1.0.0/16': [{'protocol': 'bgp'}, {'protocol': 'ospf'}]}
+    assert list(iter_rows(routes)) == [
+        {'path': ['10.0.0.0/8'], 'value': {'protocol': 'static'}},
+        {'path': ['10.1.0.0/16'], 'value': {'protocol': 'bgp'}},
+        {'path': ['10.1.0.0/16'], 'value': {'protocol': 'ospf'}},
+    ]
+
+
+def test_pages_follow_their_cursors_to_the_end(tmp_path):
+    spool = ResultSpool(directory=str(tmp_path))
+    page = spool.spool(ARP_TABLE, page_size=2)
+    rows = []
+    while True:
+        assert page['pages'] == 3 and page['total'] == 5
+        rows.extend(row['value'] for row in page['rows'])
+        if page['next_cursor'] is None:
+            break
+        page = spool.page(page['next_cursor'])
+    assert rows == ARP_TABLE
+    # Pages can be read again
+    assert spool.page(page['cursor']) == page
+
+
+def test_an_empty_result_has_one_empty_page(tmp_path):
+    page = ResultSpool(directory=str(tmp_path)).spool([], page_size=10)
+    assert page['rows'] == [] and page['pages'] == 1
+    assert page['next_cursor'] is None
+
+
+@pytest.mark.parametrize('cursor', ['nonsense', 'unknown:0', None])
+def test_bad_cursors_are_rejected(tmp_path, cursor):
+    with pytest.raises(ValueError):
+        ResultSpool(directory=str(tmp_path)).page(cursor)
+
+
+def test_out_of_range_cursors_are_rejected(tmp_path):
+    spool = ResultSpool(directory=str(tmp_path))
+    page = spool.spool(ARP_TABLE, page_size=2)
+    with pytest.raises(ValueError):
+        spool.page(page['cursor'].rsplit(':', 1)[0] + ':3')
+
+
+def test_spools_expire_once_unread(tmp_path):
+    spool = ResultSpool(directory=str(tmp_path), ttl=0)
+    page = spool.spool(ARP_TABLE, page_size=2)
+    spool.expire()
+    with pytest.raises(ValueError):
+        spool.page(page['next_cursor'])
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from benchmarks.mock_driver import MockDriver
+from napalm_bg_plugin.inventory import Inventory
+from run import NapalmPlugin, parse_args
+
+# Seconds a test waits for anything before failing rather than hanging
+TIMEOUT = 10
+
+INVENTORY = os.path.join(os.path.dirname(__file__), os.pardir, 'conf',
+                         'example_inventory.json')
+
+
+class Gate(object):
+    """Holds calls of one getter of a device until the test opens it."""
+
+    def __init__(self, getter=None):
+        self.getter = getter
+        self.entered = threading.Event()
+        self.opened = threading.Event()
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def pass_through(self, getter):
+        with self._lock:
+            self.calls[getter] += 1
+        if getter == self.getter:
+            self.entered.set()
+            assert self.opened.wait(TIMEOUT)
+
+
+def gated_driver(gate):
+    class GatedDriver(MockDriver):
+        def get_facts(self):
+            gate.pass_through('get_facts')
+            return super().get_facts()
+
+        def get_interfaces(self):
+            gate.pass_through('get_interfaces')
+            return super().get_interfaces()
+    return GatedDriver
+
+
+@pytest.fixture
+def plugin_for():
+    """Builds plugins serving a single mock device held up by a gate."""
+    made = []
+
+    def make(gate, **plugin_args):
+        plugin_args.setdefault('checkout_timeout', TIMEOUT)
+        plugin = NapalmPlugin(inventory=Inventory({
+            'mock0': {
+                'driver': gated_driver(gate),
+                'hostname': 'mock0.example.net',
+                'username': 'admin',
+                'password': 'admin',
+                'optional_args': {'latency': 0, 'connect_latency': 0},
+            },
+        }), **plugin_args)
+        made.append((gate, plugin))
+        return plugin
+    yield make
+    for gate, plugin in made:
+        gate.opened.set()
+        plugin.shutdown()
+
+
+def start(func, **kwargs):
+    """Runs a command in a thread, returning it and the command's outcome."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = func(**kwargs)
+        except Exception as error:
+            outcome['error'] = error
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def wait_for(condition):
+    deadline = time.time() + TIMEOUT
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_checkout_times_out_when_the_pool_is_exhausted(plugin_for):
+    gate = Gate('get_interfaces')
+    plugin = plugin_for(gate, checkout_timeout=1)
+    holder, held = start(plugin.get_interfaces, target='mock0')
+    assert gate.entered.wait(TIMEOUT)
+
+    with pytest.raises(TimeoutError):
+        plugin.get_facts(target='mock0')
+    assert plugin._pool('mock0').waiting == 0
+
+    gate.opened.set()
+    holder.join(TIMEOUT)
+    assert 'result' in held
+    assert plugin.get_facts(target='mock0')['vendor'] == 'Arista'
+
+
+def test_calls_shared_while_holding_a_session_do_not_deadlock(plugin_for):
+    gate = Gate('get_interfaces')
+    plugin = plugin_for(gate)
+    # Holds the only session while reading get_interfaces, then reads
+    # get_facts, which the other request below is already reading
+    many, collected = start(plugin.get_many,
+                            getters=['get_interfaces', 'get_facts'],
+                            target='mock0', force_refresh=True)
+    assert gate.entered.wait(TIMEOUT)
+    single, facts = start(plugin.get_facts, target='mock0',
+                          force_refresh=True)
+    wait_for(lambda: plugin._pool('mock0').waiting == 1)
+
+    gate.opened.set()
+    many.join(TIMEOUT)
+    single.join(TIMEOUT)
+    assert not many.is_alive() and not single.is_alive()
+    assert sorted(collected['result']['results']) == ['get_facts',
+                                                      'get_interfaces']
+    assert facts['result']['vendor'] == 'Arista'
+
+
+def test_results_read_before_an_invalidation_are_not_cached(plugin_for):
+    gate = Gate('get_facts')
+    plugin = plugin_for(gate, max_sessions=2)
+    session = plugin.open(target='mock0')['session']
+    reader, read = start(plugin.get_facts, target='mock0')
+    assert gate.entered.wait(TIMEOUT)
+
+    # Committing clears the device's cached results while facts are read
+    plugin.commit_config(target='mock0', session=session)
+    gate.opened.set()
+    reader.join(TIMEOUT)
+    assert read['result']['vendor'] == 'Arista'
+
+    plugin.get_facts(target='mock0')
+    assert gate.calls['get_facts'] == 2
+    plugin.get_facts(target='mock0')
+    assert gate.calls['get_facts'] == 2
+    plugin.close(session=session)
+
+
+def test_an_open_session_does_not_hold_up_getters(plugin_for):
+    gate = Gate()
+    plugin = plugin_for(gate, max_sessions=1, checkout_timeout=1)
+    session = plugin.open(target='mock0')['session']
+
+    assert plugin.get_facts(target='mock0')['vendor'] == 'Arista'
+    assert plugin.is_alive(target='mock0', session=session) == {
+        'is_alive': True}
+
+    plugin.close(session=session)
+    with pytest.raises(ValueError):
+        plugin.is_alive(target='mock0', session=session)
+
+
+def test_drivers_keep_the_configured_timeout(plugin_for):
+    gate = Gate()
+    plugin = plugin_for(gate, min_timeout=1)
+    for _ in range(3):
+        plugin.get_facts(target='mock0', force_refresh=True)
+        plugin.close(target='mock0')
+
+    assert plugin.get_device_health(target='mock0')['connect_timeout'] == 1
+    with plugin._pool('mock0').session() as device:
+        assert device.timeout == 60
+
+
+def test_changing_the_candidate_drops_cached_results(plugin_for):
+    plugin = plugin_for(Gate())
+
+    def candidate():
+        return plugin.get_config(retrieve='candidate',
+                                 target='mock0')['candidate']
+
+    assert candidate() == ''
+    plugin.load_replace_candidate(config='hostname mock0', target='mock0')
+    assert candidate() == 'hostname mock0'
+    plugin.discard_config(target='mock0')
+    assert candidate() == ''
+
+
+def test_closing_a_device_closes_the_sessions_open_on_it(plugin_for):
+    plugin = plugin_for(Gate())
+    session = plugin.open(target='mock0')['session']
+    device = plugin._lease(session, 'mock0').sessions['mock0'].device
+
+    plugin.close(target='mock0')
+    assert not device.opened
+    with pytest.raises(ValueError):
+        plugin.is_alive(target='mock0', session=session)
+
+
+def test_only_unambiguous_names_alias_devices():
+    devices = {
+        'core1': {'hostname': 'r1.dc1.example.net'},
+        'core2': {'hostname': 'r1.dc2.example.net'},
+        'edge1': {'hostname': '10.0.0.1'},
+        'edge2': {'hostname': '10.0.0.2'},
+    }
+    for device in devices.values():
+        device.update(driver=MockDriver, username='admin', password='admin')
+    plugin = NapalmPlugin(inventory=Inventory(devices))
+    try:
+        aliases = plugin._topology.aliases
+    finally:
+        plugin.shutdown()
+
+    assert 'r1' not in aliases and '10' not in aliases
+    assert aliases['r1.dc2.example.net'] == 'core2'
+    assert aliases['10.0.0.2'] == 'edge2'
+    assert aliases['edge1'] == 'edge1'
+
+
+@pytest.mark.parametrize('cache_ttl', ['get_facts=-5', 'get_facts=soon',
+                                       'get_facts', '=60'])
+def test_a_bad_cache_ttl_is_an_argument_error(cache_ttl, capsys):
+    with pytest.raises(SystemExit):
+        parse_args(['--inventory', INVENTORY, '--cache-ttl', cache_ttl])
+    assert '--cache-ttl' in capsys.readouterr().err
+
+
+def test_cache_ttls_are_read_from_the_arguments():
+    napalm_args, _ = parse_args(['--inventory', INVENTORY,
+                                 '--cache-ttl', 'get_facts=0'])
+    assert napalm_args['cache_ttls']['get_facts'] == 0
+
+
+def test_importing_the_plugin_leaves_napalm_and_jinja_unloaded():
+    loaded = subprocess.check_output(
+        [sys.executable, '-c', 'import sys, run; print(sorted(m for m in '
+         '("napalm", "jinja2") if m in sys.modules))'],
+        cwd=os.path.join(os.path.dirname(__file__), os.pardir))
+    assert loaded.decode().strip() == '[]'
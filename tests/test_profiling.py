@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import os
+
+from napalm_bg_plugin import profiling
+from napalm_bg_plugin.profiling import FILE, Profile, Profiler
+
+
+class ActiveElsewhere(cProfile.Profile):
+    def enable(self, *args, **kwargs):
+        raise ValueError("Another profiling tool is already active")
+
+
+def test_threads_that_cannot_profile_are_skipped(monkeypatch):
+    profile = Profile('get_facts')
+    with profile.profiling():
+        sum(range(10))
+    monkeypatch.setattr(profiling.cProfile, 'Profile', ActiveElsewhere)
+    with profile.profiling():
+        sum(range(10))
+
+    report = profile.report()
+    assert report['skipped_threads'] == 1
+    assert report['top_frames']
+
+
+def test_a_temporary_directory_is_removed_on_close():
+    profiler = Profiler()
+    profiler.configure(commands=['get_facts'], output=FILE)
+    profile = profiler.start('get_facts')
+    with profile.profiling():
+        sum(range(10))
+    profiler.finish(profile, {})
+
+    path = profiler.recent[-1]['file']
+    assert os.path.isfile(path)
+    profiler.close()
+    assert not os.path.exists(os.path.dirname(path))
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from napalm_bg_plugin.resilience import (CLOSED, HALF_OPEN, OPEN,
+                                         CircuitBreaker, CircuitOpenError,
+                                         DeviceGuard, TimeoutEstimator,
+                                         TokenBucket, open_within)
+
+
+def test_the_bucket_allows_a_burst_then_paces_callers():
+    bucket = TokenBucket(rate=100, burst=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    waited = bucket.acquire()
+    assert 0 < waited <= 0.01
+
+
+def test_the_circuit_opens_after_failures_in_a_row():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN and not breaker.allow()
+    assert 0 < breaker.retry_in() <= 60
+
+
+def test_a_half_open_circuit_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record(False)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN and not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED and breaker.failures == 0
+
+
+def test_the_timeout_follows_the_observed_latencies():
+    estimator = TimeoutEstimator(minimum=1)
+    assert estimator.timeout(60) == 60
+    for _ in range(20):
+        estimator.observe(2.0)
+    assert estimator.timeout(60) == 3
+    for _ in range(20):
+        estimator.observe(20.0)
+    assert 20 < estimator.timeout(60) < 60
+    assert estimator.timeout(10) == 10
+    assert TimeoutEstimator(minimum=10).timeout(60) == 60
+
+
+def test_a_failing_device_is_no_longer_connected_to():
+    guard = DeviceGuard('r1', failure_threshold=1, reset_timeout=60)
+    with pytest.raises(IOError):
+        with guard.connecting(60):
+            raise IOError("unreachable")
+    with pytest.raises(CircuitOpenError):
+        with guard.connecting(60):
+            pass
+
+
+class SlowDevice(object):
+    def __init__(self):
+        self.release = threading.Event()
+        self.closed = threading.Event()
+
+    def open(self):
+        assert self.release.wait(5)
+
+    def close(self):
+        self.closed.set()
+
+
+def test_opening_is_given_up_on_after_the_deadline():
+    device = SlowDevice()
+    with pytest.raises(TimeoutError):
+        open_within(device, 0.1)
+    # The attempt connects after all and the device is closed again
+    device.release.set()
+    assert device.closed.wait(5)
+
+
+def test_opening_within_the_deadline_keeps_the_device_open():
+    device = SlowDevice()
+    device.release.set()
+    open_within(device, 5)
+    assert not device.closed.is_set()
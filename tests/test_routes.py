@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import ipaddress
+
+import pytest
+
+from napalm_bg_plugin.routes import PrefixTrie, RouteIndex
+
+ROUTES = {
+    '0.0.0.0/0': [{'protocol': 'static'}],
+    '10.0.0.0/8': [{'protocol': 'ospf'}],
+    '10.1.0.0/16': [{'protocol': 'bgp'}],
+    '2001:db8::/32': [{'protocol': 'bgp'}],
+}
+
+
+def trie(routes):
+    prefixes = PrefixTrie()
+    for prefix, entries in routes.items():
+        prefixes.insert(ipaddress.ip_network(prefix), 'r1', entries)
+    return prefixes
+
+
+def match(prefixes, address):
+    return prefixes.lookup(ipaddress.ip_address(address))['r1'][0]
+
+
+def test_the_longest_prefix_matches():
+    prefixes = trie(ROUTES)
+    assert match(prefixes, '10.1.2.3') == '10.1.0.0/16'
+    assert match(prefixes, '10.2.0.1') == '10.0.0.0/8'
+    assert match(prefixes, '192.0.2.1') == '0.0.0.0/0'
+    assert match(prefixes, '2001:db8::1') == '2001:db8::/32'
+    assert prefixes.lookup(ipaddress.ip_address('2001:db9::1')) == {}
+
+
+def test_a_withdrawn_prefix_falls_back_to_a_shorter_one():
+    prefixes = trie(ROUTES)
+    prefixes.remove(ipaddress.ip_network('10.1.0.0/16'), 'r1')
+    assert match(prefixes, '10.1.2.3') == '10.0.0.0/8'
+    prefixes.remove(ipaddress.ip_network('10.0.0.0/8'), 'r1')
+    assert match(prefixes, '10.1.2.3') == '0.0.0.0/0'
+
+
+def test_each_device_matches_its_own_routes():
+    index = RouteIndex()
+    index.update('r1', ROUTES)
+    index.update('r2', {'10.1.2.0/24': [{'protocol': 'connected'}]})
+    matches = index.lookup('10.1.2.3')
+    assert matches['r1']['prefix'] == '10.1.0.0/16'
+    assert matches['r2']['prefix'] == '10.1.2.0/24'
+    assert list(index.lookup('10.1.2.3', names=['r2'])) == ['r2']
+    assert list(index.lookup('10.9.0.1')) == ['r1']
+
+
+def test_a_scoped_table_withdraws_the_prefixes_it_lacks_within_it():
+    index = RouteIndex()
+    index.update('r1', ROUTES)
+    routes = dict(ROUTES)
+    del routes['10.1.0.0/16']
+    del routes['2001:db8::/32']
+    summary = index.update('r1', routes, scope='0.0.0.0/0')
+    assert summary['scopes']['0.0.0.0/0']['removed'] == 1
+    assert index.lookup('10.1.2.3')['r1']['prefix'] == '10.0.0.0/8'
+    # The IPv6 routes are outside of the scope
+    assert index.lookup('2001:db8::1')['r1']['prefix'] == '2001:db8::/32'
+
+
+def test_a_result_without_a_scope_only_adds_routes():
+    index = RouteIndex()
+    index.update('r1', ROUTES)
+    index.update('r1', {'10.1.2.0/24': [{'protocol': 'static'}]})
+    assert index.summary('r1')['prefixes'] == 5
+    assert index.lookup('10.1.9.9')['r1']['prefix'] == '10.1.0.0/16'
+
+
+def test_results_that_are_not_routes_are_rejected():
+    index = RouteIndex()
+    with pytest.raises(ValueError):
+        index.update('r1', 'Please specify a valid destination!')
+    assert index.summary('r1')['prefixes'] == 0
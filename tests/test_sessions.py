@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from napalm_bg_plugin.sessions import SessionPool
+
+
+class Device(object):
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    def is_alive(self):
+        return {'is_alive': self.alive}
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**pool_args):
+    return SessionPool(Device, lambda device: device.close(), **pool_args)
+
+
+def test_checkout_reuses_a_returned_session():
+    pool = make_pool()
+    session = pool.checkout()
+    pool.checkin(session)
+    assert pool.checkout() is session
+    assert pool.size == 1
+
+
+def test_a_dead_session_is_replaced_on_checkout():
+    pool = make_pool(keepalive_interval=0)
+    session = pool.checkout()
+    pool.checkin(session)
+    session.device.alive = False
+    replacement = pool.checkout()
+    assert replacement is not session
+    assert session.device.closed
+    assert pool.size == 1
+
+
+def test_maintain_closes_sessions_idle_for_too_long():
+    pool = make_pool(idle_timeout=5)
+    session = pool.checkout()
+    pool.checkin(session)
+    session.last_used -= 10
+    pool.maintain()
+    assert session.device.closed
+    assert pool.size == 0
+
+
+def test_a_returned_session_goes_to_the_longest_waiting_caller():
+    pool = make_pool(max_sessions=1)
+    session = pool.checkout()
+    handed = []
+    waiters = []
+    for order in range(2):
+        waiter = threading.Thread(
+            target=lambda order=order: handed.append((order,
+                                                      pool.checkout())))
+        waiter.start()
+        while pool.waiting <= order:
+            waiter.join(0.01)
+        waiters.append(waiter)
+    pool.checkin(session)
+    waiters[0].join(5)
+    assert handed == [(0, session)]
+    pool.checkin(session)
+    waiters[1].join(5)
+    assert handed == [(0, session), (1, session)]
+    assert pool.size == 1
+
+
+def test_checkout_times_out_when_the_pool_is_exhausted():
+    pool = make_pool(max_sessions=1, checkout_timeout=0.1)
+    session = pool.checkout()
+    with pytest.raises(TimeoutError):
+        pool.checkout()
+    # The caller that gave up is no longer waiting for a session
+    assert pool.waiting == 0
+    pool.checkin(session)
+    assert pool.checkout() is session
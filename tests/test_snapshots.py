@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+import pytest
+
+from napalm_bg_plugin.snapshots import (ADDED, CHANGED, REMOVED,
+                                        SnapshotStore, diff)
+
+
+def objects(directory):
+    root = os.path.join(directory, 'objects')
+    return sorted(digest for prefix in os.listdir(root)
+                  for digest in os.listdir(os.path.join(root, prefix)))
+
+
+def age(directory, seconds):
+    root = os.path.join(directory, 'objects')
+    then = time.time() - seconds
+    for prefix in os.listdir(root):
+        for digest in os.listdir(os.path.join(root, prefix)):
+            os.utime(os.path.join(root, prefix, digest), (then, then))
+
+
+def test_diff_reports_each_changed_value_by_path():
+    old = {'hostname': 'r1', 'uptime': 10, 'model': 'vEOS'}
+    new = {'hostname': 'r2', 'uptime': 10, 'serial_number': 'X1'}
+    assert diff(old, new) == [
+        {'path': ['hostname'], 'change': CHANGED, 'old': 'r1', 'new': 'r2'},
+        {'path': ['model'], 'change': REMOVED, 'old': 'vEOS', 'new': None},
+        {'path': ['serial_number'], 'change': ADDED, 'old': None,
+         'new': 'X1'},
+    ]
+
+
+def test_diff_compares_lists_as_sets():
+    old = {'neighbors': [{'port': 'Et1'}, {'port': 'Et2'}]}
+    assert diff(old, {'neighbors': [{'port': 'Et2'}, {'port': 'Et1'}]}) == []
+    assert diff(old, {'neighbors': [{'port': 'Et2'}, {'port': 'Et3'}]}) == [
+        {'path': ['neighbors'], 'change': REMOVED, 'old': {'port': 'Et1'},
+         'new': None},
+        {'path': ['neighbors'], 'change': ADDED, 'old': None,
+         'new': {'port': 'Et3'}},
+    ]
+
+
+def test_snapshots_are_diffed_by_label(tmp_path):
+    store = SnapshotStore(directory=str(tmp_path))
+    store.save('r1', {'get_facts': {'hostname': 'r1'}, 'get_users': {}},
+               label='pre')
+    store.save('r1', {'get_facts': {'hostname': 'r2'}, 'get_users': {}},
+               label='post')
+    result = store.diff('r1', 'pre', 'post')
+    assert list(result['changes']) == ['get_facts']
+    assert result['changes']['get_facts'][0]['new'] == 'r2'
+    assert store.load('r1', 'pre') == {'get_facts': {'hostname': 'r1'},
+                                       'get_users': {}}
+    # Unchanged results are stored once
+    assert len(objects(str(tmp_path))) == 3
+
+
+def test_unknown_snapshots_are_rejected(tmp_path):
+    store = SnapshotStore(directory=str(tmp_path))
+    with pytest.raises(ValueError):
+        store.manifest('r1')
+    store.save('r1', {'get_facts': {}})
+    with pytest.raises(ValueError):
+        store.diff('r1')
+
+
+def test_garbage_collection_keeps_what_snapshots_refer_to(tmp_path):
+    directory = str(tmp_path)
+    store = SnapshotStore(directory=directory, max_snapshots=2)
+    for version in range(4):
+        store.save('r1', {'get_facts': {'version': version}})
+    assert len(store.list('r1')) == 2
+    assert len(objects(directory)) == 4
+
+    # Results used within the last minute are kept
+    assert store.collect_garbage() == 0
+    age(directory, 120)
+    assert store.collect_garbage() == 2
+    assert [store.load('r1', manifest['id'])['get_facts']['version']
+            for manifest in store.list('r1')] == [2, 3]
+
+
+def test_garbage_is_only_collected_after_pruning(tmp_path):
+    directory = str(tmp_path)
+    store = SnapshotStore(directory=directory, max_snapshots=1,
+                          gc_interval=0)
+    store.save('r1', {'get_facts': {'version': 0}})
+    age(directory, 120)
+    assert store.maintain() == 0
+
+    store.save('r1', {'get_facts': {'version': 1}})
+    assert store.maintain() == 1
+    assert store.maintain() == 0
+
+    store.save('r1', {'get_facts': {'version': 2}})
+    # The result pruned just now is too recent to go, so it is looked at
+    # again on the next run
+    assert store.maintain() == 0
+    age(directory, 120)
+    assert store.maintain() == 1
+
+
+def test_garbage_is_collected_at_most_every_interval(tmp_path):
+    directory = str(tmp_path)
+    store = SnapshotStore(directory=directory, max_snapshots=1,
+                          gc_interval=300)
+    for version in range(2):
+        store.save('r1', {'get_facts': {'version': version}})
+    age(directory, 120)
+    assert store.maintain() == 0
+    assert store.collect_garbage() == 1
+
+
+def test_a_temporary_directory_is_removed_on_close(tmp_path):
+    store = SnapshotStore()
+    store.save('r1', {'get_facts': {'version': 0}})
+    directory = store._root()
+    assert os.path.isdir(os.path.join(directory, 'snapshots'))
+    store.close()
+    assert not os.path.exists(directory)
+
+    kept = SnapshotStore(directory=str(tmp_path))
+    kept.save('r1', {'get_facts': {'version': 0}})
+    kept.close()
+    assert os.listdir(str(tmp_path))
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from napalm_bg_plugin.topology import Topology, short_name
+
+
+def test_short_names_keep_ip_addresses_whole():
+    assert short_name('r1.example.net') == 'r1'
+    assert short_name('r1') == 'r1'
+    assert short_name('10.0.0.1') == '10.0.0.1'
+    assert short_name('2001:db8::1') == '2001:db8::1'
+
+
+def test_neighbors_resolve_through_the_aliases():
+    topology = Topology(aliases={'r1': 'core1', '10.0.0.2': 'core2'})
+    assert topology.resolve('r1.example.net') == 'core1'
+    assert topology.resolve('10.0.0.2') == 'core2'
+    assert topology.resolve('10.0.0.3') == '10.0.0.3'